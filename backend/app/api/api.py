@@ -4,7 +4,11 @@ from app.api.handlers.peristaltic_motor import peristaltic_motor_handler
 from app.api.handlers.rotary_motor import rotary_motor_handler
 from app.api.handlers.tilt_motor import tilt_motor_handler
 from app.auth import get_current_active_user
-from app.models import User
+from app.jobs import job_manager
+from app.measurement_spool import spool_replayer
+from app.measurement_writer import measurement_writer
+from app.models import JobResponse, User
+from app.websocket_manager import manager
 
 router = APIRouter(prefix="/api", tags=["api"])
 
@@ -22,33 +26,25 @@ def get_general_status(current_user: User = Depends(get_current_active_user)):
         tilt_movement_type = None
         if tilt_status.get("is_moving", False):
             # Check if tilt motor is running
-            if (
-                hasattr(tilt_motor_handler, "_tilt_motor_running")
-                and tilt_motor_handler._tilt_motor_running
-            ):
+            if tilt_motor_handler.is_running:
                 tilt_movement_type = "tilt"
 
         rotary_movement_type = None
         if rotary_status.get("is_moving", False):
             # Check if rotate motor is running
-            if (
-                hasattr(rotary_motor_handler, "_rotate_motor_running")
-                and rotary_motor_handler._rotate_motor_running
-            ):
+            if rotary_motor_handler.is_running:
                 rotary_movement_type = "rotate"
 
         peristaltic_movement_type = None
         if peristaltic_status.get("is_moving", False):
             # Check if peristaltic rotate motor is running
-            if (
-                hasattr(peristaltic_motor_handler, "_rotate_motor_running")
-                and peristaltic_motor_handler._rotate_motor_running
-            ):
+            if peristaltic_motor_handler.is_running:
                 peristaltic_movement_type = "rotate"
 
         return {
             "tilt": {
                 "status": tilt_status.get("status"),
+                "state": tilt_status.get("state"),
                 "is_moving": tilt_status.get("is_moving", False),
                 "movement_type": tilt_movement_type,
                 "position": tilt_status.get("position"),
@@ -56,6 +52,7 @@ def get_general_status(current_user: User = Depends(get_current_active_user)):
             },
             "rotary": {
                 "status": rotary_status.get("status"),
+                "state": rotary_status.get("state"),
                 "is_moving": rotary_status.get("is_moving", False),
                 "movement_type": rotary_movement_type,
                 "position": rotary_status.get("position"),
@@ -63,6 +60,7 @@ def get_general_status(current_user: User = Depends(get_current_active_user)):
             },
             "peristaltic": {
                 "status": peristaltic_status.get("status"),
+                "state": peristaltic_status.get("state"),
                 "is_moving": peristaltic_status.get("is_moving", False),
                 "movement_type": peristaltic_movement_type,
                 "position": peristaltic_status.get("position"),
@@ -72,3 +70,47 @@ def get_general_status(current_user: User = Depends(get_current_active_user)):
     except Exception as e:
         print(f"Error getting general status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/websocket/stats")
+async def get_websocket_stats(current_user: User = Depends(get_current_active_user)):
+    """Get queue depth and drop metrics of the WebSocket clients."""
+    return manager.get_stats()
+
+
+@router.get("/measurements/backlog")
+def get_measurement_backlog(current_user: User = Depends(get_current_active_user)):
+    """Get the size and age of measurements waiting for the database."""
+    return spool_replayer.get_stats()
+
+
+@router.get("/measurements/writer")
+def get_measurement_writer_stats(
+    current_user: User = Depends(get_current_active_user),
+):
+    """Get flush counts, latency and batch size of the measurement writer."""
+    return measurement_writer.get_stats()
+
+
+@router.get("/jobs", response_model=list[JobResponse])
+def get_jobs(current_user: User = Depends(get_current_active_user)):
+    """Get the recent background jobs, newest first."""
+    return [job.to_dict() for job in job_manager.get_jobs()]
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: str, current_user: User = Depends(get_current_active_user)):
+    """Get the state and progress of a background job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobResponse)
+def cancel_job(job_id: str, current_user: User = Depends(get_current_active_user)):
+    """Cancel a running background job."""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
@@ -0,0 +1,356 @@
+"""Asyncio motion engine for the motor handlers.
+
+A motor run is a coroutine (the *program*) executed as a task on the
+application event loop instead of a pair of threads polling boolean flags.
+Pause, resume and stop are commands sent through an ``asyncio.Queue`` and
+turned into events the program awaits, so it reacts as soon as it reaches its
+next ``await`` instead of after a sleep. Blocking PoStep256 calls made by the
+programs run in one shared executor, and the measurement flush of a run is a
+second task on the loop.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
+
+from app.asyncio_loop import get_event_loop
+from app.config import settings
+
+COMMAND_PAUSE = "pause"
+COMMAND_RESUME = "resume"
+COMMAND_STOP = "stop"
+
+# Outcomes of a pause command
+PAUSE_PAUSED = "paused"  # the program waits for resume
+PAUSE_PENDING = "pausing"  # the program has not reached its paused point yet
+
+# Blocking device I/O of all motor programs, one worker per motor
+_io_executor = ThreadPoolExecutor(
+    max_workers=settings.motion_io_workers, thread_name_prefix="motion-io"
+)
+
+
+class MotionStopped(Exception):
+    """Raised inside a program to unwind it after a stop command."""
+
+
+class MotionContext:
+    """Controls handed to a running program."""
+
+    def __init__(self, engine: "MotionEngine"):
+        """Init function for the context."""
+        self._engine = engine
+
+    @property
+    def stop_requested(self) -> bool:
+        """True once the run has been asked to stop (safe to read from threads)."""
+        return self._engine._stop_requested
+
+    @property
+    def pause_requested(self) -> bool:
+        """True while the run is asked to pause (safe to read from threads)."""
+        return self._engine._pause_requested
+
+    def interrupted(self) -> bool:
+        """True if the program should stop or pause, usable as ``should_abort``."""
+        return self._engine._stop_requested or self._engine._pause_requested
+
+    def check_stopped(self) -> None:
+        """Raise MotionStopped if the run has been asked to stop."""
+        if self._engine._stop_requested:
+            raise MotionStopped()
+
+    async def io(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking call in the motion I/O executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _io_executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    async def sleep(self, seconds: float) -> bool:
+        """Sleep, waking early on pause or stop; True if the full time passed."""
+        if self.interrupted():
+            return False
+        try:
+            await asyncio.wait_for(self._engine._interrupt.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            return True
+        return False
+
+    async def wait_resumed(self, timeout: Optional[float] = None) -> bool:
+        """Mark the run paused and wait for resume or stop.
+
+        Returns:
+            True when resumed, False on stop or when the timeout expired
+        """
+        engine = self._engine
+        if not engine._pause_requested:
+            # Resumed before the program got here
+            return not engine._stop_requested
+        if not engine._paused.is_set():
+            engine._paused.set()
+            if engine._on_paused is not None:
+                engine._on_paused()
+        try:
+            await asyncio.wait_for(engine._resumed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        engine._paused.clear()
+        return not engine._stop_requested
+
+
+class MotionEngine:
+    """Runs one motor program at a time on the application event loop.
+
+    The public methods without ``async`` are for the synchronous API handlers
+    (FastAPI threadpool); they forward to the loop and wait for the result.
+    """
+
+    def __init__(self, name: str):
+        """Init function for the engine.
+
+        Args:
+            name: Motor name used in log messages
+        """
+        self.name = name
+        self._task: Optional[asyncio.Task] = None
+        self._commands: Optional[asyncio.Queue] = None
+        self._interrupt: Optional[asyncio.Event] = None
+        self._resumed: Optional[asyncio.Event] = None
+        self._paused: Optional[asyncio.Event] = None
+        self._stop_requested = False
+        self._pause_requested = False
+        self._on_paused: Optional[Callable[[], Any]] = None
+
+    @property
+    def running(self) -> bool:
+        """True while a program is running."""
+        return self._task is not None and not self._task.done()
+
+    @property
+    def paused(self) -> bool:
+        """True while the program waits for resume."""
+        return self.running and self._paused.is_set()
+
+    # ---------------------------------------------------------
+    # Synchronous API (callable from any thread but the loop)
+    # ---------------------------------------------------------
+
+    def start(
+        self,
+        program: Callable[[MotionContext], Awaitable[Any]],
+        flush: Optional[Callable[[], Awaitable[Any]]] = None,
+        flush_interval: float = 0.5,
+        on_finish: Optional[Callable[[], Awaitable[Any]]] = None,
+        on_paused: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        """Start a program and its periodic measurement flush.
+
+        Args:
+            program: Coroutine function run with a MotionContext
+            flush: Coroutine function saving and broadcasting the queued
+                measurements, called every ``flush_interval`` seconds and once
+                after the program has finished
+            flush_interval: Seconds between flushes
+            on_finish: Coroutine function called after the last flush
+            on_paused: Called on the loop when the program reaches its paused
+                point
+
+        Raises:
+            RuntimeError: If a program is already running
+        """
+        self._call(
+            self.start_async(program, flush, flush_interval, on_finish, on_paused)
+        )
+
+    def pause(self, wait: bool = True) -> Optional[str]:
+        """Pause the program, see :meth:`pause_async`."""
+        return self._call(self.pause_async(wait))
+
+    def resume(self) -> bool:
+        """Resume a paused program."""
+        return bool(self._call(self.resume_async()))
+
+    def stop(self) -> bool:
+        """Stop the program and wait until it has finished."""
+        return bool(self._call(self.stop_async()))
+
+    def _call(self, coro: Awaitable[Any]) -> Any:
+        loop = get_event_loop()
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            # Called from the loop itself (e.g. shutdown): cannot block on it
+            return None
+        return future.result(timeout=settings.motion_command_timeout + 1)
+
+    # ---------------------------------------------------------
+    # Asynchronous API
+    # ---------------------------------------------------------
+
+    async def start_async(
+        self,
+        program: Callable[[MotionContext], Awaitable[Any]],
+        flush: Optional[Callable[[], Awaitable[Any]]] = None,
+        flush_interval: float = 0.5,
+        on_finish: Optional[Callable[[], Awaitable[Any]]] = None,
+        on_paused: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        """Start a program, see :meth:`start`.
+
+        Raises:
+            RuntimeError: If a program is already running
+        """
+        if self.running:
+            raise RuntimeError(f"{self.name} motor program is already running")
+        self._commands = asyncio.Queue()
+        self._interrupt = asyncio.Event()
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._paused = asyncio.Event()
+        self._stop_requested = False
+        self._pause_requested = False
+        self._on_paused = on_paused
+        self._task = asyncio.create_task(
+            self._run(program, flush, flush_interval, on_finish)
+        )
+
+    async def pause_async(self, wait: bool = True) -> Optional[str]:
+        """Pause the program.
+
+        Args:
+            wait: Wait (up to ``motion_command_timeout``) until the program
+                has reached its paused point
+
+        Returns:
+            ``PAUSE_PAUSED`` once the program waits for resume,
+            ``PAUSE_PENDING`` while it is still on its way there (also after
+            the wait timed out or for a pause already in progress), None if
+            no program is running or the pause was resumed meanwhile
+        """
+        if not self.running:
+            return None
+        await self._settle()
+        if not self._pause_requested:
+            await self._commands.put(COMMAND_PAUSE)
+            await self._settle()
+            if wait:
+                await self._wait_for(self._pause_reached())
+        return self._pause_outcome()
+
+    async def resume_async(self) -> bool:
+        """Resume a paused program, or cancel a pause still in progress."""
+        if not self.running:
+            return False
+        await self._settle()
+        if not self._pause_requested:
+            return False
+        await self._commands.put(COMMAND_RESUME)
+        await self._settle()
+        return True
+
+    async def stop_async(self) -> bool:
+        """Stop the program, returns once it has finished."""
+        if not self.running:
+            return False
+        await self._commands.put(COMMAND_STOP)
+        await self._wait_for(asyncio.shield(self._task))
+        return True
+
+    async def _settle(self) -> None:
+        # Wait until the dispatcher has applied every queued command, it
+        # stops with the program
+        await self._wait_for(self._commands.join())
+
+    async def _pause_reached(self) -> None:
+        # The paused point, or a resume or stop that ended the pause
+        waiters = [
+            asyncio.ensure_future(self._paused.wait()),
+            asyncio.ensure_future(self._resumed.wait()),
+        ]
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    def _pause_outcome(self) -> Optional[str]:
+        if not self.running or not self._pause_requested:
+            return None
+        return PAUSE_PAUSED if self._paused.is_set() else PAUSE_PENDING
+
+    async def _wait_for(self, awaitable: Awaitable[Any]) -> None:
+        # Also return if the program ends without reaching the awaited state
+        waiter = asyncio.ensure_future(awaitable)
+        await asyncio.wait(
+            {waiter, self._task},
+            timeout=settings.motion_command_timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        waiter.cancel()
+
+    # ---------------------------------------------------------
+    # Tasks
+    # ---------------------------------------------------------
+
+    async def _dispatch(self) -> None:
+        while True:
+            command = await self._commands.get()
+            if command == COMMAND_PAUSE:
+                self._pause_requested = True
+                self._resumed.clear()
+                self._interrupt.set()
+            elif command == COMMAND_RESUME:
+                self._pause_requested = False
+                self._interrupt.clear()
+                self._resumed.set()
+            elif command == COMMAND_STOP:
+                self._stop_requested = True
+                self._interrupt.set()
+                self._resumed.set()
+            self._commands.task_done()
+
+    async def _run(self, program, flush, flush_interval, on_finish) -> None:
+        dispatcher = asyncio.create_task(self._dispatch())
+        finished = asyncio.Event()
+        flusher = None
+        if flush is not None:
+            flusher = asyncio.create_task(
+                self._flush_loop(flush, flush_interval, finished)
+            )
+        try:
+            await program(MotionContext(self))
+        except MotionStopped:
+            pass
+        except Exception as e:
+            print(f"Error in {self.name} motor program: {e}")
+        finally:
+            dispatcher.cancel()
+            finished.set()
+            if flusher is not None:
+                await flusher
+            if on_finish is not None:
+                try:
+                    await on_finish()
+                except Exception as e:
+                    print(f"Error finishing {self.name} motor program: {e}")
+
+    async def _flush_loop(self, flush, interval: float, finished: asyncio.Event):
+        while not finished.is_set():
+            try:
+                await flush()
+            except Exception as e:
+                print(f"Error flushing {self.name} measurements: {e}")
+            try:
+                await asyncio.wait_for(finished.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+        # Save what the program queued after the last flush
+        try:
+            await flush()
+        except Exception as e:
+            print(f"Error flushing {self.name} measurements: {e}")
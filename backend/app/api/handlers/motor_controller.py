@@ -0,0 +1,708 @@
+r"""Shared core of the tilt, rotary and peristaltic motor handlers.
+
+:class:`MotorController` owns the device binding, the run state machine, the
+measurement queue and its flush pipeline; a handler plugs in its movement
+program (a coroutine run by the :class:`MotionEngine`) and the database and
+WebSocket calls of its module. :class:`RotationController` adds the speed ramps
+and the timed movement program shared by the rotary and peristaltic motors.
+
+Run states::
+
+    idle -> starting -> running <-> pausing -> paused -> running
+                 \          \            \          \
+                  +----------+------------+----------+--> stopping -> idle
+"""
+
+import asyncio
+import threading
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from app.api.handlers.motion_engine import MotionContext, MotionEngine
+from app.api.handlers.postep256_handler import postep256_handler
+from app.api.handlers.speed_ramp import build_ramp, play_ramp
+from app.config import settings
+from app.jobs import job_manager
+from app.measurement_archive import MeasurementArchive
+from app.measurement_buffer import MeasurementBatch, MeasurementBuffer
+from app.measurement_compression import MeasurementCompressor
+from app.measurement_export import export_stream
+from app.measurement_writer import measurement_writer
+from app.models import CompressionPolicy, MotorState, MotorStatus
+
+_TRANSITIONS = {
+    MotorState.IDLE: {MotorState.STARTING},
+    MotorState.STARTING: {MotorState.RUNNING, MotorState.STOPPING, MotorState.IDLE},
+    MotorState.RUNNING: {MotorState.PAUSING, MotorState.STOPPING},
+    MotorState.PAUSING: {MotorState.PAUSED, MotorState.RUNNING, MotorState.STOPPING},
+    MotorState.PAUSED: {MotorState.RUNNING, MotorState.STOPPING},
+    MotorState.STOPPING: {MotorState.IDLE},
+}
+
+
+class MotorController:
+    """Base class of the motor handlers: device, run state and measurements."""
+
+    # Name used in log messages and errors, e.g. "Tilt"
+    label = "Motor"
+    # Settings attribute holding the serial number of the driver
+    serial_setting = ""
+    # Columns of a measurement export: (name, PostgreSQL type)
+    export_columns: Sequence[Tuple[str, str]] = ()
+
+    def __init__(
+        self,
+        value_name: str,
+        code_name: str,
+        codes: Sequence[str],
+        save_interval: float,
+        max_speed: int,
+        max_acceleration: int,
+        max_deceleration: int,
+    ):
+        """Init function for the controller.
+
+        Args:
+            value_name: Measurement value column (angle, speed or flow)
+            code_name: Measurement code column (state or direction)
+            codes: Allowed values of the code column
+            save_interval: Seconds between measurement flushes during a run
+            max_speed: Driver speed limit set on initialization
+            max_acceleration: Driver acceleration limit
+            max_deceleration: Driver deceleration limit
+        """
+        self._device = None
+        self._postep = None
+        self._motor_status = MotorStatus.IDLE
+        self._is_moving = False
+        self._position_deg = 0  # in degrees
+        self._max_speed = max_speed
+        self._max_acceleration = max_acceleration
+        self._max_deceleration = max_deceleration
+        self._initialized = False
+        self._engine = MotionEngine(self.label.lower())
+        self._state = MotorState.IDLE
+        self._state_lock = threading.Lock()
+        self._value_name = value_name
+        self._code_name = code_name
+        self._measurements = MeasurementBuffer(value_name, code_name, codes)
+        self._current_entry_id: Optional[int] = None
+        self._run_start_time = 0.0
+        self._save_interval = save_interval
+        self._compressor = MeasurementCompressor()
+        # Rows go to the shared writer, the spool keeps what the database
+        # did not take
+        self._spool = measurement_writer.register(
+            self.label.lower(), self._copy_measurements, value_name, code_name, codes
+        )
+        self._archive = MeasurementArchive(self.label.lower())
+
+    def initialize(self):
+        """Initialize motor hardware with PoStep256 USB."""
+        try:
+            # Bind to the configured device, opened on first use
+            self._device = postep256_handler.get_device(
+                getattr(settings, self.serial_setting),
+                max_speed=self._max_speed,
+                max_accel=self._max_acceleration,
+                max_decel=self._max_deceleration,
+            )
+            self._postep = self._device.get_postep()
+            self._position_deg = self._device.get_position()
+            self._configure_device()
+
+            # Update position after settings
+            try:
+                stream_data = self._device.read_stream()
+                if stream_data and "pos" in stream_data:
+                    self._position_deg = stream_data["pos"]
+                    self._device.update_position(self._position_deg)
+            except Exception as e:
+                print(f"Warning: Could not read position: {e}")
+
+            self._initialized = True
+        except Exception as e:
+            self._motor_status = MotorStatus.ERROR
+            self._initialized = False
+            raise Exception(f"Error initializing {self.label} motor: {e}")
+
+    def _configure_device(self):
+        """Apply motor-specific driver settings after binding the device."""
+
+    # ---------------------------------------------------------
+    # Module hooks
+    # ---------------------------------------------------------
+
+    def _copy_measurements(self, cur, batch: MeasurementBatch) -> int:
+        """Write a batch to the module's measurement table on a cursor."""
+        raise NotImplementedError
+
+    async def _send_measurements(self, batch: MeasurementBatch) -> None:
+        """Broadcast a saved batch on the module's WebSocket topic."""
+        raise NotImplementedError
+
+    async def _send_stopped(self) -> None:
+        """Broadcast the end of a run on the module's WebSocket topic."""
+        raise NotImplementedError
+
+    def _stream_measurements(
+        self,
+        entry_id: str,
+        start: Optional[float],
+        end: Optional[float],
+        columns: Optional[Sequence[str]] = None,
+    ) -> Iterator[List[Tuple]]:
+        """Stream an entry's rows in chunks, ``export_columns`` by default."""
+        raise NotImplementedError
+
+    def _count_measurements(self, entry_id: str) -> int:
+        """Count an entry's rows in the module's measurement table."""
+        raise NotImplementedError
+
+    def _delete_measurements(self, entry_id: str, expected: int) -> int:
+        """Delete an entry's rows if there are exactly ``expected``."""
+        raise NotImplementedError
+
+    # ---------------------------------------------------------
+    # Run state machine
+    # ---------------------------------------------------------
+
+    @property
+    def state(self) -> MotorState:
+        """Current run state."""
+        return self._state
+
+    @property
+    def is_running(self) -> bool:
+        """True while a run is in progress (also when paused)."""
+        return self._state != MotorState.IDLE
+
+    def _transition(self, target: MotorState, *sources: MotorState) -> bool:
+        """Move to ``target`` if the current state is one of ``sources``."""
+        with self._state_lock:
+            if sources and self._state not in sources:
+                return False
+            if target not in _TRANSITIONS[self._state]:
+                return False
+            self._state = target
+            return True
+
+    def compression_policy(
+        self, policy: Optional[CompressionPolicy] = None
+    ) -> CompressionPolicy:
+        """Get the policy for a new entry, the configured default if None."""
+        if policy is not None:
+            return policy
+        return CompressionPolicy.model_validate(
+            settings.measurement_compression.get(self.label.lower(), {})
+        )
+
+    def reserve_run(self) -> bool:
+        """Reserve the motor for a new run, False if a run is active.
+
+        Called before the entry of the run is created, so a refused start
+        leaves nothing behind. The reservation holds the motor in the job
+        manager, so calibration and homing jobs are refused until the run
+        has ended; follow it with :meth:`start_run` or :meth:`release_run`.
+
+        Raises:
+            RuntimeError: If a job is running on the motor
+        """
+        if not self._transition(MotorState.STARTING, MotorState.IDLE):
+            print(f"{self.label} motor is already running.")
+            return False
+        try:
+            job_manager.claim(self.label.lower(), f"{self.label} run")
+        except RuntimeError:
+            with self._state_lock:
+                self._state = MotorState.IDLE
+            raise
+        return True
+
+    def release_run(self) -> None:
+        """Give up a reservation whose run was not started."""
+        if self._engine.running:
+            return
+        # Also after a stop request that came before the program started
+        if self._transition(MotorState.IDLE, MotorState.STARTING, MotorState.STOPPING):
+            job_manager.release(self.label.lower())
+
+    def start_run(
+        self,
+        entry_id: int,
+        program: Callable[[MotionContext], Awaitable[Any]],
+        compression: Optional[CompressionPolicy] = None,
+    ) -> bool:
+        """Start a movement program on a reserved motor, False if not reserved.
+
+        The program runs on the event loop with the motion engine; its queued
+        measurements are compressed with the entry's policy and flushed every
+        save interval and once at the end.
+        """
+        if self._state != MotorState.STARTING:
+            self.release_run()
+            return False
+        self._compressor.set_policy(self.compression_policy(compression))
+        self._current_entry_id = entry_id
+        self._run_start_time = time.time()
+        self._is_moving = True
+        self._motor_status = MotorStatus.MOVING
+
+        async def run(ctx: MotionContext):
+            try:
+                # A stop that came before the program started ends it here
+                if self._transition(MotorState.RUNNING, MotorState.STARTING):
+                    await program(ctx)
+            finally:
+                with self._state_lock:
+                    self._state = MotorState.STOPPING
+                self._is_moving = False
+                self._motor_status = MotorStatus.IDLE
+
+        try:
+            self._engine.start(
+                run,
+                flush=self._flush_measurements,
+                flush_interval=self._save_interval,
+                on_finish=self._finish_run,
+                on_paused=self._mark_paused,
+            )
+        except Exception:
+            with self._state_lock:
+                self._state = MotorState.IDLE
+            self._is_moving = False
+            self._motor_status = MotorStatus.IDLE
+            job_manager.release(self.label.lower())
+            raise
+        return True
+
+    def pause_run(self) -> bool:
+        """Ask the run to pause without waiting for the motor to stop.
+
+        The state stays ``pausing`` until the program reaches its paused
+        point (after a ramp-down, for example) and then becomes ``paused``.
+        """
+        if not self._transition(MotorState.PAUSING, MotorState.RUNNING):
+            return False
+        if self._engine.pause(wait=False) is None:
+            self._transition(MotorState.RUNNING, MotorState.PAUSING)
+            return False
+        return True
+
+    def _mark_paused(self):
+        """Called on the loop once the program waits for resume."""
+        self._transition(MotorState.PAUSED, MotorState.PAUSING)
+
+    def resume_run(self) -> bool:
+        """Resume a paused run, or cancel a pause still in progress."""
+        if not self._transition(
+            MotorState.RUNNING, MotorState.PAUSED, MotorState.PAUSING
+        ):
+            return False
+        return self._engine.resume()
+
+    def stop_run(self) -> bool:
+        """Stop the run, returns once it has finished."""
+        if not self._transition(
+            MotorState.STOPPING,
+            MotorState.STARTING,
+            MotorState.RUNNING,
+            MotorState.PAUSING,
+            MotorState.PAUSED,
+        ):
+            return False
+        # Not running yet if the program has not started, it then ends at once
+        self._engine.stop()
+        return True
+
+    async def _finish_run(self):
+        """Write the last measurements and announce the end of a run.
+
+        Called once the engine task has finished and flushed; no sample is
+        queued from here on, so the compressor releases its held back one.
+        """
+        self._current_entry_id = None
+        try:
+            await self._flush_measurements(final=True)
+        except Exception as e:
+            print(f"Error flushing {self.label} measurements: {e}")
+        await self._send_stopped()
+        self._run_start_time = 0.0
+        with self._state_lock:
+            self._state = MotorState.IDLE
+        job_manager.release(self.label.lower())
+
+    # ---------------------------------------------------------
+    # Measurement pipeline
+    # ---------------------------------------------------------
+
+    def _queue_measurement(self, value: float, code: str):
+        """Queue a sample of the running entry, timed from the start of the run."""
+        if self._current_entry_id is not None:
+            self._measurements.append(
+                self._current_entry_id,
+                value,
+                code,
+                time.time() - self._run_start_time,
+            )
+
+    def _save_measurements_batch(
+        self, final: bool = False
+    ) -> Optional[MeasurementBatch]:
+        """Hand queued measurements to the writer and return the batch.
+
+        Only the samples kept by the compressor are written; the returned
+        batch for the WebSocket has every sample.
+
+        Args:
+            final: The run has ended, release the compressor's held back sample
+        """
+        batch = self._measurements.swap()
+        if not len(batch) and not final:
+            return None
+
+        stored = self._compressor.compress(batch, final=final)
+        measurement_writer.submit(self.label.lower(), stored)
+
+        # The views are reused by the next flush, the broadcast gets a copy
+        return batch.copy() if len(batch) else None
+
+    async def _flush_measurements(self, final: bool = False):
+        """Save the queued measurements and send them to the WebSocket."""
+        batch = await asyncio.to_thread(self._save_measurements_batch, final)
+        if batch:
+            await self._send_measurements(batch)
+
+    # ---------------------------------------------------------
+    # Status
+    # ---------------------------------------------------------
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get current motor status."""
+        return {
+            "status": self._motor_status.value,
+            "state": self._state.value,
+            "position": self._device.get_position()
+            if self._initialized
+            else self._position_deg,
+            "is_moving": self._is_moving,
+            "initialized": self._initialized,
+            "compression": self._compressor.get_stats(),
+            "backlog": self._spool.get_stats(),
+        }
+
+    # ---------------------------------------------------------
+    # Export
+    # ---------------------------------------------------------
+
+    def export_measurements(
+        self,
+        entry_id: str,
+        fmt: str,
+        gzip: bool = False,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Iterator[bytes]:
+        """Encode every stored measurement of an entry as it is read.
+
+        Args:
+            entry_id: Entry of the measurements
+            fmt: Export format, see ``EXPORT_FORMATS``
+            gzip: Compress the export with gzip
+            start: Window start in seconds of the run
+            end: Window end in seconds of the run
+
+        Returns:
+            Iterator of encoded byte chunks; the database (or the archive)
+            is read while it is consumed
+        """
+        archived = self._archive.get(entry_id)
+        if archived is not None:
+            chunks = archived.chunks(
+                [name for name, _ in self.export_columns],
+                start,
+                end,
+                settings.export_chunk_rows,
+            )
+            return export_stream(chunks, self.export_columns, fmt, gzip, True)
+        chunks = self._stream_measurements(entry_id, start, end)
+        return export_stream(chunks, self.export_columns, fmt, gzip)
+
+    # ---------------------------------------------------------
+    # Archive
+    # ---------------------------------------------------------
+
+    def archive_entry(
+        self,
+        entry_id: int,
+        drop: bool = False,
+        should_abort: Optional[Callable[[], bool]] = None,
+        progress: Optional[Callable[[float, str], None]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Copy a finished entry's measurements to the cold archive.
+
+        Reads of an archived entry are served from its memory-mapped files.
+        Archiving an archived entry again only drops its rows if requested.
+
+        Args:
+            entry_id: Entry of the measurements
+            drop: Delete the archived rows from the measurement table
+            should_abort: Called between chunks, True stops the archive
+            progress: Called with the done fraction and a message
+
+        Returns:
+            Metadata of the archive, None if aborted
+
+        Raises:
+            ValueError: If the entry has no stored measurements
+            RuntimeError: If the entry is still running or rows of the table
+                have not reached the database yet
+        """
+        if self._current_entry_id is not None and self._current_entry_id == entry_id:
+            raise RuntimeError(f"Entry {entry_id} is still running")
+        name = self.label.lower()
+        if not measurement_writer.wait_written(
+            name, settings.writer_flush_ms / 1000 + settings.db_pool_timeout
+        ):
+            raise RuntimeError(
+                f"{self.label} measurements are waiting for the database, "
+                "archive the entry once the backlog is written"
+            )
+
+        archived = self._archive.get(entry_id)
+        if archived is None:
+            rows = self._count_measurements(entry_id)
+            if not rows:
+                raise ValueError(f"Entry {entry_id} has no stored measurements")
+            columns = (("id", "int4"), *self.export_columns)
+            chunks = self._stream_measurements(
+                entry_id, None, None, [column for column, _ in columns]
+            )
+            try:
+                archived = self._archive.write(
+                    entry_id, columns, chunks, rows, should_abort, progress
+                )
+            finally:
+                # Returns the connection of an aborted read
+                chunks.close()
+            if archived is None:
+                return None
+        if drop and not archived.dropped:
+            self._delete_measurements(entry_id, archived.rows)
+            self._archive.mark_dropped(entry_id)
+        return archived.meta
+
+    def _archived_measurements(
+        self,
+        entry_id: str,
+        limit: int,
+        start: Optional[float],
+        end: Optional[float],
+        points: Optional[int],
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Read measurements like the database modules, None if not archived."""
+        archived = self._archive.get(entry_id)
+        if archived is None:
+            return None
+        names = ("id", "entry_id", self._value_name, self._code_name, "time")
+        if start is not None or end is not None or points:
+            return archived.downsample(
+                names, self._value_name, start, end, points or limit
+            )
+        return archived.recent(names, limit)
+
+    def cleanup(self):
+        """Stop a running program before the device is released."""
+        if self._engine.running:
+            self._engine.stop()
+
+
+class RotationController(MotorController):
+    """Motor driven by speed ramps through a list of timed movements."""
+
+    # Ramp acceleration in speed units per second
+    ramp_acceleration_setting = ""
+
+    def __init__(self, *args, **kwargs):
+        """Init function for the controller, see MotorController."""
+        super().__init__(*args, **kwargs)
+        self._current_speed = 0
+        self._movement_speed = 0
+        self._current_direction = "cw"
+
+    # ---------------------------------------------------------
+    # Module hooks
+    # ---------------------------------------------------------
+
+    def _movement_speed_of(self, movement) -> int:
+        """Driver speed requested by a movement."""
+        raise NotImplementedError
+
+    def _speed_value(self, speed: int) -> float:
+        """Measurement value (rpm or flow) of a driver speed."""
+        raise NotImplementedError
+
+    async def _send_movement(self, movement_index: int) -> None:
+        """Broadcast the index of the movement that starts."""
+        raise NotImplementedError
+
+    # ---------------------------------------------------------
+    # Speed ramps (blocking, run in the motion I/O executor)
+    # ---------------------------------------------------------
+
+    def _ramp_speed(
+        self,
+        start: int,
+        target: int,
+        direction: str,
+        send_measurements: bool = True,
+        should_abort=None,
+    ) -> bool:
+        """Ramp the speed from start to target, False if aborted."""
+        schedule = build_ramp(
+            start,
+            target,
+            getattr(settings, self.ramp_acceleration_setting),
+            shape=settings.ramp_profile,
+            max_step=settings.ramp_max_step,
+            min_interval=settings.ramp_min_interval,
+        )
+
+        def apply(speed: int):
+            self._postep.set_requested_speed(speed, direction)
+            self._current_speed = speed
+
+        def on_step(speed: int):
+            if send_measurements:
+                self._queue_measurement(self._speed_value(speed), direction)
+
+        completed, _ = play_ramp(schedule, apply, on_step, should_abort)
+        return completed
+
+    def _set_requested_speed(
+        self, speed, direction, prev_direction="cw", should_abort=None
+    ):
+        """Set the requested speed for the motor."""
+        if self._current_speed > 0 and prev_direction != direction:
+            self._lower_speed_gradually(self._current_speed, prev_direction)
+        if not self._ramp_speed(
+            self._current_speed, int(speed), direction, should_abort=should_abort
+        ):
+            self._lower_speed_gradually(self._current_speed, direction)
+            self._postep.run_sleep(False)
+
+    def _lower_speed_gradually(
+        self, speed: int, direction: str, send_measurements: bool = True
+    ):
+        """Lower the speed gradually."""
+        self._ramp_speed(int(speed), 0, direction, send_measurements)
+        self._postep.set_requested_speed(0, direction)
+        self._current_speed = 0
+
+    # ---------------------------------------------------------
+    # Movement program
+    # ---------------------------------------------------------
+
+    async def _movements_program(self, ctx: MotionContext, movements: list):
+        """Run the movements in order, each for its duration (0 runs until stop)."""
+        try:
+            for movement_index, movement in enumerate(movements):
+                ctx.check_stopped()
+                await self._send_movement(movement_index)
+                self._movement_speed = self._movement_speed_of(movement)
+                await ctx.io(
+                    self._set_requested_speed,
+                    self._movement_speed,
+                    movement.direction,
+                    self._current_direction,
+                    ctx.interrupted,
+                )
+                self._current_direction = movement.direction
+
+                remaining_time = movement.duration
+                movement_start_time = time.time()
+                while (
+                    movement.duration == 0
+                    or time.time() - movement_start_time < remaining_time
+                ):
+                    ctx.check_stopped()
+                    if ctx.pause_requested:
+                        remaining_time -= time.time() - movement_start_time
+                        await self._hold_paused(ctx)
+                        movement_start_time = time.time()
+                        continue
+                    if self._current_speed != self._movement_speed:
+                        # A pause resumed before this loop saw it left the
+                        # motor stopped and asleep after an aborted ramp
+                        await self._restore_speed(ctx)
+                        continue
+
+                    stream_data = await ctx.io(self._device.read_stream)
+                    if stream_data and "pos" in stream_data:
+                        self._position_deg = stream_data["pos"]
+                        if self._current_speed > 0:
+                            self._queue_measurement(
+                                self._speed_value(self._movement_speed),
+                                self._current_direction,
+                            )
+        finally:
+            await ctx.io(
+                self._lower_speed_gradually,
+                self._current_speed,
+                self._current_direction,
+            )
+            await ctx.io(self.stop_motor)
+
+    async def _hold_paused(self, ctx: MotionContext):
+        """Stop the motor and wait for resume, queueing zero samples."""
+        await ctx.io(
+            self._lower_speed_gradually, self._current_speed, self._current_direction
+        )
+        await ctx.io(self._postep.run_sleep, False)
+        while not await ctx.wait_resumed(timeout=0.2):
+            ctx.check_stopped()
+            self._queue_measurement(0, self._current_direction)
+        ctx.check_stopped()
+        await self._restore_speed(ctx)
+
+    async def _restore_speed(self, ctx: MotionContext):
+        """Wake the motor and ramp back to the movement speed."""
+        await ctx.io(self._postep.run_sleep, True)
+        await asyncio.sleep(0.05)
+        await ctx.io(
+            self._set_requested_speed,
+            self._movement_speed,
+            self._current_direction,
+            self._current_direction,
+            ctx.interrupted,
+        )
+
+    def stop_motor(self) -> bool:
+        """Stop motor movement using PoStep256 USB."""
+        if not self._is_moving:
+            return True
+
+        if self._postep.device is None:
+            return False
+
+        try:
+            self._postep.move_to_stop()
+            self._postep.run_sleep(False)
+        except Exception as e:
+            print(f"Error stopping {self.label.lower()} motor: {e}")
+            return False
+
+        self._is_moving = False
+        self._motor_status = MotorStatus.IDLE
+
+        return True
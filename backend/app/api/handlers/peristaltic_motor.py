@@ -1,17 +1,17 @@
-import asyncio
-import threading
 import time
-from collections import deque
-from datetime import datetime
-from typing import Any, Deque, Dict
+from typing import Any, Callable, Dict, Optional
 
 import numpy as np
-from app.api.handlers.postep256_handler import postep256_handler
-from app.asyncio_loop import get_event_loop
+from app.api.handlers.motor_controller import RotationController
+from app.config import settings
 from app.database.peristaltic_motor_handler import (
+    PERISTALTIC_EXPORT_COLUMNS,
+    copy_peristaltic_measurements,
+    count_peristaltic_measurements,
     create_entry,
-    create_peristaltic_measurements_batch,
+    delete_peristaltic_measurements,
     get_entries,
+    get_entry,
     get_measurements,
     get_peristaltic_calibration,
     get_peristaltic_calibrations,
@@ -22,12 +22,15 @@ from app.database.peristaltic_motor_handler import (
     save_peristaltic_calibration,
     save_peristaltic_scenario,
     save_tube_configuration,
+    stream_peristaltic_measurements,
     update_peristaltic_calibration,
     update_peristaltic_scenario,
     update_tube_configuration,
 )
+from app.measurement_buffer import DIRECTIONS, MeasurementBatch
+from app.measurement_compression import reconstruct
 from app.models import (
-    MotorStatus,
+    CompressionPolicy,
     PeristalticCalibration,
     PeristalticMovement,
     PeristalticScenario,
@@ -39,106 +42,112 @@ from sklearn.linear_model import LinearRegression
 FLOW_RATIO_CONSTANT = 5.34
 
 
-class PeristalticMotorHandler:
+class PeristalticMotorHandler(RotationController):
     """Handler for the Peristaltic PoStep motor."""
 
+    label = "Peristaltic"
+    serial_setting = "peristaltic_motor_serial"
+    export_columns = PERISTALTIC_EXPORT_COLUMNS
+    ramp_acceleration_setting = "peristaltic_ramp_acceleration"
+
     def __init__(self):
         """Init function for the handler."""
-        self._postep = None
-        self._motor_status = MotorStatus.IDLE
-        self._is_moving = False
-        self._position_deg = 0  # in degrees
-        self._max_speed = 1000
-        self._max_acceleration = 70000
-        self._max_deceleration = 70000
-        self._initialized = False
-        self._rotate_motor_task: threading.Thread = None
-        self._rpm_calibration_stopped = False
-        self._rotate_motor_running = False
-        self._rotate_motor_paused = False
-        self._rotate_motor_start_time = 0
-        self._movement_start_time = 0
-        self._pause_pressed = False
-        self._movement_stopped_time = 0
-        self._movement_remaining_time = 0
-        self._current_speed = 0
-        self._movement_speed = 0
-        self._resume_pressed = False
-        self._stop_pressed = False
-        self._current_direction = "cw"
+        super().__init__(
+            "flow",
+            "direction",
+            DIRECTIONS,
+            save_interval=0.5,  # Save queue to DB every 0.5 second
+            max_speed=1000,
+            max_acceleration=70000,
+            max_deceleration=70000,
+        )
         self._microstepping = 2
-        self._prev_pause_state = False
-        self._measurement_queue: Deque[Dict[str, Any]] = deque()
-        self._queue_lock = threading.Lock()
-        self._current_entry_id: int = None
-        self._save_interval = 0.5  # Save queue to DB every 1 second
-        self._save_measurements_task: threading.Thread = None
         self._calibration_flow_ratio = None
 
-    def initialize(self):
-        """Initialize motor hardware with PoStep256 USB."""
-        try:
-            # Initialize shared device if not already initialized
-            if not postep256_handler.is_initialized():
-                postep256_handler.initialize(
-                    max_speed=self._max_speed,
-                    max_accel=self._max_acceleration,
-                    max_decel=self._max_deceleration,
-                )
-
-            # Get the shared postep instance
-            self._postep = postep256_handler.get_postep()
-            self._position_deg = postep256_handler.get_position()
-
-            # Configure motor-specific settings
-            # self._postep.set_driver_settings(microstep=2)
-
-            # Update position after settings
-            try:
-                stream_data = self._postep.read_stream()
-                if stream_data and "pos" in stream_data:
-                    self._position_deg = stream_data["pos"]
-                    postep256_handler.update_position(self._position_deg)
-            except Exception as e:
-                print(f"Warning: Could not read position: {e}")
+    # ---------------------------------------------------------
+    # Controller hooks
+    # ---------------------------------------------------------
 
-            self._initialized = True
-        except Exception as e:
-            self._motor_status = MotorStatus.ERROR
-            self._initialized = False
-            raise Exception(f"Error initializing Peristaltic motor: {e}")
+    def _movement_speed_of(self, movement: PeristalticMovement) -> int:
+        return int(movement.flow * FLOW_RATIO_CONSTANT)
+
+    def _speed_value(self, speed: int) -> float:
+        rpm_current = speed / FLOW_RATIO_CONSTANT
+        return rpm_current * self._calibration_flow_ratio  # mL/min
+
+    async def _send_movement(self, movement_index: int):
+        await manager.send_peristaltic_movement(movement_index)
+
+    def _copy_measurements(self, cur, batch: MeasurementBatch) -> int:
+        return copy_peristaltic_measurements(cur, batch)
+
+    def _stream_measurements(self, entry_id, start, end, columns=None):
+        return stream_peristaltic_measurements(
+            entry_id, start, end, settings.export_chunk_rows, columns
+        )
+
+    def _count_measurements(self, entry_id):
+        return count_peristaltic_measurements(entry_id)
+
+    def _delete_measurements(self, entry_id, expected):
+        return delete_peristaltic_measurements(entry_id, expected)
+
+    async def _send_measurements(self, batch: MeasurementBatch):
+        await manager.send_peristaltic_measurements(batch)
+
+    async def _send_stopped(self):
+        await manager.send_peristaltic_stopped()
 
     # ---------------------------------------------------------
     # Calibration helpers
     # ---------------------------------------------------------
 
-    def stop_rpm_calibration(self):
-        """Stop RPM calibration."""
-        self._rpm_calibration_stopped = True
-        return True
-
-    def start_rpm_calibration(self, duration: int, rpm: float, direction: str):
-        """Start RPM calibration."""
+    def start_rpm_calibration(
+        self,
+        duration: int,
+        rpm: float,
+        direction: str,
+        should_abort: Optional[Callable[[], bool]] = None,
+        progress: Optional[Callable[[float, str], None]] = None,
+    ):
+        """Run an RPM calibration, blocking until it is finished or stopped.
+
+        Args:
+            duration: Time to run at the requested RPM, in seconds
+            rpm: Requested RPM
+            direction: Rotation direction
+            should_abort: Polled while running, True lowers the speed and stops
+            progress: Called with the fraction done and a status message
+        """
+        should_abort = should_abort or (lambda: False)
         try:
-            self._postep.get_driver_settings()
-            self._postep.set_driver_settings(step_mode=2, microstep=4)
-            time.sleep(0.1)
-            self._rpm_calibration_stopped = False
+            if self._postep.set_driver_settings(step_mode=2, microstep=4):
+                time.sleep(0.1)
             self._postep.run_sleep(True)
-            self._raise_speed_gradually(int(rpm * FLOW_RATIO_CONSTANT), direction)
+            if progress:
+                progress(0.0, "Raising speed")
+            self._raise_speed_gradually(
+                int(rpm * FLOW_RATIO_CONSTANT), direction, should_abort
+            )
             start_time = time.time()
+            last_report = start_time
             while time.time() - start_time < duration:
-                if self._rpm_calibration_stopped:
+                if progress and time.time() - last_report >= 0.5:
+                    last_report = time.time()
+                    progress((last_report - start_time) / duration, "Running")
+                if should_abort():
                     self._lower_speed_gradually(
-                        int(rpm * FLOW_RATIO_CONSTANT),
+                        self._current_speed,
                         direction,
                         send_measurements=False,
                     )
                     break
                 time.sleep(0.05)
 
+            if progress:
+                progress(1.0, "Lowering speed")
             self._lower_speed_gradually(
-                int(rpm * FLOW_RATIO_CONSTANT), direction, send_measurements=False
+                self._current_speed, direction, send_measurements=False
             )
             self._postep.run_sleep(False)
             return True
@@ -146,37 +155,18 @@ class PeristalticMotorHandler:
             print(f"Error starting RPM calibration: {e}")
             raise e
 
-    def _raise_speed_gradually(self, speed: int, direction: str):
+    def _raise_speed_gradually(self, speed: int, direction: str, should_abort):
         """Set the speed gradually."""
-        for i in range(0, speed, 5):
-            if self._rpm_calibration_stopped:
-                self._lower_speed_gradually(
-                    i, direction, direction, send_measurements=False
-                )
-                break
-            self._postep.set_requested_speed(i, direction)
-            time.sleep(0.02)
-        self._postep.set_requested_speed(speed, direction)
-
-    def _lower_speed_gradually(
-        self, speed: int, direction: str, send_measurements: bool = True
-    ):
-        """Lower the speed gradually."""
-        for i in range(speed, 0, -5):
-            if send_measurements:
-                rpm_current = i / FLOW_RATIO_CONSTANT
-                flow_current = rpm_current * self._calibration_flow_ratio  # mL/min
-                self._add_to_measurement_queue(
-                    entry_id=self._current_entry_id,
-                    flow=flow_current,
-                    direction=self._current_direction,
-                    time=time.time() - self._rotate_motor_start_time,
-                )
-            self._postep.set_requested_speed(i, direction)
-            self._current_speed = i
-            time.sleep(0.02)
-        self._postep.set_requested_speed(0, direction)
-        self._current_speed = 0
+        if not self._ramp_speed(
+            self._current_speed,
+            speed,
+            direction,
+            send_measurements=False,
+            should_abort=should_abort,
+        ):
+            self._lower_speed_gradually(
+                self._current_speed, direction, send_measurements=False
+            )
 
     def _compute_slope(
         self,
@@ -237,257 +227,6 @@ class PeristalticMotorHandler:
         """Get RPM from flow."""
         return flow / slope
 
-    # ---------------------------------------------------------
-    # Internal helpers: WebSocket + speed control + threading
-    # ---------------------------------------------------------
-
-    def _send_peristaltic_stopped_websocket(self):
-        """Send a peristaltic stopped update to the WebSocket."""
-        try:
-            self._submit_async(manager.send_peristaltic_stopped())
-        except Exception as e:
-            print(f"Error sending WebSocket update: {e}")
-        except Exception as e:
-            print(f"Error sending WebSocket update: {e}")
-
-    def _submit_async(self, coro):
-        try:
-            loop = get_event_loop()
-            asyncio.run_coroutine_threadsafe(coro, loop)
-        except Exception as e:
-            print(f"Async submission error: {e}")
-
-    def _set_requested_speed(self, speed, direction, prev_direction):
-        """Set the requested speed for the motor."""
-        if speed < self._current_speed and prev_direction == direction:
-            for i in range(int(self._movement_speed), int(speed), -5):
-                rpm_current = i / FLOW_RATIO_CONSTANT
-                flow_current = rpm_current * self._calibration_flow_ratio  # mL/min
-                self._add_to_measurement_queue(
-                    entry_id=self._current_entry_id,
-                    flow=flow_current,
-                    direction=direction,
-                    time=time.time() - self._rotate_motor_start_time,
-                )
-                if self._stop_pressed or self._pause_pressed:
-                    self._lower_speed_gradually(i, direction)
-                    self._postep.run_sleep(False)
-                    break
-                self._postep.set_requested_speed(i, direction)
-                self._current_speed = i
-                time.sleep(0.02)
-        elif (
-            speed > self._current_speed
-            and self._current_speed > 0
-            and prev_direction == direction
-        ):
-            for i in range(int(self._movement_speed), int(speed), 5):
-                rpm_current = i / FLOW_RATIO_CONSTANT
-                flow_current = rpm_current * self._calibration_flow_ratio  # mL/min
-                self._add_to_measurement_queue(
-                    entry_id=self._current_entry_id,
-                    flow=flow_current,
-                    direction=direction,
-                    time=time.time() - self._rotate_motor_start_time,
-                )
-                if self._stop_pressed or self._pause_pressed:
-                    self._lower_speed_gradually(i, direction)
-                    self._postep.run_sleep(False)
-                    break
-                self._postep.set_requested_speed(i, direction)
-                self._current_speed = i
-                time.sleep(0.02)
-        else:
-            if self._current_speed > 0:
-                self._lower_speed_gradually(self._current_speed, prev_direction)
-            for i in range(0, int(speed), 5):
-                current_rpm = i / FLOW_RATIO_CONSTANT
-                current_flow = current_rpm * self._calibration_flow_ratio  # mL/min
-                self._add_to_measurement_queue(
-                    entry_id=self._current_entry_id,
-                    flow=current_flow,
-                    direction=direction,
-                    time=time.time() - self._rotate_motor_start_time,
-                )
-                if self._stop_pressed or self._pause_pressed:
-                    self._lower_speed_gradually(i, direction)
-                    self._postep.run_sleep(False)
-                    break
-                self._postep.set_requested_speed(i, direction)
-                self._current_speed = i
-                time.sleep(0.02)
-
-    def _rotate_motor_thread(
-        self,
-        movements: list[PeristalticMovement],
-    ):
-        try:
-            self._rotate_motor_start_time = time.time()
-            movement_index = 0
-            for movement in movements:
-                self.send_peristaltic_movement_websocket(movement_index)
-                movement_index += 1
-
-                self._movement_speed = int(movement.flow * FLOW_RATIO_CONSTANT)
-                self._movement_start_time = time.time()
-                self._movement_remaining_time = 0
-
-                self._set_requested_speed(
-                    self._movement_speed,
-                    movement.direction,
-                    self._current_direction,
-                )
-                self._current_direction = movement.direction
-
-                while (
-                    time.time() - self._movement_start_time < movement.duration
-                    or movement.duration == 0
-                ):
-                    if self._stop_pressed:
-                        break
-                    if self._pause_pressed or self._rotate_motor_paused:
-                        self._lower_speed_gradually(
-                            self._current_speed, self._current_direction
-                        )
-                        print("JE OD TU?")
-                        self._postep.run_sleep(False)
-                        while self._rotate_motor_paused:
-                            if self._stop_pressed:
-                                break
-                            time.sleep(0.2)
-                            self._add_to_measurement_queue(
-                                entry_id=self._current_entry_id,
-                                flow=0,
-                                direction=self._current_direction,
-                                time=time.time() - self._rotate_motor_start_time,
-                            )
-
-                        if self._resume_pressed:
-                            self._postep.run_sleep(True)
-                            time.sleep(0.05)
-                            self._set_requested_speed(
-                                self._movement_speed,
-                                self._current_direction,
-                                self._current_direction,
-                            )
-                            if movement.duration > 0:
-                                movement.duration = (
-                                    movement.duration - self._movement_remaining_time
-                                )
-                            self._resume_pressed = False
-                            self._pause_pressed = False
-                            print("se to sploh izvede")
-                            self._rotate_motor_paused = False
-                            self._movement_start_time = time.time()
-                            continue
-
-                    stream_data = self._postep.read_stream()
-                    if stream_data and "pos" in stream_data:
-                        self._position_deg = stream_data["pos"]
-                        if (
-                            self._current_entry_id is not None
-                            and self._current_speed > 0
-                        ):
-                            rpm_current = self._movement_speed / FLOW_RATIO_CONSTANT
-                            flow_current = (
-                                rpm_current * self._calibration_flow_ratio
-                            )  # mL/min
-                            self._add_to_measurement_queue(
-                                entry_id=self._current_entry_id,
-                                flow=flow_current,
-                                direction=self._current_direction,
-                                time=time.time() - self._rotate_motor_start_time,
-                            )
-
-            self._lower_speed_gradually(self._current_speed, self._current_direction)
-            self._postep.move_to_stop()
-            self._postep.run_sleep(False)
-            time.sleep(0.05)
-            self._send_peristaltic_stopped_websocket()
-            self._rotate_motor_running = False
-            self._stop_pressed = False
-            self._pause_pressed = False
-            self._rotate_motor_paused = False
-            self._resume_pressed = False
-            self._is_moving = False
-            self._motor_status = MotorStatus.IDLE
-            self._rotate_motor_start_time = 0
-            self.stop_motor()
-        except Exception as e:
-            print(f"Error in peristaltic_motor thread: {e}")
-            raise e
-
-    def _add_to_measurement_queue(
-        self, entry_id: int, flow: float, direction: str, time: datetime
-    ):
-        """Add a measurement to the queue."""
-        with self._queue_lock:
-            self._measurement_queue.append(
-                {
-                    "entry_id": entry_id,
-                    "flow": flow,
-                    "direction": direction,
-                    "time": time,
-                }
-            )
-
-    def _save_measurements_batch(self):
-        """Save queued measurements to database in batch and return the batch."""
-        measurements_to_save: list[Dict[str, Any]] = []
-        with self._queue_lock:
-            if self._measurement_queue:
-                measurements_to_save = list(self._measurement_queue)
-                self._measurement_queue.clear()
-
-        if not measurements_to_save:
-            return []
-
-        try:
-            create_peristaltic_measurements_batch(measurements_to_save)
-        except Exception as e:
-            print(f"Error saving measurements batch: {e}")
-            # Re-add measurements to queue on error
-            with self._queue_lock:
-                self._measurement_queue.extendleft(reversed(measurements_to_save))
-            # On error we consider nothing was successfully sent
-            return []
-
-        return measurements_to_save
-
-    def _handle_measurements_thread(self, entry_id: int):
-        """Thread that periodically saves queued measurements to database."""
-        self._current_entry_id = entry_id
-        while self._is_moving:
-            batch = self._save_measurements_batch()
-            if batch:
-                self.send_measurements_websocket(batch)
-            time.sleep(self._save_interval)
-
-        # Save any remaining measurements when stopping
-        final_batch = self._save_measurements_batch()
-        if final_batch:
-            self.send_measurements_websocket(final_batch)
-
-        self._current_entry_id = None
-
-    def send_peristaltic_movement_websocket(self, movement: int):
-        """Send a rotate movement update to the WebSocket."""
-        try:
-            self._submit_async(manager.send_peristaltic_movement(movement))
-        except Exception as e:
-            print(f"Error sending WebSocket update: {e}")
-        except Exception as e:
-            print(f"Error sending WebSocket update: {e}")
-
-    def send_measurements_websocket(self, measurements: list[Dict[str, Any]]):
-        """Send measurements to the WebSocket."""
-        try:
-            self._submit_async(manager.send_peristaltic_measurements(measurements))
-        except Exception as e:
-            print(f"Error sending WebSocket update: {e}")
-        except Exception as e:
-            print(f"Error sending WebSocket update: {e}")
-
     # ---------------------------------------------------------
     # Public motor control (rotate)
     # ---------------------------------------------------------
@@ -500,128 +239,56 @@ class PeristalticMotorHandler:
         calibration_name: str,
         calibration_preset: bool,
         movements: list[PeristalticMovement],
+        compression: Optional[CompressionPolicy] = None,
     ) -> bool:
         """Rotate the peristaltic motor based on movements."""
-        if self._is_moving:
+        if not self.reserve_run():
             return False
-        entry_id = create_entry(
-            name=entry_name,
-            peristaltic_scenario_id=scenario_id,
-            scenario_name=scenario_name,
-        )
-        self._current_entry_id = entry_id
-        self._postep.run_sleep(True)
-        self._rotate_motor_running = True
-        self._postep.get_driver_settings()
-        self._postep.set_driver_settings(step_mode=2, microstep=4)
-        time.sleep(0.1)
-        self._is_moving = True
-        self._motor_status = MotorStatus.MOVING
-        if calibration_preset:
-            tube_configuration = self.get_tube_configuration(calibration_name)
-            self._calibration_flow_ratio = tube_configuration.flow_rate
-            for movement in movements:
-                movement.flow = self.get_rpm_from_flow(
-                    movement.flow, tube_configuration.flow_rate
-                )
-        else:
-            calibration = self.get_peristaltic_calibration(calibration_name)
-            self._calibration_flow_ratio = calibration.slope
-            for movement in movements:
-                movement.flow = self.get_rpm_from_flow(movement.flow, calibration.slope)
-        self._rotate_motor_task = threading.Thread(
-            target=self._rotate_motor_thread,
-            args=(movements,),
-            daemon=True,
-        )
-        self._stop_pressed = False
-
-        self._rotate_motor_task.start()
-        self._save_measurements_task = threading.Thread(
-            target=self._handle_measurements_thread,
-            args=(entry_id,),
-            daemon=True,
-        )
-        self._save_measurements_task.start()
-        return True
-
-    def stop_peristaltic_motor(self):
-        """Manually stop the peristaltic motor motion."""
-        if (
-            self._rotate_motor_running
-            and self._rotate_motor_task
-            and self._rotate_motor_task.is_alive()
-        ):
-            self._stop_pressed = True
-            self._rotate_motor_task.join(timeout=3)
-            self._is_moving = False
-            self._motor_status = MotorStatus.IDLE
-            self._rotate_motor_task = None
-            if self._save_measurements_task:
-                self._save_measurements_task.join(timeout=3)
-                self._measurement_queue.clear()
-                self._save_measurements_task = None
-
-    def pause_peristaltic_motor(self):
-        """Pause the peristaltic motor motion temporarily."""
-        if (
-            self._rotate_motor_running
-            and self._rotate_motor_task
-            and self._rotate_motor_task.is_alive()
-            and not self._rotate_motor_paused
-        ):
-            self._movement_remaining_time = time.time() - self._movement_start_time
-            self._rotate_motor_paused = True
-            self._pause_pressed = True
-            self._movement_stopped_time = time.time()
-            self._resume_pressed = False
-
-    def resume_peristaltic_motor(self, movement: int):
-        """Resume the peristaltic motor motion from where it was paused."""
-        if (
-            self._rotate_motor_running
-            and self._rotate_motor_task
-            and self._rotate_motor_task.is_alive()
-            and self._rotate_motor_paused
-        ):
-            self._pause_pressed = False
-            self._postep.run_sleep(True)
-            self._resume_pressed = True
-            self._pause_pressed = False
-            self._rotate_motor_paused = False
-
-    # ---------------------------------------------------------
-    # Movement state helpers + status
-    # ---------------------------------------------------------
-
-    def stop_motor(self) -> bool:
-        """Stop motor movement using PoStep256 USB."""
-        if not self._is_moving:
-            return True
-
-        if self._postep.device is None:
-            return False
-
         try:
-            self._postep.move_to_stop()
-            self._postep.run_sleep(False)
-        except Exception as e:
-            print(f"Error stopping peristaltic motor: {e}")
-            return False
+            compression = self.compression_policy(compression)
+            if calibration_preset:
+                tube_configuration = self.get_tube_configuration(calibration_name)
+                self._calibration_flow_ratio = tube_configuration.flow_rate
+                for movement in movements:
+                    movement.flow = self.get_rpm_from_flow(
+                        movement.flow, tube_configuration.flow_rate
+                    )
+            else:
+                calibration = self.get_peristaltic_calibration(calibration_name)
+                self._calibration_flow_ratio = calibration.slope
+                for movement in movements:
+                    movement.flow = self.get_rpm_from_flow(
+                        movement.flow, calibration.slope
+                    )
+            entry_id = create_entry(
+                name=entry_name,
+                peristaltic_scenario_id=scenario_id,
+                scenario_name=scenario_name,
+                compression=compression.model_dump(mode="json"),
+            )
+            self._postep.run_sleep(True)
+            if self._postep.set_driver_settings(step_mode=2, microstep=4):
+                time.sleep(0.1)
+        except Exception:
+            self.release_run()
+            raise
+        return self.start_run(
+            entry_id,
+            lambda ctx: self._movements_program(ctx, movements),
+            compression,
+        )
 
-        self._is_moving = False
-        self._motor_status = MotorStatus.IDLE
+    def stop_peristaltic_motor(self) -> bool:
+        """Manually stop the peristaltic motor motion, waiting until the run has ended."""
+        return self.stop_run()
 
-        return True
+    def pause_peristaltic_motor(self) -> bool:
+        """Pause the peristaltic motor motion, returns before the motor has stopped."""
+        return self.pause_run()
 
-    def get_status(self) -> dict:
-        """Get current motor status."""
-        return {
-            "status": self._motor_status.value,
-            "position": self._position_deg,
-            "is_moving": self._is_moving,
-            "initialized": self._initialized,
-        }
+    def resume_peristaltic_motor(self, movement: int) -> bool:
+        """Resume the peristaltic motor motion from where it was paused."""
+        return self.resume_run()
 
     # ---------------------------------------------------------
     # DB / model wrappers (entries, calibration, scenarios, tubes)
@@ -692,9 +359,37 @@ class PeristalticMotorHandler:
         """Save a tube configuration."""
         return save_tube_configuration(tube_configuration)
 
-    def get_measurements(self, entry_id: int, limit: int = 100) -> list[Dict[str, Any]]:
-        """Get peristaltic measurements for an entry."""
-        return get_measurements(entry_id, limit)
+    def get_measurements(
+        self,
+        entry_id: int,
+        limit: int = 100,
+        interval: Optional[float] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        points: Optional[int] = None,
+    ) -> list[Dict[str, Any]]:
+        """Get peristaltic measurements for an entry.
+
+        Args:
+            entry_id: Entry of the measurements
+            limit: Maximum number of stored rows to read
+            interval: Resample the stored (compressed) rows at this spacing in
+                seconds, None returns the stored rows
+            start: Window start in seconds of the run
+            end: Window end in seconds of the run
+            points: Downsample the window to about this many rows
+        """
+        measurements = self._archived_measurements(entry_id, limit, start, end, points)
+        if measurements is None:
+            measurements = get_measurements(
+                entry_id, limit, start=start, end=end, points=points
+            )
+        if interval:
+            entry = get_entry(entry_id) or {}
+            measurements = reconstruct(
+                measurements, "flow", interval, entry.get("compression"), limit
+            )
+        return measurements
 
     # ---------------------------------------------------------
     # Cleanup
@@ -702,6 +397,7 @@ class PeristalticMotorHandler:
 
     def cleanup(self):
         """Cleanup resources."""
+        super().cleanup()
         if self._is_moving:
             self.stop_motor()
         if self._postep:
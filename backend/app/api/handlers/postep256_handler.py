@@ -1,24 +1,28 @@
 import threading
+from typing import Any, Dict, List, Optional
 
+from app.api.handlers.postep256_io import PoStep256IOWorker, SerializedPoStep256
+from app.api.handlers.stream_sampler import StreamRingBuffer, StreamSampler
 from app.api.postep256_usb_lib.postep256usb import PoStep256USB
+from app.api.postep256_usb_lib.simulator import SimulatedPoStep256
+from app.config import settings
 
+SIMULATOR_SERIAL_PREFIX = "SIM-"
 
-class Postep256Handler:
-    """Singleton handler for shared PoStep256 USB device."""
 
-    _instance = None
-    _lock = threading.Lock()
+class Postep256Device:
+    """One opened PoStep256 driver with its own I/O thread and stream sampler."""
 
-    def __new__(cls):
-        """Implement singleton pattern."""
-        if cls._instance is None:
-            with cls._lock:
-                if cls._instance is None:
-                    cls._instance = super(Postep256Handler, cls).__new__(cls)
-                    cls._instance._initialized = False
-                    cls._instance._postep = None
-                    cls._instance._position_deg = 0
-        return cls._instance
+    def __init__(self, serial_number: str):
+        """Init function for the device."""
+        self.serial_number = serial_number
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._postep = None
+        self._io = None
+        self._stream = None
+        self._sampler = None
+        self._position_deg = 0
 
     def initialize(
         self,
@@ -26,22 +30,19 @@ class Postep256Handler:
         max_accel: int = 40000,
         max_decel: int = 40000,
         log_level: str = "INFO",
-        device_index: int = 0,
     ) -> None:
-        """Initialize the shared PoStep256 USB device (only once).
+        """Open the PoStep256 device (only once).
 
         Args:
             max_speed: Maximum speed setting
             max_accel: Maximum acceleration setting
             max_decel: Maximum deceleration setting
             log_level: Logging level for PoStep256USB
-            device_index: Index of device to use if multiple devices found
 
         Raises:
             Exception: If initialization fails
         """
         if self._initialized:
-            print("PoStep256 device already initialized.")
             return
 
         with self._lock:
@@ -49,24 +50,33 @@ class Postep256Handler:
                 return
 
             try:
-                print("Initializing shared PoStep256 USB device...")
-
-                serial_number = PoStep256USB.discover_devices()
-                print("devices", serial_number)
-                if len(serial_number) == 0:
-                    raise Exception("No PoStep256 Motor USB device found.")
+                if self.serial_number.startswith(SIMULATOR_SERIAL_PREFIX):
+                    print(f"Initializing simulated PoStep256 {self.serial_number}...")
+                    postep = PoStep256USB(
+                        log_level=log_level,
+                        transport=SimulatedPoStep256(
+                            latency_ms=settings.postep_simulator_latency_ms,
+                            stream_period_ms=settings.postep_simulator_stream_period_ms,
+                            serial_number=self.serial_number,
+                        ),
+                    )
+                else:
+                    print(f"Initializing PoStep256 USB device {self.serial_number}...")
+                    postep = PoStep256USB(
+                        serial_number=self.serial_number, log_level=log_level
+                    )
 
-                if device_index >= len(serial_number):
+                if postep.device is None:
                     raise Exception(
-                        f"Device index {device_index} not available. Found {len(serial_number)} device(s)."
+                        f"PoStep256 device {self.serial_number} could not be opened."
                     )
 
-                self._postep = PoStep256USB(
-                    serial_number=serial_number[device_index], log_level=log_level
+                # All USB transactions from here on go through a single I/O thread
+                self._io = PoStep256IOWorker(
+                    postep, name=f"postep256-io-{self.serial_number}"
                 )
-
-                if self._postep.device is None:
-                    raise Exception("No PoStep256 Motor USB device found.")
+                self._io.start()
+                self._postep = SerializedPoStep256(self._io, postep)
 
                 if self._postep.enable_rt_stream():
                     print("PoStep256 motor real-time streaming enabled.")
@@ -80,32 +90,65 @@ class Postep256Handler:
                 #     endsw=None,
                 # )
 
+                # One sampler reads the real-time stream for every consumer
+                self._stream = StreamRingBuffer(settings.postep_stream_buffer_size)
+                self._sampler = StreamSampler(
+                    self._io,
+                    self._stream,
+                    rate_hz=settings.postep_stream_rate_hz,
+                    name=f"postep256-stream-{self.serial_number}",
+                )
+                self._sampler.start()
+
                 # Read initial position
-                try:
-                    stream_data = self._postep.read_stream()
-                    if stream_data and "pos" in stream_data:
-                        self._position_deg = stream_data["pos"]
-                except Exception as e:
-                    print(f"Warning: Could not read initial position: {e}")
+                stream_data = self.read_stream()
+                if stream_data and "pos" in stream_data:
+                    self._position_deg = stream_data["pos"]
+                else:
+                    print("Warning: Could not read initial position")
                     self._position_deg = 0
 
                 self._initialized = True
-                print("PoStep256 device initialization successful.")
+                print(
+                    f"PoStep256 device {self.serial_number} initialization successful."
+                )
 
             except Exception as e:
                 self._initialized = False
+                if self._io:
+                    self._io.stop()
+                    self._io = None
                 raise Exception(f"Error initializing PoStep256 device: {e}")
 
-    def get_postep(self) -> PoStep256USB:
-        """Get the shared PoStep256 instance."""
+    def get_postep(self) -> SerializedPoStep256:
+        """Get the PoStep256 instance (calls are serialised on the I/O thread)."""
         if not self._initialized:
             raise Exception(
                 "PoStep256 device not initialized. Call initialize() first."
             )
         return self._postep
 
+    def read_stream(self, timeout: float = 0.5) -> Optional[Dict[str, Any]]:
+        """Wait for the next real-time stream sample, None on timeout."""
+        if self._stream is None:
+            return None
+        return self._stream.wait_for_newer(self._stream.seq, timeout)
+
+    def latest_stream(self) -> Optional[Dict[str, Any]]:
+        """Get the newest real-time stream sample without waiting."""
+        if self._stream is None:
+            return None
+        return self._stream.latest()
+
+    def get_stream_buffer(self) -> Optional[StreamRingBuffer]:
+        """Get the ring buffer holding the recent stream samples."""
+        return self._stream
+
     def get_position(self) -> int:
         """Get current position."""
+        latest = self.latest_stream()
+        if latest is not None:
+            return latest["pos"]
         return self._position_deg
 
     def update_position(self, position: int) -> None:
@@ -118,13 +161,111 @@ class Postep256Handler:
 
     def cleanup(self):
         """Cleanup resources."""
+        if self._sampler:
+            self._sampler.stop()
+            self._sampler = None
         if self._postep:
             try:
                 self._postep.set_run(False)
             except Exception as e:
                 print(f"Error cleaning up PoStep256 device: {e}")
+        if self._io:
+            self._io.stop()
+            self._io = None
         self._initialized = False
-        print("PoStep256 device cleanup completed")
+        print(f"PoStep256 device {self.serial_number} cleanup completed")
+
+
+class Postep256Handler:
+    """Singleton registry of the PoStep256 devices attached to the host.
+
+    Devices are discovered once and opened by serial number on first use.
+    Every device has its own I/O thread and stream sampler, so motors bound
+    to different devices never wait for each other.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        """Implement singleton pattern."""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(Postep256Handler, cls).__new__(cls)
+                    cls._instance._serials = None
+                    cls._instance._devices = {}
+        return cls._instance
+
+    def discover_devices(self, refresh: bool = False) -> List[str]:
+        """Get the serial numbers of the attached devices.
+
+        Args:
+            refresh: Enumerate the bus again instead of using the cached list
+
+        Returns:
+            Serial numbers in discovery order
+        """
+        with self._lock:
+            if self._serials is None or refresh:
+                if settings.postep_simulator:
+                    self._serials = [
+                        f"{SIMULATOR_SERIAL_PREFIX}{i}"
+                        for i in range(settings.postep_simulator_devices)
+                    ]
+                else:
+                    self._serials = PoStep256USB.discover_devices()
+            return list(self._serials)
+
+    def get_device(
+        self, serial_number: Optional[str] = None, **init_kwargs: Any
+    ) -> Postep256Device:
+        """Get an initialized device, opening it on first use.
+
+        Args:
+            serial_number: Serial number of the device, the first discovered
+                device when empty
+            init_kwargs: Passed to Postep256Device.initialize
+
+        Returns:
+            The initialized device
+
+        Raises:
+            Exception: If the device is not attached or fails to initialize
+        """
+        serials = self.discover_devices()
+        if not serial_number:
+            if len(serials) == 0:
+                raise Exception("No PoStep256 Motor USB device found.")
+            serial_number = serials[0]
+        elif serial_number not in serials:
+            serials = self.discover_devices(refresh=True)
+            if serial_number not in serials:
+                raise Exception(
+                    f"PoStep256 device {serial_number} not found. Found: {serials}"
+                )
+
+        with self._lock:
+            device = self._devices.get(serial_number)
+            if device is None:
+                device = Postep256Device(serial_number)
+                self._devices[serial_number] = device
+
+        # Opening a device is slow, other devices can be opened meanwhile
+        device.initialize(**init_kwargs)
+        return device
+
+    def get_devices(self) -> Dict[str, Postep256Device]:
+        """Get the opened devices by serial number."""
+        with self._lock:
+            return dict(self._devices)
+
+    def cleanup(self):
+        """Cleanup every opened device."""
+        for device in self.get_devices().values():
+            device.cleanup()
+        with self._lock:
+            self._devices = {}
 
 
 # Global singleton instance
@@ -0,0 +1,135 @@
+"""Single-owner USB I/O thread for a PoStep256 device.
+
+Every USB transaction (a write followed by its read) is executed by one
+worker thread, so requests coming from the motor handler threads and the API
+threadpool can never interleave on the bus. Requests are ordered by priority:
+an emergency stop jumps ahead of queued commands, and commands jump ahead of
+status polls.
+"""
+
+import itertools
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Optional
+
+from app.api.postep256_usb_lib.postep256usb import PoStep256USB
+
+PRIORITY_EMERGENCY = 0
+PRIORITY_COMMAND = 1
+PRIORITY_POLL = 2
+_PRIORITY_SHUTDOWN = 3
+
+# Default priorities of PoStep256USB methods, everything else is a command
+METHOD_PRIORITIES = {
+    "move_to_stop": PRIORITY_EMERGENCY,
+    "read_stream": PRIORITY_POLL,
+    "get_device_info": PRIORITY_POLL,
+    "read_configuration": PRIORITY_POLL,
+}
+
+
+class PoStep256IOWorker:
+    """Thread that owns a PoStep256USB instance and serialises access to it."""
+
+    def __init__(self, postep: PoStep256USB, name: str = "postep256-io"):
+        """Init function for the worker."""
+        self._postep = postep
+        self._name = name
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def start(self) -> None:
+        """Start the worker thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 3) -> None:
+        """Finish the queued transactions and stop the worker thread."""
+        if self._thread is None:
+            return
+        self._stopped = True
+        self._queue.put((_PRIORITY_SHUTDOWN, next(self._sequence), None, (), {}, None))
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def in_worker_thread(self) -> bool:
+        """Check if the caller is running on the worker thread."""
+        return threading.current_thread() is self._thread
+
+    def submit(
+        self, method: str, *args: Any, priority: Optional[int] = None, **kwargs: Any
+    ) -> Future:
+        """Queue a PoStep256USB method call and return a future for its result."""
+        if self._stopped or self._thread is None:
+            raise RuntimeError("PoStep256 I/O worker is not running")
+        if priority is None:
+            priority = METHOD_PRIORITIES.get(method, PRIORITY_COMMAND)
+        future: Future = Future()
+        fn = getattr(self._postep, method)
+        self._queue.put((priority, next(self._sequence), fn, args, kwargs, future))
+        return future
+
+    def call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Run a PoStep256USB method on the worker thread and wait for the result."""
+        if self.in_worker_thread():
+            return getattr(self._postep, method)(*args, **kwargs)
+        return self.submit(method, *args, **kwargs).result()
+
+    def _run(self) -> None:
+        while True:
+            priority, _, fn, args, kwargs, future = self._queue.get()
+            if priority == _PRIORITY_SHUTDOWN:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        # Fail anything that was queued after shutdown was requested
+        while not self._queue.empty():
+            _, _, _, _, _, future = self._queue.get_nowait()
+            if future is not None and future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("PoStep256 I/O worker stopped"))
+
+
+class SerializedPoStep256:
+    """Drop-in PoStep256USB proxy that routes every method call through a worker.
+
+    Attribute reads (``device``, ``current_settings``, ...) are passed through
+    unchanged, method calls block until the worker has executed them.
+    """
+
+    def __init__(self, worker: PoStep256IOWorker, postep: PoStep256USB):
+        """Init function for the proxy."""
+        self._worker = worker
+        self._postep = postep
+
+    @property
+    def worker(self) -> PoStep256IOWorker:
+        """Get the I/O worker used by the proxy."""
+        return self._worker
+
+    def __getattr__(self, name: str) -> Any:
+        """Resolve attributes on the wrapped device, serialising method calls."""
+        attr = getattr(self._postep, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args: Any, **kwargs: Any) -> Any:
+            return self._worker.call(name, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = getattr(attr, "__doc__", None)
+        return call
+
+    def submit(self, method: str, *args: Any, **kwargs: Any) -> Future:
+        """Queue a method call without waiting for it, see PoStep256IOWorker.submit."""
+        return self._worker.submit(method, *args, **kwargs)
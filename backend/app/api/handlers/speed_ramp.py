@@ -0,0 +1,136 @@
+"""Host-side speed ramps for motors driven in PoStep256 speed mode.
+
+A ramp is precomputed as a schedule of ``(time, speed)`` setpoints with NumPy
+and then played back against wall-clock deadlines. The schedule uses the
+fewest commands that keep every speed step below ``max_step`` while never
+sending more than one command per ``min_interval``. Playback skips setpoints
+whose deadline has already passed, so a ramp finishes on time even when USB
+commands are slow.
+"""
+
+import time
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+RAMP_LINEAR = "linear"
+RAMP_S_CURVE = "s_curve"
+
+# Longest sleep between abort checks while waiting for the next setpoint
+ABORT_POLL_INTERVAL = 0.02
+
+
+class RampSchedule:
+    """Precomputed speed setpoints, ``times`` are seconds from the ramp start."""
+
+    def __init__(self, times: np.ndarray, speeds: np.ndarray):
+        """Init function for the schedule."""
+        self.times = times
+        self.speeds = speeds
+
+    @property
+    def duration(self) -> float:
+        """Time of the last setpoint."""
+        return float(self.times[-1]) if len(self.times) else 0.0
+
+    def __len__(self) -> int:
+        """Number of commands in the schedule."""
+        return len(self.speeds)
+
+
+def build_ramp(
+    start: int,
+    target: int,
+    acceleration: float,
+    shape: str = RAMP_LINEAR,
+    max_step: int = 20,
+    min_interval: float = 0.05,
+) -> RampSchedule:
+    """Compute the setpoints of a ramp from ``start`` to ``target``.
+
+    Args:
+        start: Current speed
+        target: Requested speed
+        acceleration: Largest speed change per second
+        shape: ``linear`` or ``s_curve`` (smoothstep, zero jerk at both ends)
+        max_step: Largest speed change between two commands
+        min_interval: Shortest time between two commands, in seconds
+
+    Returns:
+        RampSchedule ending exactly at ``target`` (empty if already there)
+    """
+    delta = float(target - start)
+    if delta == 0:
+        return RampSchedule(np.empty(0), np.empty(0, dtype=np.int64))
+    if acceleration <= 0:
+        raise ValueError("Ramp acceleration must be positive.")
+
+    if shape == RAMP_S_CURVE:
+        # smoothstep peaks at 1.5x the mean slope, stretch to respect the limit
+        duration = 1.5 * abs(delta) / acceleration
+    elif shape == RAMP_LINEAR:
+        duration = abs(delta) / acceleration
+    else:
+        raise ValueError(f"Unknown ramp shape: {shape}")
+
+    by_resolution = int(np.ceil(abs(delta) / max(max_step, 1)))
+    by_rate = int(duration / min_interval) if min_interval > 0 else by_resolution
+    count = max(1, min(by_resolution, by_rate))
+
+    progress = np.arange(1, count + 1, dtype=np.float64) / count
+    if shape == RAMP_S_CURVE:
+        fraction = progress * progress * (3.0 - 2.0 * progress)
+    else:
+        fraction = progress
+    speeds = np.rint(start + delta * fraction).astype(np.int64)
+    speeds[-1] = target
+    return RampSchedule(progress * duration, speeds)
+
+
+def play_ramp(
+    schedule: RampSchedule,
+    apply: Callable[[int], None],
+    on_step: Optional[Callable[[int], None]] = None,
+    should_abort: Optional[Callable[[], bool]] = None,
+) -> Tuple[bool, Optional[int]]:
+    """Send the setpoints of a schedule at their deadlines.
+
+    The first setpoint is sent one interval after the call, matching a motor
+    that is still at the start speed. Setpoints that are already overdue are
+    dropped in favour of the newest due one.
+
+    Args:
+        schedule: Setpoints to play back
+        apply: Sends one speed to the driver
+        on_step: Called after every sent speed (e.g. to record a measurement)
+        should_abort: Polled while waiting, stops the ramp when it returns True
+
+    Returns:
+        (completed, last sent speed or None if nothing was sent)
+    """
+    times = schedule.times
+    speeds = schedule.speeds
+    count = len(speeds)
+    start = time.monotonic()
+    last_speed = None
+    i = 0
+    while i < count:
+        deadline = start + times[i]
+        while True:
+            if should_abort is not None and should_abort():
+                return False, last_speed
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, ABORT_POLL_INTERVAL))
+
+        # jump to the newest setpoint that is due
+        elapsed = time.monotonic() - start
+        i = max(i, int(np.searchsorted(times, elapsed, side="right")) - 1)
+
+        last_speed = int(speeds[i])
+        apply(last_speed)
+        if on_step is not None:
+            on_step(last_speed)
+        i += 1
+    return True, last_speed
@@ -0,0 +1,147 @@
+"""Background sampler of the PoStep256 real-time (0xA0) data stream.
+
+A single thread reads the stream at a fixed rate through the PoStep256 I/O
+worker and stores the decoded samples in a preallocated ring buffer. Motor
+handlers, the status endpoints and the WebSocket layer read positions from the
+buffer instead of issuing their own USB reads.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+from app.api.handlers.postep256_io import PoStep256IOWorker
+
+
+class StreamRingBuffer:
+    """Fixed-size, timestamped ring buffer of decoded stream samples."""
+
+    def __init__(self, capacity: int = 4096):
+        """Init function for the ring buffer."""
+        self._capacity = capacity
+        self._time = np.zeros(capacity, dtype=np.float64)
+        self._pos = np.zeros(capacity, dtype=np.int64)
+        self._speed = np.zeros(capacity, dtype=np.int64)
+        self._final = np.zeros(capacity, dtype=np.int64)
+        self._endswitch = np.zeros(capacity, dtype=np.bool_)
+        self._seq = 0  # total number of samples ever appended
+        self._cond = threading.Condition()
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the newest sample (0 when empty)."""
+        return self._seq
+
+    def append(
+        self, timestamp: float, pos: int, speed: int, final: int, endswitch: bool
+    ) -> None:
+        """Store a sample, overwriting the oldest one when full."""
+        with self._cond:
+            i = self._seq % self._capacity
+            self._time[i] = timestamp
+            self._pos[i] = pos
+            self._speed[i] = speed
+            self._final[i] = final
+            self._endswitch[i] = endswitch
+            self._seq += 1
+            self._cond.notify_all()
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Get the newest sample, or None when nothing was sampled yet."""
+        with self._cond:
+            return self._sample(self._seq)
+
+    def wait_for_newer(self, seq: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait for a sample newer than ``seq``, return None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > seq, timeout=timeout):
+                return None
+            return self._sample(self._seq)
+
+    def snapshot(self, count: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Copy the newest ``count`` samples (all when None) in chronological order."""
+        with self._cond:
+            available = min(self._seq, self._capacity)
+            count = available if count is None else min(count, available)
+            idx = np.arange(self._seq - count, self._seq) % self._capacity
+            return {
+                "time": self._time[idx],
+                "pos": self._pos[idx],
+                "speed": self._speed[idx],
+                "final": self._final[idx],
+                "endswitch": self._endswitch[idx],
+            }
+
+    def _sample(self, seq: int) -> Optional[Dict[str, Any]]:
+        if seq == 0:
+            return None
+        i = (seq - 1) % self._capacity
+        return {
+            "seq": seq,
+            "time": float(self._time[i]),
+            "pos": int(self._pos[i]),
+            "speed": int(self._speed[i]),
+            "final": int(self._final[i]),
+            "endswitch": bool(self._endswitch[i]),
+        }
+
+
+class StreamSampler:
+    """Thread that polls the real-time stream at a fixed rate into a ring buffer."""
+
+    def __init__(
+        self,
+        worker: PoStep256IOWorker,
+        buffer: StreamRingBuffer,
+        rate_hz: float = 100.0,
+        name: str = "postep256-stream",
+    ):
+        """Init function for the sampler."""
+        self._worker = worker
+        self._buffer = buffer
+        self._period = 1.0 / rate_hz
+        self._name = name
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.read_errors = 0
+
+    def start(self) -> None:
+        """Start sampling."""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 3) -> None:
+        """Stop sampling and wait for the thread to finish."""
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        next_time = time.monotonic()
+        while self._running:
+            try:
+                status = self._worker.submit("read_stream").result()
+                self._buffer.append(
+                    time.time(),
+                    status["pos"],
+                    status["speed"],
+                    status["final"],
+                    status["endswitch"],
+                )
+            except Exception as e:
+                self.read_errors += 1
+                if self.read_errors % 100 == 1:
+                    print(f"Error reading PoStep256 stream: {e}")
+
+            # Fixed-rate schedule; skip missed ticks instead of bursting
+            next_time += self._period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
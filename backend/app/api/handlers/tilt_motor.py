@@ -1,128 +1,97 @@
 import asyncio
-import threading
 import time
-from collections import deque
-from datetime import datetime
-from typing import Any, Deque, Dict
+from typing import Callable, Optional
 
-from app.api.handlers.postep256_handler import postep256_handler
-from app.asyncio_loop import get_event_loop
+from app.api.handlers.motion_engine import MotionContext
+from app.api.handlers.motor_controller import MotorController
+from app.config import settings
 from app.database.tilt_motor_handler import (
+    TILT_EXPORT_COLUMNS,
+    copy_tilt_measurements,
+    count_tilt_measurements,
     create_entry,
-    create_tilt_measurements_batch,
     create_tilt_scenario,
+    delete_tilt_measurements,
     delete_tilt_scenario,
     get_entries,
+    get_entry,
     get_tilt_measurements,
     get_tilt_scenario,
     get_tilt_scenarios,
+    stream_tilt_measurements,
     update_tilt_scenario,
 )
-from app.models import MotorStatus, MoveScenario
+from app.measurement_buffer import TILT_STATES, MeasurementBatch
+from app.measurement_compression import reconstruct
+from app.models import CompressionPolicy, MotorStatus, MoveScenario
 from app.websocket_manager import manager
 
 STEPPER_STEP_ANGLE = 1.8
 GEAR_RATIO = 50
 
 
-class TiltMotorHandler:
+class TiltMotorHandler(MotorController):
     """Handler for the Tilt PoStep motor."""
 
+    label = "Tilt"
+    serial_setting = "tilt_motor_serial"
+    export_columns = TILT_EXPORT_COLUMNS
+
     # ---------------------------------------------------------
     # Initialization
     # ---------------------------------------------------------
 
     def __init__(self):
         """Init function for the handler."""
-        self._postep = None
-        self._motor_status = MotorStatus.IDLE
-        self._is_moving = False
+        super().__init__(
+            "angle",
+            "state",
+            TILT_STATES,
+            save_interval=0.2,  # Save queue to DB every 0.2 seconds
+            max_speed=40000,
+            max_acceleration=40000,
+            max_deceleration=40000,
+        )
         self._max_position_deg = 2000000
         self._min_position_deg = -2000000
-        self._position_deg = 0  # in degrees
-        self._max_speed = 40000
-        self._max_acceleration = 40000
-        self._max_deceleration = 40000
         self._calculated_steps = 0
-        self._initialized = False
-        self._tilt_motor_task: threading.Thread = None
-        self._tilt_motor_running = False
-        self._tilt_motor_start_time = 0
-        self._tilt_motor_paused = False
-        self._pause_pressed = False
-        self._resume_pressed = False
-        self._stop_pressed = False
-        self._prev_pause_state = False
-        self._measurement_queue: Deque[Dict[str, Any]] = deque()
-        self._queue_lock = threading.Lock()
-        self._current_entry_id: int = None
-        self._save_interval = 0.2  # Save queue to DB every 1 second
-        self._save_measurements_task: threading.Thread = None
-
-    def initialize(self):
-        """Initialize motor hardware with PoStep256 USB."""
-        try:
-            # Initialize shared device if not already initialized
-            if not postep256_handler.is_initialized():
-                postep256_handler.initialize(
-                    max_speed=self._max_speed,
-                    max_accel=self._max_acceleration,
-                    max_decel=self._max_deceleration,
-                )
 
-            # Get the shared postep instance
-            self._postep = postep256_handler.get_postep()
-            self._position_deg = postep256_handler.get_position()
+    def _configure_device(self):
+        # self._postep.set_driver_settings(step_mode=4)
+        # self._postep.set_run(True)
+        time.sleep(0.2)
 
-            # Configure motor-specific settings
-            # self._postep.set_driver_settings(step_mode=4)
-            # self._postep.set_run(True)
-            time.sleep(0.2)
+    # ---------------------------------------------------------
+    # Controller hooks
+    # ---------------------------------------------------------
 
-            # Update position after settings
-            try:
-                stream_data = self._postep.read_stream()
-                if stream_data and "pos" in stream_data:
-                    self._position_deg = stream_data["pos"]
-                    postep256_handler.update_position(self._position_deg)
-            except Exception as e:
-                print(f"Warning: Could not read position: {e}")
+    def _copy_measurements(self, cur, batch: MeasurementBatch) -> int:
+        return copy_tilt_measurements(cur, batch)
 
-            self._initialized = True
-        except Exception as e:
-            self._motor_status = MotorStatus.ERROR
-            self._initialized = False
-            raise Exception(f"Error initializing Tilt motor: {e}")
+    def _stream_measurements(self, entry_id, start, end, columns=None):
+        return stream_tilt_measurements(
+            entry_id, start, end, settings.export_chunk_rows, columns
+        )
 
-    # ---------------------------------------------------------
-    # Internal helpers (movement + websocket + measurement queue)
-    # ---------------------------------------------------------
-    def _submit_async(self, coro):
-        try:
-            loop = get_event_loop()
-            asyncio.run_coroutine_threadsafe(coro, loop)
-        except Exception as e:
-            print(f"Async submission error: {e}")
+    def _count_measurements(self, entry_id):
+        return count_tilt_measurements(entry_id)
 
-    def _move_if_allowed(
-        self, target_position, standstill_duration, move_duration
-    ) -> bool:
-        """Check if the motor can move to the target position and move to the position."""
-        if self._tilt_motor_paused or not self._tilt_motor_running:
-            return False
-        self.move_to_deg(target_position, move_duration + 10)
-        time.sleep(standstill_duration)
-        return True
+    def _delete_measurements(self, entry_id, expected):
+        return delete_tilt_measurements(entry_id, expected)
 
-    def _send_tilt_stopped_websocket(self):
-        """Send a tilt stopped update to the WebSocket."""
-        try:
-            self._submit_async(manager.send_tilt_stopped())
-        except Exception as e:
-            print(f"Error sending WebSocket update: {e}")
+    async def _send_measurements(self, batch: MeasurementBatch):
+        await manager.send_measurements(batch)
+
+    async def _send_stopped(self):
+        await manager.send_tilt_stopped()
 
-    def _tilt_motor_thread(
+    # ---------------------------------------------------------
+    # Motion program (runs on the event loop, see motion_engine)
+    # ---------------------------------------------------------
+
+    async def _tilt_program(
         self,
+        ctx: MotionContext,
         angle,
         repetitions,
         min_tilt,
@@ -134,131 +103,103 @@ class TiltMotorHandler:
         standstill_duration_horizontal,
         standstill_duration_right,
     ):
+        positions = [min_tilt, 0, max_tilt]
+        angle_diff = 20 / (angle)
+        C = 90
+        req_speed = (
+            6 / move_duration * C * 2**microstepping * (angle_diff)
+        ) / angle_diff  # 4000 is (test) found constant for time calculation
         try:
-            positions = [min_tilt, 0, max_tilt]
-            i = 1
-            angle_diff = 20 / (angle)
-            C = 90
-            req_speed = (
-                6 / move_duration * C * 2**microstepping * (angle_diff)
-            ) / angle_diff  # 4000 is (test) found constant for time calculation
-            self._postep.move_config(
+            await ctx.io(
+                self._postep.move_config,
                 max_speed=int(req_speed),
                 max_accel=int(20000),
                 max_decel=int(5000),
                 endsw=None,
             )
-            self._postep.move_reset_to_zero()
-            time.sleep(0.2)
-            self._tilt_motor_start_time = time.time()
-            self.move_to_deg(0)
+            await ctx.io(self._postep.move_reset_to_zero)
+            await asyncio.sleep(0.2)
+            self._run_start_time = time.time()
+            await self._move_to_deg_in_run(ctx, 0)
             start_time = time.time()
             if repetitions == 0:
                 repetitions = 1000000000
-            while self._tilt_motor_running and time.time() - start_time < repetitions:
-                self.send_repetitions_websocket(i)
+            i = 1
+            cycle = (
+                (max_tilt, standstill_duration_right),
+                (0, standstill_duration_horizontal),
+                (min_tilt, standstill_duration_left),
+                (0, standstill_duration_horizontal),
+            )
+            while time.time() - start_time < repetitions:
+                await manager.send_repetitions(i)
                 i += 1
-
-                if not self._move_if_allowed(
-                    max_tilt, standstill_duration_right, move_duration
-                ):
-                    break
-                if not self._move_if_allowed(
-                    0, standstill_duration_horizontal, move_duration
-                ):
-                    break
-                if not self._move_if_allowed(
-                    min_tilt, standstill_duration_left, move_duration
-                ):
-                    break
-                if not self._move_if_allowed(
-                    0, standstill_duration_horizontal, move_duration
-                ):
-                    break
+                for target_position, standstill_duration in cycle:
+                    await self._move_to_deg_in_run(
+                        ctx, target_position, move_duration + 10
+                    )
+                    await ctx.sleep(standstill_duration)
                 if time.time() - start_time > repetitions:
-                    self.send_repetitions_websocket(i)
+                    await manager.send_repetitions(i)
                     break
-            if self._tilt_motor_running:
-                self.move_to_deg(0)
-                self.move_to_deg(positions[end_position])
-            if self._save_measurements_task:
-                self._save_measurements_task.join(timeout=3)
-                self._save_measurements_task = None
-            self._send_tilt_stopped_websocket()
-            self._tilt_motor_running = False
-            self._tilt_motor_start_time = 0
-            self._is_moving = False
-            self._motor_status = MotorStatus.IDLE
-            self.stop_motor()
-        except Exception as e:
-            print(f"Error in tilt_motor thread: {e}")
-
-    def send_repetitions_websocket(self, repetitions: int):
-        """Send measurements to the WebSocket."""
-        try:
-            self._submit_async(manager.send_repetitions(repetitions))
-        except RuntimeError:
-            print("Error sending repetitions to WebSocket")
-
-    def _add_to_measurement_queue(
-        self, entry_id: int, angle: float, state: str, time: datetime
-    ):
-        """Add a measurement to the queue."""
-        with self._queue_lock:
-            self._measurement_queue.append(
-                {
-                    "entry_id": entry_id,
-                    "angle": angle,
-                    "state": state,
-                    "time": time,
-                }
+            await self._move_to_deg_in_run(ctx, 0)
+            await self._move_to_deg_in_run(ctx, positions[end_position])
+        finally:
+            if ctx.stop_requested:
+                await ctx.io(self._postep.run_sleep, False)
+            await ctx.io(self.stop_motor)
+
+    async def _move_to_deg_in_run(
+        self, ctx: MotionContext, target_position: int, timeout: float = 10
+    ) -> bool:
+        """Move to a position within a run, holding it while the run is paused."""
+        if (
+            target_position < self._min_position_deg
+            or target_position > self._max_position_deg
+        ):
+            raise ValueError(
+                f"Target position {target_position} out of range [{self._min_position_deg}, {self._max_position_deg}]"
             )
+        self._is_moving = True
+        self._motor_status = MotorStatus.MOVING
+        await ctx.io(self._postep.move_to, int(target_position))
+        start_time = time.time()
+        while True:
+            ctx.check_stopped()
+            if ctx.pause_requested:
+                await ctx.io(self._postep.move_to_stop)
+                if not await ctx.wait_resumed():
+                    ctx.check_stopped()
+                self._is_moving = True
+                self._motor_status = MotorStatus.MOVING
+                await ctx.io(self._postep.move_to, int(target_position))
+                start_time = time.time()
+                continue
+
+            stream_data = await ctx.io(self._device.read_stream)
+            if stream_data and "pos" in stream_data:
+                self._position_deg = stream_data["pos"]
+                self._queue_position()
+                if self._position_deg == target_position:
+                    return True
+            if time.time() - start_time > timeout:
+                await ctx.io(self._postep.move_to_stop)
+                print(
+                    "Error moving tilt motor: "
+                    "Failed to reach target position within timeout."
+                )
+                return False
 
-    def _save_measurements_batch(self):
-        """Save queued measurements to database in batch and return the batch."""
-        measurements_to_save: list[Dict[str, Any]] = []
-        with self._queue_lock:
-            if self._measurement_queue:
-                measurements_to_save = list(self._measurement_queue)
-                self._measurement_queue.clear()
-
-        if not measurements_to_save:
-            return []
+    # ---------------------------------------------------------
+    # Measurement queue
+    # ---------------------------------------------------------
 
-        try:
-            create_tilt_measurements_batch(measurements_to_save)
-        except Exception as e:
-            print(f"Error saving measurements batch: {e}")
-            # Re-add measurements to queue on error
-            with self._queue_lock:
-                self._measurement_queue.extendleft(reversed(measurements_to_save))
-            # On error we consider nothing was successfully sent
-            return []
-
-        return measurements_to_save
-
-    def _handle_measurements_thread(self, entry_id: int):
-        """Thread that periodically saves queued measurements to database."""
-        self._current_entry_id = entry_id
-        while self._tilt_motor_running:
-            batch = self._save_measurements_batch()
-            if batch:
-                self.send_measurements_websocket(batch)
-            time.sleep(self._save_interval)
-
-        # Save any remaining measurements when stopping
-        final_batch = self._save_measurements_batch()
-        if final_batch:
-            self.send_measurements_websocket(final_batch)
-
-        self._current_entry_id = None
-
-    def send_measurements_websocket(self, measurements: list[Dict[str, Any]]):
-        """Send measurements to the WebSocket."""
-        try:
-            self._submit_async(manager.send_measurements(measurements))
-        except Exception as e:
-            print(f"Error sending WebSocket update: {e}")
+    def _queue_position(self):
+        """Queue the current position as a measurement of the running entry."""
+        self._queue_measurement(
+            float(self._position_deg) / self._calculated_steps / 50,
+            self._motor_status.value,
+        )
 
     # ---------------------------------------------------------
     # Public motor control (tilt, move, home)
@@ -278,37 +219,39 @@ class TiltMotorHandler:
         standstill_duration_left: int = 0.2,
         standstill_duration_horizontal: int = 0.2,
         standstill_duration_right: int = 0.2,
+        compression: Optional[CompressionPolicy] = None,
     ) -> bool:
         """Tilt motor from min to max in non-stop motion."""
         if min_tilt < self._min_position_deg or max_tilt > self._max_position_deg:
             print("Targets exceed the maximum tilt options.")
             return False
 
-        if self._is_moving:
+        if self._is_moving or not self.reserve_run():
             print("Tilt motor is already moving.")
             return False
-        self._postep.get_driver_settings()
-        self._postep.set_driver_settings(step_mode=4, microstep=microstepping)
-        time.sleep(0.1)
-        entry_id = create_entry(
-            name=entry_name,
-            tilt_scenario_id=scenario_id,
-            scenario_name=scenario_name,
-        )
+        try:
+            if self._postep.set_driver_settings(step_mode=4, microstep=microstepping):
+                time.sleep(0.1)
+            compression = self.compression_policy(compression)
+            entry_id = create_entry(
+                name=entry_name,
+                tilt_scenario_id=scenario_id,
+                scenario_name=scenario_name,
+                compression=compression.model_dump(mode="json"),
+            )
 
-        self._current_entry_id = entry_id
-        self._postep.set_run(True)
-        time.sleep(0.1)
-        self._tilt_motor_running = True
-        self._tilt_motor_paused = False
-        self._is_moving = True
-        self._motor_status = MotorStatus.MOVING
+            self._postep.set_run(True)
+            time.sleep(0.1)
+        except Exception:
+            self.release_run()
+            raise
         self._calculated_steps = int(1 / (STEPPER_STEP_ANGLE / (2**microstepping)))
         min_deg = min_tilt * self._calculated_steps * GEAR_RATIO
         max_deg = max_tilt * self._calculated_steps * GEAR_RATIO
-        self._tilt_motor_task = threading.Thread(
-            target=self._tilt_motor_thread,
-            args=(
+        return self.start_run(
+            entry_id,
+            lambda ctx: self._tilt_program(
+                ctx,
                 max_tilt,
                 repetitions,
                 min_deg,
@@ -320,59 +263,23 @@ class TiltMotorHandler:
                 standstill_duration_horizontal,
                 standstill_duration_right,
             ),
-            daemon=True,
+            compression,
         )
-        self._tilt_motor_task.start()
-        self._save_measurements_task = threading.Thread(
-            target=self._handle_measurements_thread,
-            args=(entry_id,),
-            daemon=True,
-        )
-        self._save_measurements_task.start()
-        return True
 
-    def stop_tilt_motor(self):
-        """Manually stop the tilt motor motion."""
-        if (
-            self._tilt_motor_running
-            and self._tilt_motor_task
-            and self._tilt_motor_task.is_alive()
-        ):
-            self._stop_pressed = True
-            self._is_moving = False
-            self._motor_status = MotorStatus.IDLE
-            self._postep.run_sleep(False)
-            self._tilt_motor_running = False  # Stop the save thread
-            self._tilt_motor_task.join(timeout=3)
-            self._tilt_motor_task = None
-
-    def pause_tilt_motor(self):
-        """Pause the tilt motor motion temporarily."""
-        if (
-            self._tilt_motor_running
-            and self._tilt_motor_task
-            and self._tilt_motor_task.is_alive()
-            and not self._tilt_motor_paused
-        ):
-            self._pause_pressed = True
-            self._resume_pressed = False
+    def stop_tilt_motor(self) -> bool:
+        """Manually stop the tilt motor motion, waiting until the run has ended."""
+        return self.stop_run()
+
+    def pause_tilt_motor(self) -> bool:
+        """Pause the tilt motor motion, returns before the motor has stopped."""
+        return self.pause_run()
 
-    def resume_tilt_motor(self):
+    def resume_tilt_motor(self) -> bool:
         """Resume the tilt motor motion from where it was paused."""
-        if (
-            self._tilt_motor_running
-            and self._tilt_motor_task
-            and self._tilt_motor_task.is_alive()
-            and self._tilt_motor_paused
-        ):
-            self._resume_pressed = True
-            self._pause_pressed = False
-            self._tilt_motor_paused = False
-            self._is_moving = True
-            self._motor_status = MotorStatus.MOVING
+        return self.resume_run()
 
     def move_to_deg(self, target_position: int, timeout: int = 10) -> bool:
-        """Move motor to a specified degree value."""
+        """Move motor to a specified degree value, outside of a tilt run."""
         if self._motor_status == MotorStatus.ERROR:
             self._initialized = False
             print("There is an error with the tilt motor.")
@@ -394,49 +301,16 @@ class TiltMotorHandler:
             start_time = time.time()
 
             while True:
-                stream_data = self._postep.read_stream()
-                if self._stop_pressed:
-                    self._set_stop_movement_flags()
-                    break
-
-                if self._pause_pressed and not self._prev_pause_state:
-                    self._postep.move_to_stop()
-                    self._set_pause_movement_flags()
-                    timeout = 1000000
-
-                if self._resume_pressed and self._prev_pause_state:
-                    self._postep.move_to(target_position)
-                    start_time = time.time()
-                    self._set_resume_movement_flags()
-
+                stream_data = self._device.read_stream()
                 if stream_data and "pos" in stream_data:
                     self._position_deg = stream_data["pos"]
-                    if self._current_entry_id is not None:
-                        self._add_to_measurement_queue(
-                            entry_id=self._current_entry_id,
-                            angle=float(self._position_deg)
-                            / self._calculated_steps
-                            / 50,
-                            time=time.time() - self._tilt_motor_start_time,
-                            state=self._motor_status.value,
-                        )
                     if self._position_deg == target_position:
                         break
-                if (
-                    not self._pause_pressed
-                    and not self._stop_pressed
-                    and time.time() - start_time > timeout
-                ):
+                if time.time() - start_time > timeout:
                     self._postep.move_to_stop()
-                    stream_data = self._postep.read_stream()
-                    if stream_data and "pos" in stream_data:
-                        self._position_deg = stream_data["pos"]
-
-                        self._new_data_available = True
                     raise TimeoutError(
                         "Failed to reach target position within timeout."
                     )
-                time.sleep(0.01)
 
         except Exception as e:
             self._is_moving = False
@@ -464,24 +338,55 @@ class TiltMotorHandler:
 
         return True
 
-    def move_to_home(self, direction: str = "cw") -> bool:
-        """Move motor to home."""
+    def move_to_home(
+        self,
+        direction: str = "cw",
+        should_abort: Optional[Callable[[], bool]] = None,
+        progress: Optional[Callable[[float, str], None]] = None,
+    ) -> bool:
+        """Move motor to home, blocking until the end switch is found.
+
+        Args:
+            direction: Unused, homing always searches clockwise
+            should_abort: Polled while searching, True stops the motor
+            progress: Called with the fraction done and a status message
+
+        Returns:
+            True when homed, False if aborted
+        """
         # if self._position_deg < 0:
         #    direction = "ccw"
         # if self._position_deg != 0:
         self._postep.run_sleep(True)
-        self._postep.get_driver_settings()
-        self._postep.set_driver_settings(step_mode=2, microstep=2)
-        time.sleep(0.2)
+        if self._postep.set_driver_settings(step_mode=2, microstep=2):
+            time.sleep(0.2)
+        if progress:
+            progress(0.0, "Searching end switch")
         self._postep.set_requested_speed(400, "cw")
+        start_time = time.time()
         while True:
-            stream_data = self._postep.read_stream()
+            if should_abort and should_abort():
+                self._postep.set_requested_speed(0)
+                self._postep.run_sleep(False)
+                self._is_moving = False
+                self._motor_status = MotorStatus.IDLE
+                return False
+            if time.time() - start_time > settings.tilt_home_timeout:
+                self._postep.set_requested_speed(0)
+                self._postep.run_sleep(False)
+                self._motor_status = MotorStatus.ERROR
+                raise Exception(
+                    f"End switch not reached within {settings.tilt_home_timeout} s"
+                )
+            stream_data = self._device.read_stream()
             if stream_data and "endswitch" in stream_data:
                 if not stream_data["endswitch"]:
                     time.sleep(0.05)
                     self._postep.set_requested_speed(0)
 
                     break
+        if progress:
+            progress(0.5, "Moving to zero position")
         self._postep.move_reset_to_zero()
         time.sleep(0.2)
         self._postep.set_requested_speed(400, "ccw")
@@ -496,40 +401,6 @@ class TiltMotorHandler:
         self._motor_status = MotorStatus.IDLE
         return True
 
-    # ---------------------------------------------------------
-    # Movement state helpers + status
-    # ---------------------------------------------------------
-
-    def _set_stop_movement_flags(self):
-        """Set flags to stop motor movement."""
-        self._is_moving = False
-        self._stop_pressed = False
-        self._pause_pressed = False
-        self._resume_pressed = False
-        self._prev_pause_state = False
-        self._tilt_motor_paused = False
-        self._tilt_motor_running = False
-
-    def _set_pause_movement_flags(self):
-        """Set flags to pause motor movement."""
-        self._prev_pause_state = True
-        self._tilt_motor_paused = True
-        self._pause_pressed = False
-
-    def _set_resume_movement_flags(self):
-        """Set flags to resume motor movement."""
-        self._prev_pause_state = False
-        self._tilt_motor_paused = False
-
-    def get_status(self) -> dict:
-        """Get current motor status."""
-        return {
-            "status": self._motor_status.value,
-            "position": self._position_deg,
-            "is_moving": self._is_moving,
-            "initialized": self._initialized,
-        }
-
     # ---------------------------------------------------------
     # Scenario DB wrappers
     # ---------------------------------------------------------
@@ -541,9 +412,37 @@ class TiltMotorHandler:
         """Get list of entries."""
         return get_entries()
 
-    def get_measurements(self, entry_id: str, limit: int = 1000) -> list[dict]:
-        """Get list of measurements."""
-        return get_tilt_measurements(entry_id=entry_id, limit=limit)
+    def get_measurements(
+        self,
+        entry_id: str,
+        limit: int = 1000,
+        interval: Optional[float] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        points: Optional[int] = None,
+    ) -> list[dict]:
+        """Get list of measurements.
+
+        Args:
+            entry_id: Entry of the measurements
+            limit: Maximum number of stored rows to read
+            interval: Resample the stored (compressed) rows at this spacing in
+                seconds, None returns the stored rows
+            start: Window start in seconds of the run
+            end: Window end in seconds of the run
+            points: Downsample the window to about this many rows
+        """
+        measurements = self._archived_measurements(entry_id, limit, start, end, points)
+        if measurements is None:
+            measurements = get_tilt_measurements(
+                entry_id=entry_id, limit=limit, start=start, end=end, points=points
+            )
+        if interval:
+            entry = get_entry(entry_id) or {}
+            measurements = reconstruct(
+                measurements, "angle", interval, entry.get("compression"), limit
+            )
+        return measurements
 
     def get_move_scenarios(self) -> list[dict]:
         """Get list of move scenarios."""
@@ -576,6 +475,7 @@ class TiltMotorHandler:
 
     def cleanup(self):
         """Cleanup resources."""
+        super().cleanup()
         if self._is_moving:
             self.stop_motor()
         if self._postep:
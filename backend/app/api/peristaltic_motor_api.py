@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 
 from app.api.handlers.peristaltic_motor import peristaltic_motor_handler
 from app.auth import get_current_active_user
+from app.jobs import job_manager
+from app.measurement_export import export_response
 from app.models import (
     EntryResponse,
     PeristalticCalibration,
@@ -28,14 +30,24 @@ def calibrate_rotate_motor(
     request: RPMCalibrationRequest,
     current_user: User = Depends(get_current_active_user),
 ):
-    """Calibrate peristaltic motor RPM."""
+    """Start a peristaltic motor RPM calibration as a background job."""
     try:
-        success = peristaltic_motor_handler.start_rpm_calibration(
-            duration=request.duration,
-            rpm=request.rpm,
-            direction=request.direction,
+        job = job_manager.submit(
+            "rpm_calibration",
+            "peristaltic",
+            lambda job: peristaltic_motor_handler.start_rpm_calibration(
+                duration=request.duration,
+                rpm=request.rpm,
+                direction=request.direction,
+                should_abort=lambda: job.cancel_requested,
+                progress=job.report,
+            ),
         )
-        return {"success": success, "message": "Peristaltic motor calibrated."}
+        return {
+            "success": True,
+            "job_id": job.id,
+            "message": "Peristaltic motor calibration started.",
+        }
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
@@ -49,7 +61,10 @@ def calibrate_rotate_motor(
 def stop_calibrate(current_user: User = Depends(get_current_active_user)):
     """Stop RPM calibration."""
     try:
-        success = peristaltic_motor_handler.stop_rpm_calibration()
+        job = job_manager.active("peristaltic")
+        success = job is not None and job.kind == "rpm_calibration"
+        if success:
+            job_manager.cancel(job.id)
         return {"success": success, "message": "Peristaltic motor calibration stopped."}
     except Exception as e:
         print(f"Error stopping peristaltic motor calibration: {e}")
@@ -196,6 +211,7 @@ def rotate_motor(
             calibration_name=request.calibration_name,
             calibration_preset=request.calibration_preset,
             movements=request.movements,
+            compression=request.compression,
         )
         return {"success": success, "message": "Rotate motor started."}
     except ValueError as e:
@@ -226,7 +242,7 @@ def pause_rotate(current_user: User = Depends(get_current_active_user)):
     """Pause peristaltic motor rotation."""
     try:
         success = peristaltic_motor_handler.pause_peristaltic_motor()
-        return {"success": success, "message": "Peristaltic motor paused."}
+        return {"success": success, "message": "Peristaltic motor pausing."}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
@@ -368,16 +384,85 @@ def get_peristaltic_entries(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/entries/{entry_id}/archive")
+def archive_entry(
+    entry_id: int,
+    drop: bool = Query(False, description="Delete the archived rows from the database"),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Start archiving a finished entry's measurements as a background job."""
+    try:
+        job = job_manager.submit(
+            "archive",
+            "peristaltic_archive",
+            lambda job: peristaltic_motor_handler.archive_entry(
+                entry_id,
+                drop=drop,
+                should_abort=lambda: job.cancel_requested,
+                progress=job.report,
+            ),
+        )
+        return {
+            "success": True,
+            "job_id": job.id,
+            "message": f"Archiving peristaltic entry {entry_id}.",
+        }
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/measurements/export")
+def export_measurements(
+    entry_id: str = Query(..., description="Entry to export"),
+    fmt: str = Query(
+        "csv", alias="format", description="csv, ndjson, parquet or arrow"
+    ),
+    gzip: bool = Query(False, description="Compress the file with gzip"),
+    start: float | None = Query(None, description="Window start, seconds of the run"),
+    end: float | None = Query(None, description="Window end, seconds of the run"),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Stream every stored peristaltic measurement of an entry as a file."""
+    return export_response(
+        peristaltic_motor_handler,
+        f"peristaltic_entry_{entry_id}",
+        entry_id,
+        fmt,
+        gzip,
+        start,
+        end,
+    )
+
+
 @router.get("/measurements", response_model=list[PeristalticMeasurementResponse])
 def get_measurements(
     entry_id: str = Query(..., description="Filter by entry ID (required)"),
     limit: int = Query(1000, description="Maximum number of results"),
+    interval: float | None = Query(
+        None,
+        gt=0,
+        description="Resample the stored (compressed) series at this spacing in seconds",
+    ),
+    start: float | None = Query(None, description="Window start, seconds of the run"),
+    end: float | None = Query(None, description="Window end, seconds of the run"),
+    points: int | None = Query(
+        None,
+        gt=1,
+        description="Downsample the window to about this many points (min/max per bucket)",
+    ),
     current_user: User = Depends(get_current_active_user),
 ):
     """Get peristaltic measurements for a specific entry."""
     try:
         measurements = peristaltic_motor_handler.get_measurements(
-            entry_id=entry_id, limit=limit
+            entry_id=entry_id,
+            limit=limit,
+            interval=interval,
+            start=start,
+            end=end,
+            points=points,
         )
         return [
             PeristalticMeasurementResponse(
@@ -7,7 +7,9 @@ Original repository: https://github.com/IRNAS/postep256-pyusb-driver
 """
 
 from .postep256usb import PoStep256USB
+from .simulator import SimulatedPoStep256
+from .transport import UsbTransport
 
 __version__ = "1.0.0"
 __author__ = "IRNAS"
-__all__ = ["PoStep256USB"]
+__all__ = ["PoStep256USB", "SimulatedPoStep256", "UsbTransport"]
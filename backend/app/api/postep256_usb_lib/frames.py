@@ -0,0 +1,119 @@
+"""Preallocated PoStep256 command frames and response decoders.
+
+Every command sent to the driver is a 64-byte frame with the opcode in byte 1
+and the payload from byte 20 on. Instead of building a fresh list per command,
+:class:`CommandFrames` keeps one ``bytearray`` per opcode and overwrites its
+payload in place with precompiled :class:`struct.Struct` objects. Responses are
+decoded with ``unpack_from`` directly on the array returned by the transport.
+
+The frames are reused, so a :class:`CommandFrames` instance must only be used
+from one thread at a time (PoStep256USB calls are serialised by the I/O worker).
+"""
+
+import struct
+
+FRAME_SIZE = 64
+PAYLOAD_OFFSET = 20
+
+# 480000 kHz/step_value = speed
+SPEED_CLOCK = 480000
+
+_SPEED = struct.Struct("<IB")  # step value, direction
+_TRAJECTORY = struct.Struct("<iIIIB")  # final, speed, accel, decel, flags
+_CONFIGURATION = struct.Struct("<IIIB")  # velocity, accel, decel, settings
+
+STREAM = struct.Struct(">iii")  # pos, speed, final at byte 20
+CONFIGURATION = struct.Struct("<III")  # velocity, accel, decel at byte 24
+DEVICE_INFO = struct.Struct(">HHxxxH")  # bootloader fw, app fw, supply voltage
+TEMPERATURE = struct.Struct(">H")  # at byte 44
+
+
+class CommandFrames(object):
+    """Reusable command frames, one preallocated buffer per opcode."""
+
+    def __init__(self):
+        """Create an empty set of frames, buffers are allocated on first use."""
+        self._frames = {}
+
+    def _frame(self, opcode):
+        frame = self._frames.get(opcode)
+        if frame is None:
+            frame = bytearray(FRAME_SIZE)
+            frame[1] = opcode
+            self._frames[opcode] = frame
+        return frame
+
+    def simple(self, opcode):
+        """Frame without payload (stream enable, stop, reset to zero, reads)."""
+        return self._frame(opcode)
+
+    def device_info(self):
+        """Frame requesting device information."""
+        return self._frame(0x01)
+
+    def run_sleep(self, run):
+        """Frame switching the driver between run and sleep mode."""
+        frame = self._frame(0xA1)
+        frame[PAYLOAD_OFFSET] = 0x01 if run else 0x00
+        return frame
+
+    def requested_speed(self, speed, direction="cw"):
+        """Frame setting the requested speed in speed mode."""
+        step_values = SPEED_CLOCK / speed if speed != 0 else SPEED_CLOCK
+        frame = self._frame(0x90)
+        _SPEED.pack_into(
+            frame,
+            PAYLOAD_OFFSET,
+            int(step_values),
+            0x01 if direction == "ccw" else 0x00,
+        )
+        return frame
+
+    def trajectory(self, final_position, max_speed, max_accel, max_decel, endsw):
+        """Frame moving to a position with the driver's trajectory generator."""
+        # InvDir<<2|NCSw<<1| SwEn
+        flags = 0
+        if endsw is not None:
+            flags |= 0b00000001
+            if endsw == "nc":
+                flags |= 0b00000010
+        frame = self._frame(0xB1)
+        # do not enable autorun
+        frame[2] = 0b00000000
+        _TRAJECTORY.pack_into(
+            frame,
+            PAYLOAD_OFFSET,
+            final_position,
+            max_speed,
+            max_accel,
+            max_decel,
+            flags,
+        )
+        return frame
+
+    def configuration(self, velocity, acceleration, deceleration, settings):
+        """Frame changing the motion configuration."""
+        frame = self._frame(0x87)
+        _CONFIGURATION.pack_into(
+            frame, 24, velocity, acceleration, deceleration, settings
+        )
+        return frame
+
+    def driver_settings(self, settings_list):
+        """Frame writing the driver settings register block."""
+        frame = self._frame(0x80)
+        frame[20:36] = settings_list[40:56]
+        frame[37] = settings_list[62]
+        frame[38:44] = settings_list[56:62]
+        frame[44] = settings_list[63]
+        return frame
+
+    def pwm(self, duty1_ccw, duty2_ccw, duty1_acw, duty2_acw):
+        """Frame setting the PWM duty cycles."""
+        frame = self._frame(0xB0)
+        frame[20:24] = b"\x00\x00\x00\x18"
+        frame[45] = duty1_ccw
+        frame[46] = duty1_acw
+        frame[47] = duty2_ccw
+        frame[48] = duty2_acw
+        return frame
@@ -3,7 +3,6 @@
 import logging
 import os
 import platform
-import struct
 import time
 
 import usb
@@ -11,6 +10,9 @@ import usb.backend.libusb1
 import usb.core
 import usb.util
 
+from .frames import CONFIGURATION, DEVICE_INFO, STREAM, TEMPERATURE, CommandFrames
+from .transport import UsbTransport
+
 os.environ["PYUSB_DEBUG"] = "debug"  # for extra debugging of USB
 
 VENDOR_ID = 0x1DC3
@@ -19,13 +21,21 @@ OUT_ENDPOINT = 0x01
 IN_ENDPOINT = 0x81
 
 
+def _debug_enabled():
+    return logging.getLogger().isEnabledFor(logging.DEBUG)
+
+
 class PoStep256USB(object):
     """PoStep256USB class."""
 
-    def __init__(self, log_level=logging.INFO, serial_number=None):
+    def __init__(self, log_level=logging.INFO, serial_number=None, transport=None):
         self.was_kernel_driver_active = False
         self.device = None
+        self.transport = None
         self.is_moving = False
+        self.frames = CommandFrames()
+        # decoded shadow of the driver settings block, None until read
+        self._driver_settings = None
 
         logging.basicConfig(
             format="%(asctime)s - %(levelname)s - %(message)s",
@@ -39,6 +49,14 @@ class PoStep256USB(object):
             )
         )
 
+        if transport is not None:
+            # Frames are exchanged with a non-USB transport (e.g. the simulator)
+            logging.info("Using {} transport.".format(type(transport).__name__))
+            self.device = transport
+            self.transport = transport
+            self._init_motor_parameters()
+            return
+
         if serial_number is None:
             # Select the first device on the list
             logging.info(
@@ -50,7 +68,8 @@ class PoStep256USB(object):
             logging.info(f"Selected device serial number: {serial_number}.")
             self.device = usb.core.find(
                 idVendor=VENDOR_ID,
-                idProduct=PRODUCT_ID,  # serial_number=serial_number
+                idProduct=PRODUCT_ID,
+                custom_match=lambda d: PoStep256USB._read_serial(d) == serial_number,
             )
         # if the OS kernel already claimed the device
         if self.device is not None and platform.system() != "Windows":
@@ -71,6 +90,10 @@ class PoStep256USB(object):
         # Claim interface 0
         usb.util.claim_interface(self.device, 0)
 
+        self.transport = UsbTransport(self.device, self.was_kernel_driver_active)
+        self._init_motor_parameters()
+
+    def _init_motor_parameters(self):
         self.configuration = self.read_configuration()
 
         # initialize motor parameter
@@ -79,6 +102,16 @@ class PoStep256USB(object):
         self.max_decel = 3000
         self.endsw = None
 
+    @staticmethod
+    def _read_serial(device):
+        """Read the identifier reported by discover_devices, None if unreadable."""
+        try:
+            if platform.system() == "Windows":
+                return usb.util.get_string(device, device.iProduct)
+            return usb.util.get_string(device, device.iSerialNumber)
+        except (usb.core.USBError, ValueError):
+            return None
+
     @staticmethod
     def discover_devices():
         """Discover PoStep256USB devices."""
@@ -133,38 +166,25 @@ class PoStep256USB(object):
 
     def __del__(self):
         """Destructor for PoStep256USB class."""
-        if self.device is not None:
-            usb.util.release_interface(self.device, 0)
-
-        # This applies to Linux only - reattach the kernel driver if we previously detached it
-        if self.was_kernel_driver_active:
-            self.device.attach_kernel_driver(0)
-            logging.info("Kernel driver reattached.")
+        if getattr(self, "transport", None) is not None:
+            self.transport.close()
 
     def get_device_info(self):
         """Get device information."""
-        data_list = [0] * 64
-
-        data_list[0] = 0x00
-        data_list[1] = 0x01
-        data_list[63] = 0x00
-
-        self.write_to_postep(data_list)
+        self.write_to_postep(self.frames.device_info())
         # request data with 500ms tuimeout
         received = self.read_from_postep(500)
 
-        received = list(received)
-
-        bl_fw_version = (received[1] << 8) | received[2]
+        bl_fw_version, app_fw_version, supply_voltage = DEVICE_INFO.unpack_from(
+            received, 1
+        )
         print(f"Bootloader fw version: {bl_fw_version}")
-
-        app_fw_version = (received[3] << 8) | received[4]
         print(f"App fw version: {app_fw_version}")
 
-        supply_voltage = (received[8] * 256 + received[9]) * 0.072
+        supply_voltage = supply_voltage * 0.072
         print(f"Supply voltage: {supply_voltage}")
 
-        temperature = (received[44] * 256 + received[45]) * 0.125
+        temperature = TEMPERATURE.unpack_from(received, 44)[0] * 0.125
         print(f"Device temperature: {temperature}")
 
         status = received[
@@ -179,12 +199,9 @@ class PoStep256USB(object):
 
     def enable_rt_stream(self):
         """Enable real-time data streaming."""
-        data_list = [0] * 64
         # request data streaming
-        data_list[1] = 0xA0
-        # write to driver
         logging.info("postep_enable_rt_stream")
-        self.write_to_postep(data_list)
+        self.write_to_postep(self.frames.simple(0xA0))
         # request data with 500ms tuimeout
         received = self.read_from_postep(500)
         # check if response is valid
@@ -197,13 +214,15 @@ class PoStep256USB(object):
         """Read real-time data stream."""
         received = self.read_from_postep(200)
         # parse data
-        status = {}
-        status["pos"], status["speed"], status["final"] = struct.unpack(
-            ">iii", received[20:32]
-        )
-
-        status["endswitch"] = bool((received[6] >> 6) & 0x01)
-        logging.debug("Status: {}".format(status))
+        pos, speed, final = STREAM.unpack_from(received, 20)
+        status = {
+            "pos": pos,
+            "speed": speed,
+            "final": final,
+            "endswitch": bool((received[6] >> 6) & 0x01),
+        }
+        if _debug_enabled():
+            logging.debug("Status: {}".format(status))
         return status
 
     def run_sleep(self, run):
@@ -212,14 +231,9 @@ class PoStep256USB(object):
         Args:
             run (bool): True to run, False to sleep
         """
-        data_list = [0] * 64
-        # request data streaming
-        data_list[1] = 0xA1
-        if run is True:
-            data_list[20] = 0x01
         # write to driver
         logging.info("postep_run_sleep {}".format(run))
-        self.write_to_postep(data_list)
+        self.write_to_postep(self.frames.run_sleep(run is True))
         # request data
         received = self.read_from_postep(500)
         # check if response is valid
@@ -237,22 +251,13 @@ class PoStep256USB(object):
         :param self: Description
         :param speed: Description
         """
-        data_list = [0] * 64
-        # request data streaming
-        data_list[1] = 0x90
         # 480000 kHz/step_value = speed
-        if speed != 0:
-            step_values = 480000 / speed
-        else:
-            step_values = 480000
-        data_list[20:24] = struct.pack("<I", int(step_values))
-        if direction == "ccw":
-            data_list[24] = 0x01
+        data = self.frames.requested_speed(speed, direction)
         # write to driver
         logging.info("postep_move_speed {}".format(speed))
-        self.write_to_postep(data_list)
+        self.write_to_postep(data)
         # write again - TODO this is an unknown bug
-        self.write_to_postep(data_list)
+        self.write_to_postep(data)
         # request data
         received = self.read_from_postep(500)
         # check if response is valid
@@ -267,11 +272,7 @@ class PoStep256USB(object):
         Args:
             run (bool): True to run, False to sleep
         """
-        data_list = [0] * 64
-        data_list[1] = 0xA1
-        data_list[20] = 0x01 if run else 0x00
-
-        self.write_to_postep(data_list)
+        self.write_to_postep(self.frames.run_sleep(run))
 
         received = self.read_from_postep(500)
         print(list(received))
@@ -279,61 +280,46 @@ class PoStep256USB(object):
 
     def read_configuration(self):
         """Read the configuration of the motor driver."""
-        data_list = [0] * 64
-        data_list[1] = 0x88
-
-        self.write_to_postep(data_list)
+        self.write_to_postep(self.frames.simple(0x88))
         received = self.read_from_postep(500)
         print(list(received))
 
-        received = list(received)
-
-        velocity_max = int.from_bytes(received[24:28], byteorder="little")
-        print(f"raw bytes velocity: {received[24:28]}")
+        velocity_max, acceleration, deceleration = CONFIGURATION.unpack_from(
+            received, 24
+        )
         print(f"Velocity max: {velocity_max}")
-
-        acceleration = int.from_bytes(received[28:32], byteorder="little")
-        print(f"Raw bytes acceleration: {received[28:32]}")
         print(f"Acceleration: {acceleration}")
-
-        deceleration = int.from_bytes(received[32:36], byteorder="little")
-        print(f"Raw bytes deceleration: {received[32:36]}")
         print(f"Deceleration: {deceleration}")
 
         settings_byte = received[36]
         print(f"Settings byte: {settings_byte}")
 
-        self.current_settings = received  # store settings as a list
+        self.current_settings = bytearray(received)  # store a mutable copy
+        self.invalidate_driver_settings()  # current_settings no longer holds 0x81 data
 
     def write_driver_settings(self, settings_list):
         """Write driver settings to the motor driver."""
-        data_list = [0] * 64
-        data_list[1] = 0x80
-        data_list[20:36] = settings_list[40:56]
-        data_list[37] = settings_list[62]
-        data_list[38:44] = settings_list[56:62]
-        data_list[44] = settings_list[63]
-
-        print(f"Writing data list: {data_list}")
+        data_list = self.frames.driver_settings(settings_list)
+
+        print(f"Writing data list: {list(data_list)}")
         self.write_to_postep(data_list)
         self.write_to_postep(data_list)
         time.sleep(1)
         received = self.read_from_postep(500)
+        if received is None:
+            logging.error("No response.")
+            return False
         print(list(received))
+        return received[15] == 0x80
 
     def read_driver_settings(self):
         """Read driver settings from the motor driver."""
-        data_list = [0] * 64
-        data_list[1] = 0x81
-
-        self.write_to_postep(data_list)
+        self.write_to_postep(self.frames.simple(0x81))
         received = self.read_from_postep(500)
 
-        received = list(received)
+        received = bytearray(received)  # mutable copy, kept as current_settings
 
-        usb.util.dispose_resources(
-            self.device
-        )  # close connection to free usb - reading fails without this line
+        self.transport.dispose()  # close connection to free usb - reading fails without this line
 
         return received
 
@@ -348,22 +334,9 @@ class PoStep256USB(object):
             deceleration (int): Deceleration in steps per second squared
             settings (int): Settings byte
         """
-        data_list = [0] * 64
-        data_list[1] = 0x87
-
-        # set velocity
-        data_list[24:28] = list(velocity.to_bytes(4, "little"))
-
-        # set acceleration
-        data_list[28:32] = list(acceleration.to_bytes(4, "little"))
-
-        # set deceleration
-        data_list[32:36] = list(deceleration.to_bytes(4, "little"))
-
-        # set settings
-        data_list[36] = settings
-
-        self.write_to_postep(data_list)
+        self.write_to_postep(
+            self.frames.configuration(velocity, acceleration, deceleration, settings)
+        )
 
         received = self.read_from_postep(500)
         print(list(received))
@@ -384,19 +357,9 @@ class PoStep256USB(object):
             duty1_acw (int): Duty cycle for clockwise rotation
             duty2_acw (int): Duty cycle for clockwise rotation
         """
-        data_list = [0] * 64
-        data_list[1] = 0xB0
-        data_list[20] = 0
-        data_list[21] = 0
-        data_list[22] = 0
-        data_list[23] = 24
-
-        data_list[45] = duty1_ccw
-        data_list[46] = duty1_acw
-        data_list[47] = duty2_ccw
-        data_list[48] = duty2_acw
-
-        self.write_to_postep(data_list)
+        self.write_to_postep(
+            self.frames.pwm(duty1_ccw, duty2_ccw, duty1_acw, duty2_acw)
+        )
 
         received = self.read_from_postep(500)
         print(list(received))
@@ -447,23 +410,9 @@ class PoStep256USB(object):
             max_decel (int): Maximal deceleration
             endsw (str): End switch configuration, either "nc" or "no"
         """
-        data_list = [0] * 64
-        data_list[1] = 0xB1
-        # do not enable autorun
-        data_list[2] = 0b00000000
-        # Set trajectory final position
-        data_list[20:24] = struct.pack("<i", final_position)
-        # Set trajectory max speed
-        data_list[24:28] = struct.pack("<I", max_speed)
-        # Set traject. max acceleration
-        data_list[28:32] = struct.pack("<I", max_accel)
-        # Set traject. max deceleration
-        data_list[32:36] = struct.pack("<I", max_decel)
-        # Set InvDir<<2|NCSw<<1| SwEn
-        if endsw is not None:
-            data_list[36] = data_list[36] | 0b00000001
-            if endsw == "nc":
-                data_list[36] = data_list[36] | 0b00000010
+        data_list = self.frames.trajectory(
+            final_position, max_speed, max_accel, max_decel, endsw
+        )
         # write to driver
         error = False
         for x in range(3):
@@ -491,11 +440,8 @@ class PoStep256USB(object):
     def move_to_stop(self):
         """Stop the motor."""
         # stop trajectory
-        data_list = [0] * 64
-        data_list[1] = 0xB2
-
         # write to driver
-        self.write_to_postep(data_list)
+        self.write_to_postep(self.frames.simple(0xB2))
         # request data
         logging.info("move_to_stop")
         received = self.read_from_postep(500)
@@ -508,12 +454,9 @@ class PoStep256USB(object):
     def move_reset_to_zero(self):
         """Reset the motor position to zero."""
         # zero trajectory
-        data_list = [0] * 64
-        data_list[1] = 0xB3
-
         # write to driver
         logging.info("move_reset_to_zero")
-        self.write_to_postep(data_list)
+        self.write_to_postep(self.frames.simple(0xB3))
         # request data
         received = self.read_from_postep(500)
         # check if response is valid
@@ -525,30 +468,24 @@ class PoStep256USB(object):
     def system_reset(self):
         """Reset the motor driver."""
         # note driver will disconnect from USB
-        data_list = [0] * 64
-        data_list[1] = 0x02
-
         # write to driver
         logging.info("postep_system_reset")
-        self.write_to_postep(data_list)
+        self.invalidate_driver_settings()
+        self.write_to_postep(self.frames.simple(0x02))
 
     def write_to_postep(self, data_list):
         """Write data to the motor driver.
 
         Args:
-            data_list (list): List of data to write
+            data_list (bytearray): Frame to write, a list of ints is also accepted
         """
-        # data_list = [0] * 64
-        # for run/sleep send data[1] = 0xA1
-        # data_list[0] = 0x01
-        # data_list[1] = 0x90
-
-        data = bytearray(data_list)
-        logging.debug("Writing command: {}".format(bytes(data).hex()))
+        data = data_list if isinstance(data_list, bytearray) else bytearray(data_list)
+        if _debug_enabled():
+            logging.debug("Writing command: {}".format(data.hex()))
 
         num_bytes_written = 0
         try:
-            num_bytes_written = self.device.write(OUT_ENDPOINT, data, 500)
+            num_bytes_written = self.transport.write(OUT_ENDPOINT, data, 500)
         except usb.core.USBError as e:
             print(e.args)
 
@@ -565,11 +502,12 @@ class PoStep256USB(object):
         data = None
         for x in range(3):
             try:
-                data = self.device.read(IN_ENDPOINT, 64, timeout)
+                data = self.transport.read(IN_ENDPOINT, 64, timeout)
             except usb.core.USBError as e:
                 print("Error reading response: {}".format(e.args))
                 continue
-            logging.debug("Receive command: {}".format(bytes(data).hex()))
+            if _debug_enabled():
+                logging.debug("Receive command: {}".format(bytes(data).hex()))
             if len(data) == 0:
                 logging.error("No data received")
                 data = None
@@ -613,13 +551,46 @@ class PoStep256USB(object):
         print(f"Reg 0: {reg_0}, reg 1: {reg_1}")
         return current
 
-    def get_driver_settings(self):
-        """Get the PoStep driver settings."""
+    def invalidate_driver_settings(self):
+        """Drop the cached driver settings so the next get re-reads them."""
+        self._driver_settings = None
+
+    def get_driver_settings(self, refresh=False):
+        """Get the PoStep driver settings.
+
+        The settings block is read once and then kept in sync by
+        set_driver_settings, so repeated calls do not touch USB.
+
+        Args:
+            refresh (bool): Re-read the settings from the driver
+
+        Raises:
+            Exception: If no valid settings block was read and none is cached
+        """
+        if self._driver_settings is not None and not refresh:
+            return dict(self._driver_settings)
+
+        valid = False
         for _ in range(0, 3):
             received = self.read_driver_settings()
             if received[15] == 0x81:
+                valid = True
                 break
 
+        if not valid:
+            # Never decode or keep a block that is not a settings reply
+            print("Could not read valid driver settings")
+            if self._driver_settings is not None:
+                return dict(self._driver_settings)
+            raise Exception("Could not read valid driver settings")
+
+        settings = self._decode_driver_settings(received)
+        self.current_settings = received
+        self._driver_settings = settings
+
+        return dict(settings)
+
+    def _decode_driver_settings(self, received):
         settings = {}
 
         ctrl_reg = received[40:42]
@@ -658,38 +629,62 @@ class PoStep256USB(object):
         print(f"Calculated current: {overheat_current}")  # works
         settings["overheat_current"] = round(overheat_current, 1)
 
-        self.current_settings = received
-
         return settings
 
     def set_driver_settings(
         self, microstep=None, fsc=None, idlec=None, overheatc=None, step_mode=4
     ):
-        """Set PoStep driver settings."""
+        """Set PoStep driver settings.
+
+        The 0x80 write (and its settle delay) is skipped when the requested
+        values match the cached settings block.
+
+        Returns:
+            bool: True if the settings were written to the driver
+        """
+        if self._driver_settings is None:
+            self.get_driver_settings()
+
+        new_settings = bytearray(self.current_settings)
         if microstep is not None:
-            current_ctrl_reg = self.current_settings[40]
+            current_ctrl_reg = new_settings[40]
             current_ctrl_reg &= 0x87
             new_ctrl_reg = current_ctrl_reg | (int(microstep) << 3)
-            self.current_settings[40] = new_ctrl_reg
+            new_settings[40] = new_ctrl_reg
         if fsc is not None:
             torque = self.fullscale_current_to_torque(float(fsc), self.is_gain)
-            self.current_settings[42] = torque
+            new_settings[42] = torque
         if idlec is not None:
             idle_current_0, idle_current_1 = self.current_to_reg_val(float(idlec))
-            self.current_settings[57] = idle_current_0
-            self.current_settings[58] = idle_current_1
+            new_settings[57] = idle_current_0
+            new_settings[58] = idle_current_1
         if overheatc is not None:
             overheat_current_0, overheat_current_1 = self.current_to_reg_val(
                 float(overheatc)
             )
-            self.current_settings[59] = overheat_current_0
-            self.current_settings[60] = overheat_current_1
+            new_settings[59] = overheat_current_0
+            new_settings[60] = overheat_current_1
         if step_mode is not None:
             # current_ctrl_reg = self.current_settings[40]
             # current_ctrl_reg &= 0x87
             # new_ctrl_reg = current_ctrl_reg | (int(step_mode) << 3)
-            self.current_settings[37] = step_mode
+            new_settings[37] = step_mode
             # self.current_settings[40] = new_ctrl_reg
 
-        print("Current settings: ", self.current_settings)
-        self.write_driver_settings(self.current_settings)
+        # only bytes 40-63 are carried by the 0x80 frame
+        if (
+            self._driver_settings is not None
+            and new_settings[40:64] == self.current_settings[40:64]
+        ):
+            logging.info("postep_driver_settings unchanged, skipping write")
+            self.current_settings = new_settings
+            return False
+
+        print("Current settings: ", list(new_settings))
+        written = self.write_driver_settings(new_settings)
+        self.current_settings = new_settings
+        if written:
+            self._driver_settings = self._decode_driver_settings(new_settings)
+        else:
+            self.invalidate_driver_settings()
+        return True
@@ -0,0 +1,329 @@
+"""In-process simulation of a PoStep256 driver.
+
+The simulator implements the same ``write``/``read`` interface as
+:class:`UsbTransport`, so a :class:`PoStep256USB` instance built on top of it
+runs every code path of the backend without an electronics box attached.
+Command frames are decoded the same way the firmware does and the motor is
+modelled as a point mass with speed, acceleration and an end switch.
+"""
+
+import array
+import math
+import struct
+import threading
+import time
+
+import usb.core
+
+FRAME_SIZE = 64
+
+# 480000 kHz/step_value = speed, see PoStep256USB.set_requested_speed
+SPEED_CLOCK = 480000
+
+STATUS_SLEEP = 0x01
+STATUS_ACTIVE = 0x02
+STATUS_IDLE = 0x03
+
+MODE_IDLE = "idle"
+MODE_SPEED = "speed"
+MODE_TRAJECTORY = "trajectory"
+
+# Largest integration step used when advancing the motion model
+MAX_SUBSTEP = 0.001
+# Lowest speed in trajectory mode before the target is reached, steps/s
+MIN_CREEP_SPEED = 10.0
+
+
+def _default_settings_block():
+    """Return the driver settings register block (bytes 40-63 of a 0x81 reply)."""
+    block = bytearray(24)
+    block[0] = 2 << 3  # control register, microstepping in bits 3-6
+    block[1] = 0x01  # is_gain
+    block[2] = 0x80  # torque
+    block[17], block[18] = 123, 3  # idle current (1.0 A)
+    block[19], block[20] = 61, 3  # overheat current (0.5 A)
+    return block
+
+
+class SimulatedPoStep256(object):
+    """Simulated PoStep256 driver answering with firmware-compatible frames."""
+
+    def __init__(
+        self,
+        latency_ms=1.0,
+        stream_period_ms=5.0,
+        endswitch_position=2000,
+        max_accel=40000,
+        serial_number="SIM-0",
+    ):
+        """Create a simulated driver.
+
+        Args:
+            latency_ms (float): Delay added to every USB transfer
+            stream_period_ms (float): Interval between real-time stream frames
+            endswitch_position (int): Raw position at which the end switch closes
+            max_accel (int): Acceleration used in speed mode, steps/s^2
+            serial_number (str): Serial number reported for the device
+        """
+        self.latency = latency_ms / 1000.0
+        self.stream_period = stream_period_ms / 1000.0
+        self.endswitch_position = endswitch_position
+        self.max_accel = max_accel
+        self.serial_number = serial_number
+
+        self._lock = threading.Lock()
+        self._reset_state()
+
+    # ---------------------------------------------------------
+    # Transport interface
+    # ---------------------------------------------------------
+
+    def write(self, endpoint, data, timeout):
+        """Decode and execute a command frame."""
+        self._sleep_latency()
+        frame = bytes(data)
+        with self._lock:
+            self._advance(time.monotonic())
+            self._handle_command(frame)
+        return len(frame)
+
+    def read(self, endpoint, size, timeout):
+        """Return the pending reply or the next real-time stream frame."""
+        self._sleep_latency()
+        with self._lock:
+            pending = self._pending
+            self._pending = None
+            streaming = self._streaming
+            if pending is not None:
+                return array.array("B", pending[:size])
+
+        if not streaming:
+            time.sleep(timeout / 1000.0)
+            raise usb.core.USBTimeoutError("Operation timed out", errno=110)
+
+        now = time.monotonic()
+        with self._lock:
+            wait = self._next_stream_time - now
+            if wait < -self.stream_period:
+                # reader fell behind, do not burst stale frames
+                self._next_stream_time = now
+                wait = 0.0
+            self._next_stream_time += self.stream_period
+        if wait > 0:
+            time.sleep(wait)
+
+        with self._lock:
+            self._advance(time.monotonic())
+            return array.array("B", self._build_frame(0xA0)[:size])
+
+    def dispose(self):
+        """Nothing to release for a simulated device."""
+
+    def close(self):
+        """Nothing to release for a simulated device."""
+
+    # ---------------------------------------------------------
+    # Inspection helpers
+    # ---------------------------------------------------------
+
+    @property
+    def position(self):
+        """Position relative to the last reset to zero, in steps."""
+        with self._lock:
+            self._advance(time.monotonic())
+            return int(round(self._position - self._zero_offset))
+
+    @property
+    def speed(self):
+        """Current signed speed in steps per second."""
+        with self._lock:
+            self._advance(time.monotonic())
+            return self._speed
+
+    # ---------------------------------------------------------
+    # Command decoding
+    # ---------------------------------------------------------
+
+    def _reset_state(self):
+        self._position = 0.0
+        self._zero_offset = 0.0
+        self._speed = 0.0
+        self._mode = MODE_IDLE
+        self._running = False
+        self._streaming = False
+        self._requested_speed = 0.0
+        self._target = 0.0
+        self._traj_speed = 0.0
+        self._traj_accel = 0.0
+        self._traj_decel = 0.0
+        self._configuration = [10000, 2000, 2000, 0]
+        self._settings = _default_settings_block()
+        self._pending = None
+        self._last_update = time.monotonic()
+        self._next_stream_time = self._last_update
+
+    def _handle_command(self, frame):
+        opcode = frame[1]
+
+        if opcode == 0x01:
+            self._pending = self._build_device_info()
+        elif opcode == 0x02:
+            # system reset, the real driver drops off the bus without a reply
+            self._reset_state()
+        elif opcode == 0xA0:
+            self._streaming = True
+            self._next_stream_time = time.monotonic()
+            self._pending = self._build_frame(opcode)
+        elif opcode == 0xA1:
+            self._running = frame[20] == 0x01
+            if not self._running:
+                self._mode = MODE_IDLE
+                self._speed = 0.0
+            self._pending = self._build_frame(opcode)
+        elif opcode == 0x90:
+            (step_values,) = struct.unpack_from("<I", frame, 20)
+            speed = SPEED_CLOCK / step_values if 0 < step_values < SPEED_CLOCK else 0
+            self._requested_speed = -speed if frame[24] == 0x01 else speed
+            self._mode = MODE_SPEED
+            self._pending = self._build_frame(opcode)
+        elif opcode == 0xB1:
+            final, speed, accel, decel = struct.unpack_from("<iIII", frame, 20)
+            self._target = final + self._zero_offset
+            self._traj_speed = float(speed)
+            self._traj_accel = float(max(accel, 1))
+            self._traj_decel = float(max(decel, 1))
+            self._mode = MODE_TRAJECTORY
+            self._pending = self._build_frame(opcode)
+        elif opcode == 0xB2:
+            self._requested_speed = 0.0
+            self._mode = MODE_SPEED
+            self._pending = self._build_frame(opcode)
+        elif opcode == 0xB3:
+            self._zero_offset = self._position
+            self._pending = self._build_frame(opcode)
+        elif opcode == 0x80:
+            self._settings[0:16] = frame[20:36]
+            self._settings[22] = frame[37]
+            self._settings[16:22] = frame[38:44]
+            self._settings[23] = frame[44]
+            self._pending = self._build_frame(opcode)
+        elif opcode == 0x81:
+            reply = self._build_frame(opcode)
+            reply[40:64] = self._settings
+            self._pending = reply
+        elif opcode == 0x87:
+            self._configuration = list(struct.unpack_from("<III", frame, 24))
+            self._configuration.append(frame[36])
+            self._pending = self._build_frame(opcode)
+        elif opcode == 0x88:
+            reply = self._build_frame(opcode)
+            struct.pack_into("<III", reply, 24, *self._configuration[:3])
+            reply[36] = self._configuration[3]
+            self._pending = reply
+        else:
+            self._pending = self._build_frame(opcode)
+
+    # ---------------------------------------------------------
+    # Response frames
+    # ---------------------------------------------------------
+
+    def _build_frame(self, opcode):
+        frame = bytearray(FRAME_SIZE)
+        frame[0] = 0x02
+        frame[15] = opcode
+        if self._endswitch_open():
+            frame[6] |= 1 << 6
+        struct.pack_into(
+            ">iii",
+            frame,
+            20,
+            int(round(self._position - self._zero_offset)),
+            int(round(self._speed)),
+            int(round(self._final_position() - self._zero_offset)),
+        )
+        frame[46] = self._status()
+        return frame
+
+    def _build_device_info(self):
+        frame = bytearray(FRAME_SIZE)
+        frame[0] = 0x02
+        frame[15] = 0x01
+        struct.pack_into(">HH", frame, 1, 100, 200)  # bootloader / app fw
+        struct.pack_into(">H", frame, 8, int(24.0 / 0.072))  # supply voltage
+        struct.pack_into(">H", frame, 44, int(30.0 / 0.125))  # temperature
+        frame[46] = self._status()
+        return frame
+
+    def _status(self):
+        if not self._running:
+            return STATUS_SLEEP
+        return STATUS_ACTIVE if self._speed != 0 else STATUS_IDLE
+
+    def _final_position(self):
+        if self._mode == MODE_TRAJECTORY:
+            return self._target
+        return self._position
+
+    def _endswitch_open(self):
+        # bit reads 1 while the switch is open, homing waits for it to drop
+        return self._position < self.endswitch_position
+
+    # ---------------------------------------------------------
+    # Motion model
+    # ---------------------------------------------------------
+
+    def _advance(self, now):
+        dt = now - self._last_update
+        self._last_update = now
+        if dt <= 0 or not self._running:
+            return
+        if self._mode == MODE_IDLE and self._speed == 0:
+            return
+
+        substeps = min(int(math.ceil(dt / MAX_SUBSTEP)), 10000)
+        step = dt / substeps
+        for _ in range(substeps):
+            if self._mode == MODE_TRAJECTORY:
+                self._step_trajectory(step)
+            else:
+                self._step_speed(step)
+            if self._mode == MODE_IDLE:
+                break
+
+    def _step_speed(self, dt):
+        delta = self._requested_speed - self._speed
+        max_delta = self.max_accel * dt
+        if abs(delta) <= max_delta:
+            self._speed = self._requested_speed
+        else:
+            self._speed += math.copysign(max_delta, delta)
+        self._position += self._speed * dt
+        if self._speed == 0 and self._requested_speed == 0:
+            self._mode = MODE_IDLE
+
+    def _step_trajectory(self, dt):
+        remaining = self._target - self._position
+        direction = math.copysign(1.0, remaining)
+        speed = self._speed * direction
+        stopping_distance = speed * speed / (2 * self._traj_decel)
+
+        if speed < 0 or abs(remaining) > stopping_distance:
+            speed = min(speed + self._traj_accel * dt, self._traj_speed)
+        else:
+            speed = max(speed - self._traj_decel * dt, 0.0)
+        if speed >= 0:
+            # keep creeping so rounding never stalls the motor short of the target
+            speed = max(speed, min(self._traj_speed, MIN_CREEP_SPEED))
+
+        travel = speed * dt
+        if travel >= abs(remaining):
+            self._position = self._target
+            self._speed = 0.0
+            self._mode = MODE_IDLE
+            return
+        self._position += direction * travel
+        self._speed = direction * speed
+
+    def _sleep_latency(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
@@ -0,0 +1,42 @@
+"""Transports used by PoStep256USB to exchange 64-byte frames with a driver."""
+
+import logging
+import platform
+
+import usb.core
+import usb.util
+
+
+class UsbTransport(object):
+    """Transport that talks to a physical PoStep256 driver through pyusb."""
+
+    def __init__(self, device, was_kernel_driver_active=False):
+        """Wrap an already configured and claimed pyusb device.
+
+        Args:
+            device (usb.core.Device): Claimed PoStep256 device
+            was_kernel_driver_active (bool): Reattach the kernel driver on close
+        """
+        self.device = device
+        self.was_kernel_driver_active = was_kernel_driver_active
+
+    def write(self, endpoint, data, timeout):
+        """Write a frame to the given OUT endpoint."""
+        return self.device.write(endpoint, data, timeout)
+
+    def read(self, endpoint, size, timeout):
+        """Read a frame from the given IN endpoint."""
+        return self.device.read(endpoint, size, timeout)
+
+    def dispose(self):
+        """Free the USB resources held for the device."""
+        usb.util.dispose_resources(self.device)
+
+    def close(self):
+        """Release the interface and give the device back to the kernel."""
+        usb.util.release_interface(self.device, 0)
+
+        # This applies to Linux only - reattach the kernel driver if we previously detached it
+        if self.was_kernel_driver_active and platform.system() != "Windows":
+            self.device.attach_kernel_driver(0)
+            logging.info("Kernel driver reattached.")
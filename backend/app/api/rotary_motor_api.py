@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 
 from app.api.handlers.rotary_motor import rotary_motor_handler
 from app.auth import get_current_active_user
+from app.jobs import job_manager
+from app.measurement_export import export_response
 from app.models import (
     EntryResponse,
     RotaryMeasurementResponse,
@@ -29,6 +31,7 @@ def rotate_motor(
             scenario_id=request.scenario_id,
             scenario_name=request.scenario_name,
             movements=request.movements,
+            compression=request.compression,
         )
         return {"success": success, "message": "Rotate motor started."}
     except ValueError as e:
@@ -59,7 +62,7 @@ def pause_rotate(current_user: User = Depends(get_current_active_user)):
     """Pause rotate motor."""
     try:
         success = rotary_motor_handler.pause_rotate_motor()
-        return {"success": success, "message": "Rotate motor paused."}
+        return {"success": success, "message": "Rotate motor pausing."}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
@@ -199,21 +202,90 @@ def get_rotary_entries(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/entries/{entry_id}/archive")
+def archive_entry(
+    entry_id: int,
+    drop: bool = Query(False, description="Delete the archived rows from the database"),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Start archiving a finished entry's measurements as a background job."""
+    try:
+        job = job_manager.submit(
+            "archive",
+            "rotary_archive",
+            lambda job: rotary_motor_handler.archive_entry(
+                entry_id,
+                drop=drop,
+                should_abort=lambda: job.cancel_requested,
+                progress=job.report,
+            ),
+        )
+        return {
+            "success": True,
+            "job_id": job.id,
+            "message": f"Archiving rotary entry {entry_id}.",
+        }
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ============================================================
 # Measurements
 # ============================================================
 
 
+@router.get("/measurements/export")
+def export_measurements(
+    entry_id: str = Query(..., description="Entry to export"),
+    fmt: str = Query(
+        "csv", alias="format", description="csv, ndjson, parquet or arrow"
+    ),
+    gzip: bool = Query(False, description="Compress the file with gzip"),
+    start: float | None = Query(None, description="Window start, seconds of the run"),
+    end: float | None = Query(None, description="Window end, seconds of the run"),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Stream every stored rotary measurement of an entry as a file."""
+    return export_response(
+        rotary_motor_handler,
+        f"rotary_entry_{entry_id}",
+        entry_id,
+        fmt,
+        gzip,
+        start,
+        end,
+    )
+
+
 @router.get("/measurements", response_model=list[RotaryMeasurementResponse])
 def get_measurements(
     entry_id: str = Query(..., description="Filter by entry ID (required)"),
     limit: int = Query(1000, description="Maximum number of results"),
+    interval: float | None = Query(
+        None,
+        gt=0,
+        description="Resample the stored (compressed) series at this spacing in seconds",
+    ),
+    start: float | None = Query(None, description="Window start, seconds of the run"),
+    end: float | None = Query(None, description="Window end, seconds of the run"),
+    points: int | None = Query(
+        None,
+        gt=1,
+        description="Downsample the window to about this many points (min/max per bucket)",
+    ),
     current_user: User = Depends(get_current_active_user),
 ):
     """Get rotary measurements for a specific entry."""
     try:
         measurements = rotary_motor_handler.get_measurements(
-            entry_id=entry_id, limit=limit
+            entry_id=entry_id,
+            limit=limit,
+            interval=interval,
+            start=start,
+            end=end,
+            points=points,
         )
         return [
             RotaryMeasurementResponse(
@@ -2,6 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 
 from app.api.handlers.tilt_motor import tilt_motor_handler
 from app.auth import get_current_active_user
+from app.jobs import job_manager
+from app.measurement_export import export_response
 from app.models import (
     EntryResponse,
     MoveScenario,
@@ -37,6 +39,7 @@ def tilt_motor(
             standstill_duration_left=request.standstill_duration_left,
             standstill_duration_horizontal=request.standstill_duration_horizontal,
             standstill_duration_right=request.standstill_duration_right,
+            compression=request.compression,
         )
         return {"success": success, "message": "Tilt motor started."}
     except ValueError as e:
@@ -67,7 +70,7 @@ def pause_tilt(current_user: User = Depends(get_current_active_user)):
     """Pause tilt motor."""
     try:
         success = tilt_motor_handler.pause_tilt_motor()
-        return {"success": success, "message": "Tilt motor paused."}
+        return {"success": success, "message": "Tilt motor pausing."}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
@@ -92,10 +95,18 @@ def resume_tilt(current_user: User = Depends(get_current_active_user)):
 
 @router.get("/move-home")
 def move_home(current_user: User = Depends(get_current_active_user)):
-    """Move motor to home."""
+    """Start moving the motor to home as a background job."""
     try:
-        success = tilt_motor_handler.move_to_home()
-        return {"success": success, "message": "Motor moved to home."}
+        job = job_manager.submit(
+            "move_home",
+            "tilt",
+            lambda job: tilt_motor_handler.move_to_home(
+                should_abort=lambda: job.cancel_requested, progress=job.report
+            ),
+        )
+        return {"success": True, "job_id": job.id, "message": "Moving motor to home."}
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -228,21 +239,84 @@ def get_tilt_entries(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/entries/{entry_id}/archive")
+def archive_entry(
+    entry_id: int,
+    drop: bool = Query(False, description="Delete the archived rows from the database"),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Start archiving a finished entry's measurements as a background job."""
+    try:
+        job = job_manager.submit(
+            "archive",
+            "tilt_archive",
+            lambda job: tilt_motor_handler.archive_entry(
+                entry_id,
+                drop=drop,
+                should_abort=lambda: job.cancel_requested,
+                progress=job.report,
+            ),
+        )
+        return {
+            "success": True,
+            "job_id": job.id,
+            "message": f"Archiving tilt entry {entry_id}.",
+        }
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ============================================================
 # Measurements
 # ============================================================
 
 
+@router.get("/measurements/export")
+def export_measurements(
+    entry_id: str = Query(..., description="Entry to export"),
+    fmt: str = Query(
+        "csv", alias="format", description="csv, ndjson, parquet or arrow"
+    ),
+    gzip: bool = Query(False, description="Compress the file with gzip"),
+    start: float | None = Query(None, description="Window start, seconds of the run"),
+    end: float | None = Query(None, description="Window end, seconds of the run"),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Stream every stored tilt measurement of an entry as a file."""
+    return export_response(
+        tilt_motor_handler, f"tilt_entry_{entry_id}", entry_id, fmt, gzip, start, end
+    )
+
+
 @router.get("/measurements", response_model=list[TiltMeasurementResponse])
 def get_measurements(
     entry_id: str = Query(..., description="Filter by entry ID (required)"),
     limit: int = Query(1000, description="Maximum number of results"),
+    interval: float | None = Query(
+        None,
+        gt=0,
+        description="Resample the stored (compressed) series at this spacing in seconds",
+    ),
+    start: float | None = Query(None, description="Window start, seconds of the run"),
+    end: float | None = Query(None, description="Window end, seconds of the run"),
+    points: int | None = Query(
+        None,
+        gt=1,
+        description="Downsample the window to about this many points (min/max per bucket)",
+    ),
     current_user: User = Depends(get_current_active_user),
 ):
     """Get tilt measurements for a specific entry."""
     try:
         measurements = tilt_motor_handler.get_measurements(
-            entry_id=entry_id, limit=limit
+            entry_id=entry_id,
+            limit=limit,
+            interval=interval,
+            start=start,
+            end=end,
+            points=points,
         )
         return [
             TiltMeasurementResponse(
@@ -1,3 +1,5 @@
+from typing import Any
+
 from pydantic_settings import BaseSettings
 
 
@@ -30,6 +32,103 @@ class Settings(BaseSettings):
     postgres_host: str = "127.0.0.1"
     postgres_port: int = 5432
 
+    # WebSocket fan-out: per-client outbound queue
+    ws_send_queue_size: int = 256  # messages
+    ws_overflow_policy: str = "drop_oldest"  # drop_oldest, coalesce or disconnect
+    ws_send_timeout: float = 10.0  # seconds before a stuck client is evicted
+    # Live measurement display rate per topic, min/max buckets per second
+    # (0 sends every sample); the database always gets full resolution
+    ws_display_rate_hz: dict[str, float] = {
+        "tilt": 20.0,
+        "rotate": 10.0,
+        "peristaltic": 10.0,
+    }
+
+    # Recent samples of the running entry replayed to new subscribers
+    ws_history_seconds: float = 300.0  # 0 disables the replay
+    ws_history_max_samples: int = 50000  # per topic
+
+    # Motion engine (motor programs on the event loop)
+    motion_io_workers: int = 3  # threads for blocking device calls
+    motion_command_timeout: float = 10.0  # seconds to wait for pause/stop
+
+    # Background jobs (calibration, homing)
+    job_workers: int = 2
+    tilt_home_timeout: float = 120.0  # seconds to find the tilt end switch
+    job_history_size: int = 100  # finished jobs kept for GET /api/jobs
+
+    # Database connection pools (API requests and measurement ingestion)
+    db_api_pool_min_size: int = 1
+    db_api_pool_max_size: int = 4
+    db_ingest_pool_min_size: int = 1
+    db_ingest_pool_max_size: int = 2  # measurement writer and spool replay
+    db_pool_timeout: float = 10.0  # seconds to wait for a free connection
+    db_reconnect_timeout: float = 300.0
+
+    # PoStep256 real-time stream sampling
+    postep_stream_rate_hz: float = 100.0
+    postep_stream_buffer_size: int = 4096
+
+    # PoStep256 device of each motor by serial number (empty: first device)
+    tilt_motor_serial: str = ""
+    rotary_motor_serial: str = ""
+    peristaltic_motor_serial: str = ""
+
+    # PoStep256 simulator (run without an electronics box attached)
+    postep_simulator: bool = False
+    postep_simulator_devices: int = 1  # serial numbers SIM-0, SIM-1, ...
+    postep_simulator_latency_ms: float = 1.0
+    postep_simulator_stream_period_ms: float = 5.0
+
+    # Host-side speed ramps of the rotary and peristaltic motors
+    ramp_profile: str = "linear"  # linear or s_curve
+    ramp_max_step: int = 20  # largest speed change per command
+    ramp_min_interval: float = 0.05  # shortest time between commands, seconds
+    rotary_ramp_acceleration: float = 100.0  # rpm * 100 per second
+    peristaltic_ramp_acceleration: float = 250.0  # speed units per second
+
+    # Default compression of stored measurements per motor, used when a run
+    # request has no policy: mode none, deadband, change_only or
+    # swinging_door, deviation in value units, heartbeat in seconds
+    measurement_compression: dict[str, dict[str, Any]] = {
+        "tilt": {"mode": "none"},
+        "rotary": {"mode": "change_only", "heartbeat": 60.0},
+        "peristaltic": {"mode": "change_only", "heartbeat": 60.0},
+    }
+
+    # Storage of the measurement hypertables: chunks are compressed after
+    # measurement_compress_after and dropped after measurement_retention
+    # (PostgreSQL intervals, empty: never); the 1s/1m/1h continuous aggregates
+    # serve long history windows and outlive dropped raw chunks
+    measurement_compress_after: str = "7 days"
+    measurement_retention: str = ""
+    measurement_aggregates: bool = True
+
+    # Bulk measurement exports (GET /{motor}/measurements/export)
+    export_chunk_rows: int = 10000  # rows per server-side cursor fetch
+    export_max_concurrent: int = 2  # each holds a database connection
+    export_gzip_level: int = 1  # fast, the exports are mostly repetitive
+
+    # Shared measurement writer: a flush writes every table in one transaction
+    # once writer_flush_rows rows are pending or the oldest is writer_flush_ms
+    # old
+    writer_flush_rows: int = 5000
+    writer_flush_ms: float = 1000.0
+
+    # Backlog of measurements the database did not take, in memory up to
+    # spool_memory_rows and then in segment files below spool_dir
+    spool_dir: str = "spool"
+    spool_memory_rows: int = 100000
+    spool_segment_bytes: int = 64 * 1024 * 1024
+    spool_fsync_interval: float = 1.0  # seconds between fsyncs of a segment
+    spool_retry_interval: float = 2.0  # seconds between replay attempts
+    spool_replay_rows: int = 50000  # rows per replay transaction
+
+    # Cold archive of finished entries, one .npy file per column below
+    # archive_dir/<motor>/<entry_id>, read memory-mapped
+    archive_dir: str = "archive"
+    archive_open_entries: int = 16  # archived entries kept mapped
+
     @property
     def database_url(self) -> str:
         """Get database connection URL."""
@@ -1,49 +1,493 @@
 """Database connection and operations."""
 
 import contextlib
-from typing import Optional
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-import psycopg
 from app.config import settings
-from psycopg.rows import dict_row
+from psycopg import sql
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import ConnectionPool
+
+# The measurement writer and API requests use separate pools, so a slow
+# flush never holds the connection a user's query is waiting for
+POOL_API = "api"
+POOL_INGEST = "ingest"
+
+# Measurement hypertables and the entry table their rows belong to
+MEASUREMENT_TABLES = {
+    "tilt_measurements": "tilt_entry_table",
+    "rotary_measurements": "rotation_entry_table",
+    "peristaltic_measurements": "peristaltic_entry_table",
+}
+
+# Continuous aggregates of every measurement table, coarsest first:
+# (bucket width in seconds, view name suffix)
+AGGREGATES = ((3600.0, "1h"), (60.0, "1m"), (1.0, "1s"))
+
+# Largest start_offset of the aggregate refresh policies in schema.sql
+AGGREGATE_REFRESH_WINDOW = "3 days"
 
 
 class Database:
-    """Database connection manager."""
+    """Database connection manager backed by bounded connection pools."""
 
     def __init__(self):
-        """Initialize database connection."""
-        self._conn: Optional[psycopg.Connection] = None
+        """Initialize database connection pools (opened by connect)."""
+        self._pools: Dict[str, ConnectionPool] = {}
+        self._lock = threading.Lock()
+
+    def _create_pool(self, name: str, min_size: int, max_size: int) -> ConnectionPool:
+        return ConnectionPool(
+            settings.database_url,
+            min_size=min_size,
+            max_size=max_size,
+            kwargs={"row_factory": dict_row},
+            # Connections are validated on checkout, broken ones are replaced
+            check=ConnectionPool.check_connection,
+            timeout=settings.db_pool_timeout,
+            reconnect_timeout=settings.db_reconnect_timeout,
+            reconnect_failed=self._reconnect_failed,
+            name=name,
+            open=False,
+        )
+
+    def _reconnect_failed(self, pool: ConnectionPool):
+        print(
+            f"Database pool {pool.name} could not reconnect within "
+            f"{settings.db_reconnect_timeout} s"
+        )
 
     def connect(self):
-        """Connect to the database."""
-        if self._conn is None or self._conn.closed:
-            self._conn = psycopg.connect(settings.database_url, row_factory=dict_row)
-        return self._conn
+        """Open the connection pools and check that the database answers."""
+        with self._lock:
+            if not self._pools:
+                self._pools = {
+                    POOL_API: self._create_pool(
+                        POOL_API,
+                        settings.db_api_pool_min_size,
+                        settings.db_api_pool_max_size,
+                    ),
+                    POOL_INGEST: self._create_pool(
+                        POOL_INGEST,
+                        settings.db_ingest_pool_min_size,
+                        settings.db_ingest_pool_max_size,
+                    ),
+                }
+            for pool in self._pools.values():
+                if pool.closed:
+                    pool.open()
+        # Fail fast when the database is down, the pools stay open and retry
+        with self._pools[POOL_API].connection(timeout=settings.db_pool_timeout):
+            pass
+        return self._pools
 
     def close(self):
-        """Close database connection."""
-        if self._conn and not self._conn.closed:
-            self._conn.close()
-            self._conn = None
+        """Close the connection pools."""
+        for pool in self._pools.values():
+            if not pool.closed:
+                pool.close()
+        self._pools = {}
+
+    def _pool(self, name: str) -> ConnectionPool:
+        pool = self._pools.get(name)
+        if pool is None or pool.closed:
+            self.connect()
+            pool = self._pools[name]
+        return pool
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """Get usage statistics of every pool."""
+        return {name: pool.get_stats() for name, pool in self._pools.items()}
 
     @contextlib.contextmanager
-    def get_connection(self):
-        """Get database connection context manager."""
-        conn = self.connect()
-        try:
+    def get_connection(self, pool: str = POOL_API):
+        """Borrow a connection from a pool for the duration of the context.
+
+        The connection goes back to the pool afterwards; a transaction left
+        open is committed, or rolled back if the block raised.
+        """
+        with self._pool(pool).connection() as conn:
             yield conn
-        finally:
-            pass  # Don't close, reuse connection
 
     @contextlib.contextmanager
-    def get_cursor(self):
+    def get_cursor(self, pool: str = POOL_API):
         """Get database cursor context manager."""
-        with self.get_connection() as conn:
+        with self.get_connection(pool) as conn:
             with conn.cursor() as cur:
                 yield cur
                 conn.commit()
 
 
+def copy_rows(
+    cur,
+    table: str,
+    columns: Sequence[str],
+    types: Sequence[str],
+    rows: Iterable[Sequence],
+) -> int:
+    """Bulk insert rows with ``COPY ... FROM STDIN`` in binary format.
+
+    Args:
+        cur: Cursor of the connection that runs the COPY
+        table: Target table
+        columns: Target columns, in the order of the row values
+        types: PostgreSQL type of every column (binary COPY needs them)
+        rows: Row tuples, consumed as they are sent
+
+    Returns:
+        Number of rows written
+    """
+    statement = sql.SQL("COPY {} ({}) FROM STDIN (FORMAT BINARY)").format(
+        sql.Identifier(table), sql.SQL(", ").join(map(sql.Identifier, columns))
+    )
+    count = 0
+    with cur.copy(statement) as copy:
+        copy.set_types(types)
+        for row in rows:
+            copy.write_row(row)
+            count += 1
+    return count
+
+
+# Start of the entries written most recently, by (entry table, entry id)
+_entry_starts: "OrderedDict[Tuple[str, int], datetime]" = OrderedDict()
+_ENTRY_STARTS_SIZE = 64
+# The writer and the spool replayer look up entries from their own threads
+_entry_starts_lock = threading.Lock()
+
+
+def recorded_rows(cur, entry_table: str, measurements) -> Iterator[Tuple]:
+    """Rows of a measurement batch with the absolute time of every sample.
+
+    The absolute time (``recorded_at``) is the start of the entry
+    (``measurement_timestamp``) plus the seconds since run start in ``time``.
+
+    Args:
+        cur: Cursor with dict rows, used to look up entries not seen before
+        entry_table: Entry table of the measurements
+        measurements: MeasurementBatch to write
+
+    Returns:
+        Iterator of (entry_id, value, code, time, recorded_at) tuples
+
+    Raises:
+        ValueError: If an entry of the batch is not in the entry table
+    """
+    starts = {}
+    missing = []
+    with _entry_starts_lock:
+        for entry_id in set(measurements.entry_id.tolist()):
+            start = _entry_starts.get((entry_table, entry_id))
+            if start is None:
+                missing.append(entry_id)
+            else:
+                _entry_starts.move_to_end((entry_table, entry_id))
+                starts[entry_id] = start
+    if missing:
+        cur.execute(
+            sql.SQL(
+                "SELECT id, measurement_timestamp FROM {} WHERE id = ANY(%s)"
+            ).format(sql.Identifier(entry_table)),
+            (missing,),
+        )
+        for row in cur.fetchall():
+            starts[row["id"]] = row["measurement_timestamp"]
+        unknown = sorted(set(missing) - starts.keys())
+        if unknown:
+            raise ValueError(f"Unknown entries in {entry_table}: {unknown}")
+        with _entry_starts_lock:
+            for entry_id in missing:
+                _entry_starts[(entry_table, entry_id)] = starts[entry_id]
+            while len(_entry_starts) > _ENTRY_STARTS_SIZE:
+                _entry_starts.popitem(last=False)
+    # Looked up before the COPY starts, the connection is busy during it
+    return (
+        (*row, starts[row[0]] + timedelta(seconds=row[3]))
+        for row in measurements.rows()
+    )
+
+
+def apply_storage_policies(cur) -> None:
+    """Set the compression and retention policies of the measurement tables.
+
+    Policies are replaced on every start, so changes of
+    ``measurement_compress_after`` and ``measurement_retention`` take effect
+    with a restart; an empty value removes the policy.
+    """
+    compress_after = settings.measurement_compress_after
+    retention = settings.measurement_retention
+    if retention:
+        cur.execute(
+            "SELECT %s::interval <= %s::interval AS too_short",
+            (retention, AGGREGATE_REFRESH_WINDOW),
+        )
+        if cur.fetchone()["too_short"]:
+            print(
+                f"Measurement retention {retention} is not longer than the "
+                f"aggregate refresh window {AGGREGATE_REFRESH_WINDOW}, "
+                "aggregates of dropped chunks would be emptied"
+            )
+            raise Exception("Measurement retention too short")
+    for table in MEASUREMENT_TABLES:
+        cur.execute("SELECT remove_compression_policy(%s, if_exists => TRUE)", (table,))
+        if compress_after:
+            cur.execute(
+                "SELECT add_compression_policy(%s, %s::interval)",
+                (table, compress_after),
+            )
+        cur.execute("SELECT remove_retention_policy(%s, if_exists => TRUE)", (table,))
+        if retention:
+            cur.execute(
+                "SELECT add_retention_policy(%s, %s::interval)", (table, retention)
+            )
+
+
+def pick_source(
+    cur,
+    table: str,
+    entry_id,
+    start: Optional[float],
+    end: Optional[float],
+    points: int,
+) -> str:
+    """Choose the table or continuous aggregate to downsample a window from.
+
+    The coarsest aggregate whose buckets are at most half the spacing of the
+    requested points is used, so every returned point still covers two or
+    more aggregated buckets; short windows read the raw table. Aggregates
+    keep the lowest and highest sample of each bucket, see
+    :func:`aggregate_extremes`.
+
+    Returns:
+        Name of the measurement table or one of its aggregate views
+    """
+    if not settings.measurement_aggregates:
+        return table
+    if start is None or end is None:
+        cur.execute(
+            sql.SQL(
+                "SELECT min(time) AS t0, max(time) AS t1 FROM {} WHERE entry_id = %s"
+            ).format(sql.Identifier(table)),
+            (entry_id,),
+        )
+        bounds = cur.fetchone()
+        start = bounds["t0"] if start is None else start
+        end = bounds["t1"] if end is None else end
+    if start is None or end is None:
+        return table
+    spacing = (end - start) / max(1, points // 2)
+    for width, suffix in AGGREGATES:
+        if 2 * width <= spacing:
+            return f"{table}_{suffix}"
+    return table
+
+
+def aggregate_extremes(
+    view: str, columns: Sequence[str], value_column: str
+) -> sql.Composable:
+    """Subquery with the rows of the lowest and highest sample of every bucket.
+
+    An aggregate row has the bucket's ``min_value``/``max_value`` and the
+    ``time`` and ``id`` of those samples; they become two rows (one if the
+    same sample is both) with the columns of the measurement table, so the
+    downsampling query selects from them like from the raw samples.
+    """
+    extremes = ("id", "time", value_column)
+    names = dict.fromkeys([*columns, "entry_id", "time"])
+    select = sql.SQL(", ").join(
+        sql.SQL("{}.{}").format(
+            sql.Identifier("x" if name in extremes else "m"), sql.Identifier(name)
+        )
+        for name in names
+    )
+    return sql.SQL(
+        """(
+        SELECT {select}
+        FROM {view} m
+        CROSS JOIN LATERAL (
+            SELECT m.min_id, m.min_time, m.min_value
+            UNION
+            SELECT m.max_id, m.max_time, m.max_value
+        ) AS x (id, time, {value})
+        )"""
+    ).format(
+        select=select, view=sql.Identifier(view), value=sql.Identifier(value_column)
+    )
+
+
+def fetch_downsampled(
+    cur,
+    table: str,
+    columns: Sequence[str],
+    value_column: str,
+    entry_id,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    points: int = 1000,
+) -> List[Dict[str, Any]]:
+    """Get the measurements of an entry in a time window, downsampled in SQL.
+
+    The window is split into ``points / 2`` equal time buckets and only the
+    samples with the lowest and highest value of every bucket are returned,
+    so peaks survive and at most ``points`` rows leave the database however
+    long the entry is. Windows with no more than ``points`` samples are
+    returned in full. Long windows are read from the lowest and highest
+    samples kept by the continuous aggregate picked by :func:`pick_source`
+    instead of the raw samples.
+
+    Args:
+        cur: Cursor with dict rows
+        table: Measurement table with ``entry_id`` and ``time`` columns
+        columns: Columns to return
+        value_column: Column whose extremes are kept
+        entry_id: Entry of the measurements
+        start: Window start in seconds of the run, None for the first sample
+        end: Window end in seconds of the run, None for the last sample
+        points: Target number of rows
+
+    Returns:
+        Rows ordered by time
+    """
+    source = pick_source(cur, table, entry_id, start, end, points)
+    if source == table:
+        rows = sql.Identifier(table)
+    else:
+        rows = aggregate_extremes(source, columns, value_column)
+    column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+    value = sql.Identifier(value_column)
+    query = sql.SQL(
+        """
+        WITH bounds AS (
+            SELECT coalesce(%(start)s::float8, min(time)) AS t0,
+                   coalesce(%(end)s::float8, max(time)) AS t1
+            FROM {rows} s
+            WHERE entry_id = %(entry_id)s
+        ), windowed AS (
+            SELECT {columns},
+                   width_bucket(m.time, b.t0, b.t1 + 1e-9::float8, %(buckets)s) AS bucket
+            FROM {rows} m, bounds b
+            WHERE m.entry_id = %(entry_id)s AND m.time BETWEEN b.t0 AND b.t1
+        ), ranked AS (
+            SELECT *,
+                   row_number() OVER (PARTITION BY bucket ORDER BY {value}, time) AS low,
+                   row_number() OVER (PARTITION BY bucket ORDER BY {value} DESC, time) AS high,
+                   count(*) OVER () AS total
+            FROM windowed
+        )
+        SELECT {columns}
+        FROM ranked
+        WHERE low = 1 OR high = 1 OR total <= %(points)s
+        ORDER BY time
+        """
+    ).format(rows=rows, columns=column_list, value=value)
+    cur.execute(
+        query,
+        {
+            "start": start,
+            "end": end,
+            "entry_id": entry_id,
+            "buckets": max(1, points // 2),
+            "points": points,
+        },
+    )
+    return [dict(row) for row in cur.fetchall()]
+
+
+def stream_rows(
+    table: str,
+    columns: Sequence[str],
+    entry_id,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    chunk_rows: int = 10000,
+) -> Iterator[List[Tuple]]:
+    """Stream the measurements of an entry in time order, chunk by chunk.
+
+    The rows are read through a server-side (named) cursor, so only one chunk
+    is held in memory however long the entry is. The connection stays
+    borrowed until the generator is exhausted or closed.
+
+    Args:
+        table: Measurement table with ``entry_id`` and ``time`` columns
+        columns: Columns to return, in this order
+        entry_id: Entry of the measurements
+        start: Window start in seconds of the run, None for the first sample
+        end: Window end in seconds of the run, None for the last sample
+        chunk_rows: Rows fetched from the server per chunk
+
+    Returns:
+        Iterator of lists of row tuples
+    """
+    query = sql.SQL(
+        """
+        SELECT {columns}
+        FROM {table}
+        WHERE entry_id = %(entry_id)s
+          AND (%(start)s::float8 IS NULL OR time >= %(start)s)
+          AND (%(end)s::float8 IS NULL OR time <= %(end)s)
+        ORDER BY time
+        """
+    ).format(
+        table=sql.Identifier(table),
+        columns=sql.SQL(", ").join(map(sql.Identifier, columns)),
+    )
+    with db.get_connection() as conn:
+        with conn.cursor(name="measurement_export", row_factory=tuple_row) as cur:
+            cur.itersize = chunk_rows
+            cur.execute(query, {"entry_id": entry_id, "start": start, "end": end})
+            while True:
+                rows = cur.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows
+
+
+def count_rows(table: str, entry_id) -> int:
+    """Count the measurements of an entry."""
+    with db.get_cursor() as cur:
+        cur.execute(
+            sql.SQL("SELECT count(*) AS rows FROM {} WHERE entry_id = %s").format(
+                sql.Identifier(table)
+            ),
+            (entry_id,),
+        )
+        return cur.fetchone()["rows"]
+
+
+def delete_rows(table: str, entry_id, expected: int) -> int:
+    """Delete the measurements of an entry.
+
+    The delete is rolled back unless it removes exactly ``expected`` rows, so
+    rows written after the caller counted them are never lost.
+
+    Raises:
+        Exception: If the entry does not have ``expected`` rows
+    """
+    with db.get_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    sql.SQL("DELETE FROM {} WHERE entry_id = %s").format(
+                        sql.Identifier(table)
+                    ),
+                    (entry_id,),
+                )
+                deleted = cur.rowcount
+            if deleted != expected:
+                print(
+                    f"Deleting entry {entry_id} from {table} would remove "
+                    f"{deleted} rows instead of {expected}"
+                )
+                raise Exception("Measurement count changed, nothing deleted")
+            conn.commit()
+            return deleted
+        except Exception:
+            conn.rollback()
+            raise
+
+
 # Global database instance
 db = Database()
@@ -1,9 +1,18 @@
 """Peristaltic Motor Database Operations."""
 
 import json
-from typing import Any, Dict, List, Optional
-
-from app.database.database import db
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.database.database import (
+    copy_rows,
+    count_rows,
+    db,
+    delete_rows,
+    fetch_downsampled,
+    recorded_rows,
+    stream_rows,
+)
+from app.measurement_buffer import MeasurementBatch
 from app.models import (
     PeristalticCalibration,
     PeristalticScenario,
@@ -17,8 +26,8 @@ from app.models import (
 
 def save_tube_configuration(tube_configuration: TubeConfiguration) -> bool:
     """Save a tube configuration."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -34,15 +43,15 @@ def save_tube_configuration(tube_configuration: TubeConfiguration) -> bool:
                 )
                 conn.commit()
                 return cur.rowcount > 0
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def update_tube_configuration(tube_configuration: TubeConfiguration) -> bool:
     """Update a tube configuration."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -57,15 +66,15 @@ def update_tube_configuration(tube_configuration: TubeConfiguration) -> bool:
                 )
                 conn.commit()
                 return cur.rowcount > 0
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def get_tube_configuration(name: str) -> TubeConfiguration:
     """Get a tube configuration by name."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -75,15 +84,15 @@ def get_tube_configuration(name: str) -> TubeConfiguration:
                     (name,),
                 )
                 return TubeConfiguration.model_validate(dict(cur.fetchone()))
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def get_tube_configurations() -> List[TubeConfiguration]:
     """Get all tube configurations from database."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -95,9 +104,9 @@ def get_tube_configurations() -> List[TubeConfiguration]:
                     TubeConfiguration.model_validate(dict(row))
                     for row in cur.fetchall()
                 ]
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 # ---------------------------------------------------------
@@ -116,8 +125,8 @@ def save_peristaltic_calibration(
     diameter: float,
 ):
     """Save calibration data."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -137,15 +146,15 @@ def save_peristaltic_calibration(
                 )
                 conn.commit()
                 return cur.rowcount > 0
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def update_peristaltic_calibration(calibration: PeristalticCalibration):
     """Update a peristaltic calibration."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -160,9 +169,9 @@ def update_peristaltic_calibration(calibration: PeristalticCalibration):
                 )
                 conn.commit()
                 return cur.rowcount > 0
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def get_peristaltic_calibration(name: str) -> PeristalticCalibration:
@@ -227,8 +236,8 @@ def get_peristaltic_scenario(scenario_id: str) -> Optional[PeristalticScenario]:
 
 def save_peristaltic_scenario(scenario: PeristalticScenario) -> int:
     """Save a new peristaltic scenario and return its ID."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -246,17 +255,17 @@ def save_peristaltic_scenario(scenario: PeristalticScenario) -> int:
                 result = cur.fetchone()
                 conn.commit()
                 return result["id"]
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def update_peristaltic_scenario(
     scenario_id: int, scenario: PeristalticScenario
 ) -> bool:
     """Update an existing peristaltic scenario."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -272,15 +281,15 @@ def update_peristaltic_scenario(
                 )
                 conn.commit()
                 return cur.rowcount > 0
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def remove_peristaltic_scenario(scenario_id: int) -> bool:
     """Delete a peristaltic scenario."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     "UPDATE peristaltic_scenarios SET is_active = FALSE WHERE id = %s",
@@ -288,9 +297,9 @@ def remove_peristaltic_scenario(scenario_id: int) -> bool:
                 )
                 conn.commit()
                 return cur.rowcount > 0
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 # ---------------------------------------------------------
@@ -302,27 +311,34 @@ def create_entry(
     name: str,
     peristaltic_scenario_id: Optional[int] = None,
     scenario_name: Optional[str] = None,
+    compression: Optional[Dict[str, Any]] = None,
 ) -> int:
     """Create a new entry and return its ID."""
     from datetime import datetime
 
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
-                    INSERT INTO peristaltic_entry_table (name, peristaltic_scenario_id, scenario_name, measurement_timestamp)
-                    VALUES (%s, %s, %s, %s)
+                    INSERT INTO peristaltic_entry_table (name, peristaltic_scenario_id, scenario_name, measurement_timestamp, compression)
+                    VALUES (%s, %s, %s, %s, %s)
                     RETURNING id
                 """,
-                    (name, peristaltic_scenario_id, scenario_name, datetime.now()),
+                    (
+                        name,
+                        peristaltic_scenario_id,
+                        scenario_name,
+                        datetime.now(),
+                        json.dumps(compression) if compression else None,
+                    ),
                 )
                 result = cur.fetchone()
                 conn.commit()
                 return int(result["id"])
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def get_entry(entry_id: str) -> Optional[Dict[str, Any]]:
@@ -330,7 +346,7 @@ def get_entry(entry_id: str) -> Optional[Dict[str, Any]]:
     with db.get_cursor() as cur:
         cur.execute(
             """
-            SELECT id, name, peristaltic_scenario_id, scenario_name, measurement_timestamp
+            SELECT id, name, peristaltic_scenario_id, scenario_name, measurement_timestamp, compression
             FROM peristaltic_entry_table
             WHERE id = %s
         """,
@@ -360,8 +376,8 @@ def get_entries() -> List[Dict[str, Any]]:
 
 def create_peristaltic_measurement(measurement_data: Dict[str, Any]) -> str:
     """Create a new peristaltic measurement and return its ID."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -379,51 +395,95 @@ def create_peristaltic_measurement(measurement_data: Dict[str, Any]) -> str:
                 result = cur.fetchone()
                 conn.commit()
                 return str(result["id"])
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
-def create_peristaltic_measurements_batch(measurements: List[Dict[str, Any]]) -> int:
-    """Create multiple peristaltic measurements in a single batch insert."""
+def copy_peristaltic_measurements(cur, measurements: MeasurementBatch) -> int:
+    """Write peristaltic measurements with a single binary COPY.
+
+    The caller owns the transaction, so several tables can be written and
+    committed together.
+    """
     if not measurements:
         return 0
-    try:
-        with db.get_connection() as conn:
-            with conn.cursor() as cur:
-                # Prepare values for batch insert
-                # Convert timestamp (float) back to datetime for PostgreSQL
-                values = [
-                    (
-                        m["entry_id"],
-                        m["flow"],
-                        m["direction"],
-                        m["time"],
-                    )
-                    for m in measurements
-                ]
+    return copy_rows(
+        cur,
+        "peristaltic_measurements",
+        ("entry_id", "flow", "direction", "time", "recorded_at"),
+        ("int4", "float8", "text", "float8", "timestamptz"),
+        recorded_rows(cur, "peristaltic_entry_table", measurements),
+    )
+
+
+# Columns of a measurement export: (name, PostgreSQL type)
+PERISTALTIC_EXPORT_COLUMNS = (
+    ("entry_id", "int4"),
+    ("flow", "float8"),
+    ("direction", "text"),
+    ("time", "float8"),
+    ("recorded_at", "timestamptz"),
+)
 
-                cur.executemany(
-                    """
-                    INSERT INTO peristaltic_measurements
-                    (entry_id, flow, direction, time)
-                    VALUES (%s, %s, %s, %s)
-                """,
-                    values,
-                )
-                conn.commit()
-                return cur.rowcount
-    except Exception:
-        conn.rollback()
-        raise
+
+def stream_peristaltic_measurements(
+    entry_id: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    chunk_rows: int = 10000,
+    columns: Optional[Sequence[str]] = None,
+) -> Iterator[List[Tuple]]:
+    """Stream the peristaltic measurements of an entry in time order, chunk by chunk.
+
+    The rows have the ``PERISTALTIC_EXPORT_COLUMNS`` unless ``columns`` are given.
+    """
+    return stream_rows(
+        "peristaltic_measurements",
+        columns or [name for name, _ in PERISTALTIC_EXPORT_COLUMNS],
+        entry_id,
+        start,
+        end,
+        chunk_rows,
+    )
+
+
+def count_peristaltic_measurements(entry_id: str) -> int:
+    """Count the stored peristaltic measurements of an entry."""
+    return count_rows("peristaltic_measurements", entry_id)
+
+
+def delete_peristaltic_measurements(entry_id: str, expected: int) -> int:
+    """Delete the peristaltic measurements of an entry if it has ``expected`` rows."""
+    return delete_rows("peristaltic_measurements", entry_id, expected)
 
 
 def get_measurements(
     entry_id: Optional[str] = None,
     peristaltic_scenario_id: Optional[str] = None,
     limit: int = 1000,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    points: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
-    """Get peristaltic measurements with optional filters."""
+    """Get peristaltic measurements with optional filters.
+
+    Without a window or point count the most recent ``limit`` rows are
+    returned; otherwise the samples between ``start`` and ``end`` (seconds of
+    the run) downsampled to about ``points`` rows (``limit`` if not given).
+    """
+    if entry_id and (start is not None or end is not None or points):
+        with db.get_cursor() as cur:
+            return fetch_downsampled(
+                cur,
+                "peristaltic_measurements",
+                ("id", "entry_id", "flow", "direction", "time"),
+                "flow",
+                entry_id,
+                start,
+                end,
+                points or limit,
+            )
     with db.get_cursor() as cur:
         # Use a subquery to get the most recent N measurements, then order them ASC for display
         query = """
@@ -1,9 +1,18 @@
 """Rotary Motor Database Operations."""
 
 import json
-from typing import Any, Dict, List, Optional
-
-from app.database.database import db
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.database.database import (
+    copy_rows,
+    count_rows,
+    db,
+    delete_rows,
+    fetch_downsampled,
+    recorded_rows,
+    stream_rows,
+)
+from app.measurement_buffer import MeasurementBatch
 from app.models import RotationScenario
 
 # ---------------------------------------------------------
@@ -41,8 +50,8 @@ def get_rotary_scenario(scenario_id: str) -> Optional[RotationScenario]:
 
 def create_rotary_scenario(scenario: RotationScenario) -> int:
     """Create a new rotary scenario and return its ID."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -59,15 +68,15 @@ def create_rotary_scenario(scenario: RotationScenario) -> int:
                 result = cur.fetchone()
                 conn.commit()
                 return result["id"]
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def update_rotary_scenario(scenario_id: str, scenario: RotationScenario) -> bool:
     """Update an existing tilt scenario."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -83,15 +92,15 @@ def update_rotary_scenario(scenario_id: str, scenario: RotationScenario) -> bool
                 )
                 conn.commit()
                 return cur.rowcount > 0
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def delete_rotary_scenario(scenario_id: str) -> bool:
     """Delete a rotary scenario."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -101,9 +110,9 @@ def delete_rotary_scenario(scenario_id: str) -> bool:
                 )
                 conn.commit()
                 return cur.rowcount > 0
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 # ---------------------------------------------------------
@@ -115,27 +124,34 @@ def create_entry(
     name: str,
     rotary_scenario_id: Optional[int] = None,
     scenario_name: Optional[str] = None,
+    compression: Optional[Dict[str, Any]] = None,
 ) -> int:
     """Create a new entry and return its ID."""
     from datetime import datetime
 
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
-                    INSERT INTO rotation_entry_table (name, rotary_scenario_id, scenario_name, measurement_timestamp)
-                    VALUES (%s, %s, %s, %s)
+                    INSERT INTO rotation_entry_table (name, rotary_scenario_id, scenario_name, measurement_timestamp, compression)
+                    VALUES (%s, %s, %s, %s, %s)
                     RETURNING id
                 """,
-                    (name, rotary_scenario_id, scenario_name, datetime.now()),
+                    (
+                        name,
+                        rotary_scenario_id,
+                        scenario_name,
+                        datetime.now(),
+                        json.dumps(compression) if compression else None,
+                    ),
                 )
                 result = cur.fetchone()
                 conn.commit()
                 return int(result["id"])
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
 
 
 def get_entry(entry_id: str) -> Optional[Dict[str, Any]]:
@@ -143,7 +159,7 @@ def get_entry(entry_id: str) -> Optional[Dict[str, Any]]:
     with db.get_cursor() as cur:
         cur.execute(
             """
-            SELECT id, name, rotary_scenario_id, scenario_name, measurement_timestamp
+            SELECT id, name, rotary_scenario_id, scenario_name, measurement_timestamp, compression
             FROM rotation_entry_table
             WHERE id = %s
         """,
@@ -173,8 +189,8 @@ def get_entries() -> List[Dict[str, Any]]:
 
 def create_rotary_measurement(measurement_data: Dict[str, Any]) -> str:
     """Create a new rotary measurement and return its ID."""
-    try:
-        with db.get_connection() as conn:
+    with db.get_connection() as conn:
+        try:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -193,52 +209,95 @@ def create_rotary_measurement(measurement_data: Dict[str, Any]) -> str:
                 result = cur.fetchone()
                 conn.commit()
                 return str(result["id"])
-    except Exception:
-        conn.rollback()
-        raise
+        except Exception:
+            conn.rollback()
+            raise
+
 
+def copy_rotary_measurements(cur, measurements: MeasurementBatch) -> int:
+    """Write rotary measurements with a single binary COPY.
 
-def create_rotary_measurements_batch(measurements: List[Dict[str, Any]]) -> int:
-    """Create multiple rotary measurements in a single batch insert."""
+    The caller owns the transaction, so several tables can be written and
+    committed together.
+    """
     if not measurements:
         return 0
-    try:
-        print(measurements)
-        with db.get_connection() as conn:
-            with conn.cursor() as cur:
-                # Prepare values for batch insert
-                # Convert timestamp (float) back to datetime for PostgreSQL
-                values = [
-                    (
-                        m["entry_id"],
-                        m["speed"],
-                        m["direction"],
-                        m["time"],
-                    )
-                    for m in measurements
-                ]
-
-                cur.executemany(
-                    """
-                    INSERT INTO rotary_measurements
-                    (entry_id, speed, direction, time)
-                    VALUES (%s, %s, %s, %s)
-                """,
-                    values,
-                )
-                conn.commit()
-                return cur.rowcount
-    except Exception:
-        conn.rollback()
-        raise
+    return copy_rows(
+        cur,
+        "rotary_measurements",
+        ("entry_id", "speed", "direction", "time", "recorded_at"),
+        ("int4", "float8", "text", "float8", "timestamptz"),
+        recorded_rows(cur, "rotation_entry_table", measurements),
+    )
+
+
+# Columns of a measurement export: (name, PostgreSQL type)
+ROTARY_EXPORT_COLUMNS = (
+    ("entry_id", "int4"),
+    ("speed", "float8"),
+    ("direction", "text"),
+    ("time", "float8"),
+    ("recorded_at", "timestamptz"),
+)
+
+
+def stream_rotary_measurements(
+    entry_id: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    chunk_rows: int = 10000,
+    columns: Optional[Sequence[str]] = None,
+) -> Iterator[List[Tuple]]:
+    """Stream the rotary measurements of an entry in time order, chunk by chunk.
+
+    The rows have the ``ROTARY_EXPORT_COLUMNS`` unless ``columns`` are given.
+    """
+    return stream_rows(
+        "rotary_measurements",
+        columns or [name for name, _ in ROTARY_EXPORT_COLUMNS],
+        entry_id,
+        start,
+        end,
+        chunk_rows,
+    )
+
+
+def count_rotary_measurements(entry_id: str) -> int:
+    """Count the stored rotary measurements of an entry."""
+    return count_rows("rotary_measurements", entry_id)
+
+
+def delete_rotary_measurements(entry_id: str, expected: int) -> int:
+    """Delete the rotary measurements of an entry if it has ``expected`` rows."""
+    return delete_rows("rotary_measurements", entry_id, expected)
 
 
 def get_rotary_measurements(
     entry_id: Optional[str] = None,
     rotary_scenario_id: Optional[str] = None,
     limit: int = 1000,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    points: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
-    """Get rotary measurements with optional filters."""
+    """Get rotary measurements with optional filters.
+
+    Without a window or point count the most recent ``limit`` rows are
+    returned; otherwise the samples between ``start`` and ``end`` (seconds of
+    the run) downsampled to about ``points`` rows (``limit`` if not given).
+    """
+    if entry_id and (start is not None or end is not None or points):
+        with db.get_cursor() as cur:
+            return fetch_downsampled(
+                cur,
+                "rotary_measurements",
+                ("id", "entry_id", "speed", "direction", "time"),
+                "speed",
+                entry_id,
+                start,
+                end,
+                points or limit,
+            )
     with db.get_cursor() as cur:
         # Use a subquery to get the most recent N measurements, then order them ASC for display
         query = """
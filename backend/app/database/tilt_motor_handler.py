@@ -1,8 +1,18 @@
 """Tilt Motor Database Operations."""
 
-from typing import Any, Dict, List, Optional
-
-from app.database.database import db
+import json
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.database.database import (
+    copy_rows,
+    count_rows,
+    db,
+    delete_rows,
+    fetch_downsampled,
+    recorded_rows,
+    stream_rows,
+)
+from app.measurement_buffer import MeasurementBatch
 
 # ---------------------------------------------------------
 # Tilt scenarios
@@ -136,7 +146,12 @@ def get_tilt_scenario(scenario_id: str) -> Optional[Dict[str, Any]]:
 # ---------------------------------------------------------
 
 
-def create_entry(name: str, tilt_scenario_id: int, scenario_name: str) -> str:
+def create_entry(
+    name: str,
+    tilt_scenario_id: int,
+    scenario_name: str,
+    compression: Optional[Dict[str, Any]] = None,
+) -> str:
     """Create a new entry and return its ID."""
     from datetime import datetime
 
@@ -145,11 +160,17 @@ def create_entry(name: str, tilt_scenario_id: int, scenario_name: str) -> str:
             with conn.cursor() as cur:
                 cur.execute(
                     """
-                    INSERT INTO tilt_entry_table (name, tilt_scenario_id, scenario_name, measurement_timestamp)
-                    VALUES (%s, %s, %s, %s)
+                    INSERT INTO tilt_entry_table (name, tilt_scenario_id, scenario_name, measurement_timestamp, compression)
+                    VALUES (%s, %s, %s, %s, %s)
                     RETURNING id
                 """,
-                    (name, tilt_scenario_id, scenario_name, datetime.now()),
+                    (
+                        name,
+                        tilt_scenario_id,
+                        scenario_name,
+                        datetime.now(),
+                        json.dumps(compression) if compression else None,
+                    ),
                 )
                 result = cur.fetchone()
                 conn.commit()
@@ -166,7 +187,7 @@ def get_entry(entry_id: str) -> Optional[Dict[str, Any]]:
             with conn.cursor() as cur:
                 cur.execute(
                     """
-                    SELECT id, name, measurement_timestamp, tilt_scenario_id, scenario_name
+                    SELECT id, name, measurement_timestamp, tilt_scenario_id, scenario_name, compression
                     FROM tilt_entry_table
                     WHERE id = %s
                 """,
@@ -229,43 +250,90 @@ def create_tilt_measurement(measurement_data: Dict[str, Any]) -> str:
             raise
 
 
-def create_tilt_measurements_batch(measurements: List[Dict[str, Any]]) -> int:
-    """Create multiple tilt measurements in a single batch insert."""
+def copy_tilt_measurements(cur, measurements: MeasurementBatch) -> int:
+    """Write tilt measurements with a single binary COPY.
+
+    The caller owns the transaction, so several tables can be written and
+    committed together.
+    """
     if not measurements:
         return 0
-    with db.get_connection() as conn:
-        try:
-            with conn.cursor() as cur:
-                values = [
-                    (
-                        m["entry_id"],
-                        m["angle"],
-                        m["state"],
-                        m["time"],
-                    )
-                    for m in measurements
-                ]
-                cur.executemany(
-                    """
-                    INSERT INTO tilt_measurements
-                    (entry_id, angle, state, time)
-                    VALUES (%s, %s, %s, %s)
-                """,
-                    values,
-                )
-                conn.commit()
-                return cur.rowcount
-        except Exception:
-            conn.rollback()
-            raise
+    return copy_rows(
+        cur,
+        "tilt_measurements",
+        ("entry_id", "angle", "state", "time", "recorded_at"),
+        ("int4", "float8", "text", "float8", "timestamptz"),
+        recorded_rows(cur, "tilt_entry_table", measurements),
+    )
+
+
+# Columns of a measurement export: (name, PostgreSQL type)
+TILT_EXPORT_COLUMNS = (
+    ("entry_id", "int4"),
+    ("angle", "float8"),
+    ("state", "text"),
+    ("time", "float8"),
+    ("recorded_at", "timestamptz"),
+)
+
+
+def stream_tilt_measurements(
+    entry_id: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    chunk_rows: int = 10000,
+    columns: Optional[Sequence[str]] = None,
+) -> Iterator[List[Tuple]]:
+    """Stream the tilt measurements of an entry in time order, chunk by chunk.
+
+    The rows have the ``TILT_EXPORT_COLUMNS`` unless ``columns`` are given.
+    """
+    return stream_rows(
+        "tilt_measurements",
+        columns or [name for name, _ in TILT_EXPORT_COLUMNS],
+        entry_id,
+        start,
+        end,
+        chunk_rows,
+    )
+
+
+def count_tilt_measurements(entry_id: str) -> int:
+    """Count the stored tilt measurements of an entry."""
+    return count_rows("tilt_measurements", entry_id)
+
+
+def delete_tilt_measurements(entry_id: str, expected: int) -> int:
+    """Delete the tilt measurements of an entry if it has ``expected`` rows."""
+    return delete_rows("tilt_measurements", entry_id, expected)
 
 
 def get_tilt_measurements(
     entry_id: Optional[str] = None,
     tilt_scenario_id: Optional[str] = None,
     limit: int = 1000,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    points: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
-    """Get tilt measurements with optional filters."""
+    """Get tilt measurements with optional filters.
+
+    Without a window or point count the most recent ``limit`` rows are
+    returned; otherwise the samples between ``start`` and ``end`` (seconds of
+    the run) downsampled to about ``points`` rows (``limit`` if not given).
+    """
+    if entry_id and (start is not None or end is not None or points):
+        with db.get_cursor() as cur:
+            return fetch_downsampled(
+                cur,
+                "tilt_measurements",
+                ("id", "entry_id", "angle", "state", "time"),
+                "angle",
+                entry_id,
+                start,
+                end,
+                points or limit,
+            )
     with db.get_connection() as conn:
         try:
             with conn.cursor() as cur:
@@ -0,0 +1,228 @@
+"""Background jobs for long-running motor operations (calibration, homing).
+
+A job runs in a small dedicated thread pool instead of the FastAPI request
+threadpool, so the HTTP request that starts it returns a job id right away.
+Progress is broadcast on the ``job`` WebSocket topic and the current state can
+be polled with ``GET /api/jobs/{job_id}``.
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from app.asyncio_loop import get_event_loop
+from app.config import settings
+from app.models import JobStatus
+from app.websocket_manager import manager
+
+FINISHED_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+
+class Job:
+    """State of one background job, updated by its worker thread."""
+
+    def __init__(self, kind: str, resource: str, on_cancel: Optional[Callable]):
+        """Init function for the job.
+
+        Args:
+            kind: Operation name, e.g. ``rpm_calibration``
+            resource: Motor the job occupies, one running job per resource
+            on_cancel: Called (from the cancelling thread) to stop the operation
+        """
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.resource = resource
+        self.status = JobStatus.PENDING
+        self.progress = 0.0
+        self.message = ""
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._on_cancel = on_cancel
+        self._cancelled = threading.Event()
+
+    @property
+    def cancel_requested(self) -> bool:
+        """True once the job has been asked to cancel."""
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self) -> bool:
+        """True once the job succeeded, failed or was cancelled."""
+        return self.status in FINISHED_STATUSES
+
+    def report(self, progress: float, message: str = "") -> None:
+        """Update the progress (0 to 1) and notify the WebSocket clients."""
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        if message:
+            self.message = message
+        self._publish()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialise the job for the API and the WebSocket."""
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "resource": self.resource,
+            "status": self.status.value,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def _publish(self) -> None:
+        try:
+            asyncio.run_coroutine_threadsafe(
+                manager.send_job_update(self.to_dict()), get_event_loop()
+            )
+        except Exception as e:
+            print(f"Async submission error: {e}")
+
+
+class JobManager:
+    """Runs jobs in a dedicated thread pool and keeps the recent ones."""
+
+    def __init__(self):
+        """Initialize the job manager."""
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.job_workers, thread_name_prefix="job"
+        )
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        # Resources held by something other than a job (a motor run)
+        self._claims: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        kind: str,
+        resource: str,
+        fn: Callable[[Job], Any],
+        on_cancel: Optional[Callable] = None,
+    ) -> Job:
+        """Start a job and return it without waiting.
+
+        Args:
+            kind: Operation name, e.g. ``rpm_calibration``
+            resource: Motor the job occupies
+            fn: Operation, called with the job to report progress; its return
+                value becomes the job result
+            on_cancel: Called to stop the operation when the job is cancelled
+
+        Raises:
+            RuntimeError: If another job or a claim holds the same resource
+        """
+        with self._lock:
+            self._check_free(resource)
+            job = Job(kind, resource, on_cancel)
+            self._jobs[job.id] = job
+            while len(self._jobs) > settings.job_history_size:
+                oldest = next(iter(self._jobs.values()))
+                if not oldest.finished:
+                    break
+                self._jobs.popitem(last=False)
+        job._publish()
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def claim(self, resource: str, holder: str) -> None:
+        """Hold a resource outside of a job, e.g. for a motor run.
+
+        Jobs on the resource are refused until :meth:`release`.
+
+        Args:
+            resource: Motor to hold
+            holder: Description used in the errors of refused jobs
+
+        Raises:
+            RuntimeError: If a job or another claim holds the resource
+        """
+        with self._lock:
+            self._check_free(resource)
+            self._claims[resource] = holder
+
+    def release(self, resource: str) -> None:
+        """Give back a resource held with :meth:`claim`."""
+        with self._lock:
+            self._claims.pop(resource, None)
+
+    def _check_free(self, resource: str) -> None:
+        running = self.active(resource)
+        if running is not None:
+            raise RuntimeError(
+                f"Job {running.id} ({running.kind}) is already running on {resource}"
+            )
+        if resource in self._claims:
+            raise RuntimeError(f"{self._claims[resource]} is running on {resource}")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Get a job by id, None if unknown or expired."""
+        return self._jobs.get(job_id)
+
+    def get_jobs(self) -> List[Job]:
+        """Get the recent jobs, newest first."""
+        return list(reversed(self._jobs.values()))
+
+    def active(self, resource: str) -> Optional[Job]:
+        """Get the unfinished job of a resource, if any."""
+        for job in self._jobs.values():
+            if job.resource == resource and not job.finished:
+                return job
+        return None
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Ask a job to stop, None if the job is unknown.
+
+        Finished jobs are returned unchanged.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.finished or job.cancel_requested:
+            return job
+        job._cancelled.set()
+        job.message = "Cancelling"
+        if job._on_cancel is not None:
+            try:
+                job._on_cancel()
+            except Exception as e:
+                print(f"Error cancelling job {job.id}: {e}")
+        job._publish()
+        return job
+
+    def shutdown(self) -> None:
+        """Cancel the unfinished jobs and stop the worker threads."""
+        for job in list(self._jobs.values()):
+            self.cancel(job.id)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]) -> None:
+        job.status = JobStatus.RUNNING
+        job.started_at = time.time()
+        job._publish()
+        try:
+            job.result = fn(job)
+            if job.cancel_requested:
+                job.status = JobStatus.CANCELLED
+                job.message = "Cancelled"
+            else:
+                job.status = JobStatus.SUCCEEDED
+                job.progress = 1.0
+                job.message = "Done"
+        except Exception as e:
+            print(f"Error in job {job.id} ({job.kind}): {e}")
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+        job.finished_at = time.time()
+        job._publish()
+
+
+# Global job manager instance
+job_manager = JobManager()
@@ -1,5 +1,6 @@
 import asyncio
 import sys
+from contextlib import asynccontextmanager
 
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
@@ -20,6 +21,7 @@ from fastapi.security import OAuth2PasswordRequestForm
 
 from .api.api import router as api_router
 from .api.handlers.peristaltic_motor import peristaltic_motor_handler
+from .api.handlers.postep256_handler import postep256_handler
 from .api.handlers.rotary_motor import rotary_motor_handler
 from .api.handlers.tilt_motor import tilt_motor_handler
 from .api.peristaltic_motor_api import router as peristaltic_router
@@ -33,12 +35,16 @@ from .auth import (
     get_current_active_user,
 )
 from .config import settings
-from .database.database import db
+from .database.database import apply_storage_policies, db
+from .jobs import job_manager
+from .measurement_spool import spool_replayer
+from .measurement_writer import measurement_writer
 from .models import User
 from .websocket_manager import WebSocket, manager
 
 
-def lifespan(app: FastAPI):
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """Application lifespan manager."""
     print("Starting Dynamic Cell Culture Drive Control Software...")
 
@@ -48,6 +54,11 @@ def lifespan(app: FastAPI):
         print("Database connection established")
     except Exception as e:
         print(f"Database connection failed: {e}")
+    try:
+        with db.get_cursor() as cur:
+            apply_storage_policies(cur)
+    except Exception as e:
+        print(f"Setting measurement storage policies failed: {e}")
     set_event_loop(asyncio.get_running_loop())
     # Functions to run in parallel
     init_tasks = [
@@ -67,24 +78,45 @@ def lifespan(app: FastAPI):
                 print(f"{name} motor initialization failed: {e}")
 
     print("Motors initialization completed")
+    measurement_writer.start()
+    # Drain measurements spooled while the database was unavailable
+    spool_replayer.start()
 
     # ---- app runs here ----
     yield
 
     # Shutdown (can also be parallelized similarly if needed)
     print("Shutting down Dynamic Cell Culture Drive Control Software...")
+    # Runs and jobs are stopped from a worker thread: they finish on the event
+    # loop (final flush included), which must not be blocked while they do
     try:
-        tilt_motor_handler.cleanup()
+        await asyncio.to_thread(job_manager.shutdown)
+    except Exception as e:
+        print(f"Error stopping background jobs: {e}")
+    try:
+        await asyncio.to_thread(tilt_motor_handler.cleanup)
     except Exception as e:
         print(f"Error cleaning up tilt motor: {e}")
     try:
-        rotary_motor_handler.cleanup()
+        await asyncio.to_thread(rotary_motor_handler.cleanup)
     except Exception as e:
         print(f"Error cleaning up rotary motor: {e}")
     try:
-        peristaltic_motor_handler.cleanup()
+        await asyncio.to_thread(peristaltic_motor_handler.cleanup)
     except Exception as e:
         print(f"Error cleaning up peristaltic motor: {e}")
+    try:
+        measurement_writer.stop()
+    except Exception as e:
+        print(f"Error flushing measurements: {e}")
+    try:
+        spool_replayer.stop()
+    except Exception as e:
+        print(f"Error closing measurement spool: {e}")
+    try:
+        postep256_handler.cleanup()
+    except Exception as e:
+        print(f"Error cleaning up PoStep256 devices: {e}")
     try:
         db.close()
         print("Database connection closed")
@@ -169,11 +201,22 @@ def get_user_profile(current_user: User = Depends(get_current_active_user)):
 
 @app.websocket("/ws/motor")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time motor updates."""
-    await manager.connect(websocket)
+    """WebSocket endpoint for real-time motor updates.
+
+    Connect with ``?format=binary`` to receive measurement batches as binary
+    frames (see ``encode_measurement_frames``), other messages stay JSON.
+    ``?topics=rotate,rotate_movement`` limits the messages to those topics
+    (all topics by default); the client can change them later by sending
+    ``{"action": "subscribe" | "unsubscribe", "topics": [...]}``.
+    """
+    binary = websocket.query_params.get("format") == "binary"
+    topics = websocket.query_params.get("topics")
+    if topics is not None:
+        topics = [t for t in topics.split(",") if t]
+    await manager.connect(websocket, binary=binary, topics=topics)
     try:
         while True:
-            await websocket.receive_text()
+            manager.handle_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
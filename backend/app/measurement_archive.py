@@ -0,0 +1,327 @@
+"""Cold archive of finished entries in memory-mapped column files.
+
+A finished entry can be copied out of its measurement hypertable into one
+``.npy`` file per column below ``archive_dir``::
+
+    archive/<motor>/<entry_id>/
+        meta.json          rows, columns, labels of the text columns, dropped
+        id.npy             int32
+        entry_id.npy       int32
+        <value>.npy        float64 (angle, speed or flow)
+        <code>.npy         uint8, index into the labels in meta.json
+        time.npy           float64, seconds of the run, ascending
+        recorded_at.npy    datetime64[us], UTC
+
+The files are opened with ``numpy.load(mmap_mode="r")``, so a read of an
+archived entry costs no database query and only touches the pages of the
+requested window: windows are found by binary search on ``time``,
+downsampling mirrors :func:`app.database.database.fetch_downsampled` and
+exports hand column slices to the encoders. Once archived, the rows can be
+dropped from the hypertable.
+
+An archive is written to ``<entry_id>.tmp`` and renamed into place after its
+files are synced, so a crash never leaves a partial archive behind.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+
+from app.config import settings
+
+ARCHIVE_META = "meta.json"
+
+# Column file dtype of every PostgreSQL type; text columns hold label indexes
+_DTYPES = {
+    "int4": np.int32,
+    "int8": np.int64,
+    "float8": np.float64,
+    "text": np.uint8,
+    "timestamptz": "datetime64[us]",
+}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class ArchivedEntry:
+    """Read-only, memory-mapped columns of one archived entry."""
+
+    def __init__(self, path: str):
+        """Open the column files of an archive.
+
+        Args:
+            path: Directory of the archived entry
+        """
+        self.path = path
+        with open(os.path.join(path, ARCHIVE_META)) as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        self.rows: int = self.meta["rows"]
+        self._labels = {
+            name: np.asarray(labels, dtype=object)
+            for name, labels in self.meta["labels"].items()
+        }
+        self._columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name, _ in self.meta["columns"]
+        }
+
+    @property
+    def dropped(self) -> bool:
+        """True once the archived rows were deleted from the database."""
+        return self.meta.get("dropped", False)
+
+    def window(self, start: Optional[float], end: Optional[float]) -> Tuple[int, int]:
+        """Row positions [lo, hi) of the samples between start and end."""
+        times = self._columns["time"]
+        lo = 0 if start is None else int(np.searchsorted(times, start, "left"))
+        hi = self.rows if end is None else int(np.searchsorted(times, end, "right"))
+        return lo, max(lo, hi)
+
+    def recent(self, names: Sequence[str], limit: int) -> List[Dict[str, Any]]:
+        """The last ``limit`` rows in time order."""
+        return self._records(names, np.arange(max(0, self.rows - limit), self.rows))
+
+    def downsample(
+        self,
+        names: Sequence[str],
+        value_name: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        points: int = 1000,
+    ) -> List[Dict[str, Any]]:
+        """Rows with the lowest and highest value of ``points / 2`` time buckets.
+
+        Same selection as :func:`app.database.database.fetch_downsampled`:
+        windows with no more than ``points`` samples are returned in full.
+        """
+        lo, hi = self.window(start, end)
+        if hi - lo <= points:
+            return self._records(names, np.arange(lo, hi))
+        times = self._columns["time"][lo:hi]
+        values = self._columns[value_name][lo:hi]
+        t0 = times[0] if start is None else start
+        t1 = times[-1] if end is None else end
+        buckets = max(1, points // 2)
+        bucket = np.floor((times - t0) / (t1 + 1e-9 - t0) * buckets)
+        # Times ascend, so every bucket is one run of rows
+        first = np.empty(len(bucket), dtype=bool)
+        first[0] = True
+        np.not_equal(bucket[1:], bucket[:-1], out=first[1:])
+        starts = np.flatnonzero(first)
+        group = np.cumsum(first) - 1
+        keep = np.zeros(len(values), dtype=bool)
+        for extreme in (np.minimum, np.maximum):
+            hits = np.flatnonzero(extreme.reduceat(values, starts)[group] == values)
+            # The earliest sample of a bucket wins a tie, as in the SQL
+            hit_groups = group[hits]
+            earliest = np.ones(len(hits), dtype=bool)
+            np.not_equal(hit_groups[1:], hit_groups[:-1], out=earliest[1:])
+            keep[hits[earliest]] = True
+        return self._records(names, lo + np.flatnonzero(keep))
+
+    def chunks(
+        self,
+        names: Sequence[str],
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        chunk_rows: int = 10000,
+    ) -> Iterator[List[np.ndarray]]:
+        """Column arrays of the window, ``chunk_rows`` rows at a time.
+
+        Numeric and timestamp columns are slices of the mapped files, text
+        columns are decoded to object arrays.
+        """
+        lo, hi = self.window(start, end)
+        for offset in range(lo, hi, chunk_rows):
+            stop = min(offset + chunk_rows, hi)
+            yield [
+                self._decode(name, self._columns[name][offset:stop]) for name in names
+            ]
+
+    def _decode(self, name: str, values: np.ndarray) -> np.ndarray:
+        labels = self._labels.get(name)
+        return values if labels is None else labels[values]
+
+    def _records(self, names, index) -> List[Dict[str, Any]]:
+        columns = [
+            self._decode(name, self._columns[name][index]).tolist() for name in names
+        ]
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+class MeasurementArchive:
+    """Archived entries of one motor, opened on demand and kept mapped."""
+
+    def __init__(self, name: str):
+        """Init function for the archive.
+
+        Args:
+            name: Motor name, the directory below ``archive_dir``
+        """
+        self.name = name
+        self._dir = os.path.join(settings.archive_dir, name)
+        self._open: "OrderedDict[str, ArchivedEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, entry_id) -> Optional[ArchivedEntry]:
+        """Get an archived entry, None if the entry is not archived."""
+        try:
+            key = str(int(entry_id))
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            entry = self._open.get(key)
+            if entry is not None:
+                self._open.move_to_end(key)
+                return entry
+        path = os.path.join(self._dir, key)
+        if not os.path.exists(os.path.join(path, ARCHIVE_META)):
+            return None
+        entry = ArchivedEntry(path)
+        with self._lock:
+            self._open[key] = entry
+            # Every column file of an open entry holds a mapping
+            while len(self._open) > settings.archive_open_entries:
+                self._open.popitem(last=False)
+        return entry
+
+    def write(
+        self,
+        entry_id: int,
+        columns: Sequence[Tuple[str, str]],
+        chunks: Iterable[List[Tuple]],
+        rows: int,
+        should_abort: Optional[Callable[[], bool]] = None,
+        progress: Optional[Callable[[float, str], None]] = None,
+    ) -> Optional[ArchivedEntry]:
+        """Write the rows of an entry to a new archive.
+
+        Args:
+            entry_id: Entry of the rows
+            columns: (name, PostgreSQL type) of every column, must include
+                ``time``
+            chunks: Lists of row tuples in column order, ascending in time
+            rows: Number of rows the chunks hold
+            should_abort: Called between chunks, True stops the write
+            progress: Called with the done fraction and a message
+
+        Returns:
+            The archived entry, None if aborted
+
+        Raises:
+            Exception: If the entry is already archived or the chunks do not
+                hold exactly ``rows`` rows
+        """
+        key = str(int(entry_id))
+        path = os.path.join(self._dir, key)
+        if os.path.exists(path):
+            raise Exception(f"Entry {key} is already archived")
+        staging = path + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        try:
+            labels: Dict[str, Dict[Any, int]] = {
+                name: {} for name, pg_type in columns if pg_type == "text"
+            }
+            files = {
+                name: np.lib.format.open_memmap(
+                    os.path.join(staging, f"{name}.npy"),
+                    mode="w+",
+                    dtype=_DTYPES[pg_type],
+                    shape=(rows,),
+                )
+                for name, pg_type in columns
+            }
+            written = 0
+            for chunk in chunks:
+                if should_abort is not None and should_abort():
+                    shutil.rmtree(staging, ignore_errors=True)
+                    return None
+                if written + len(chunk) > rows:
+                    raise Exception(f"Entry {key} has more than {rows} rows")
+                for i, (name, pg_type) in enumerate(columns):
+                    files[name][written : written + len(chunk)] = _encode(
+                        [row[i] for row in chunk], pg_type, labels.get(name)
+                    )
+                written += len(chunk)
+                if progress is not None:
+                    progress(written / rows, f"Archived {written} of {rows} rows")
+            if written != rows:
+                raise Exception(f"Entry {key} has {written} rows instead of {rows}")
+            for array in files.values():
+                array.flush()
+            del files
+            meta = {
+                "entry_id": int(key),
+                "motor": self.name,
+                "rows": rows,
+                "columns": [list(column) for column in columns],
+                "labels": {
+                    name: sorted(codes, key=codes.get) for name, codes in labels.items()
+                },
+                "archived_at": time.time(),
+                "dropped": False,
+            }
+            _write_meta(staging, meta)
+            for name, _ in columns:
+                _fsync(os.path.join(staging, f"{name}.npy"))
+            os.replace(staging, path)
+            _fsync(self._dir)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return self.get(key)
+
+    def mark_dropped(self, entry_id) -> None:
+        """Record that the archived rows were deleted from the database."""
+        entry = self.get(entry_id)
+        meta = dict(entry.meta, dropped=True, dropped_at=time.time())
+        _write_meta(entry.path, meta)
+        entry.meta = meta
+
+
+def _encode(values: List[Any], pg_type: str, labels: Optional[Dict[Any, int]]):
+    if pg_type == "text":
+        codes = [labels.setdefault(value, len(labels)) for value in values]
+        if len(labels) > np.iinfo(_DTYPES["text"]).max + 1:
+            raise Exception("Too many distinct values in a text column to archive")
+        return codes
+    if pg_type == "timestamptz":
+        micros = [(value - _EPOCH) // _MICROSECOND for value in values]
+        return np.asarray(micros, dtype=np.int64).view(_DTYPES[pg_type])
+    return values
+
+
+def _write_meta(path: str, meta: Dict[str, Any]) -> None:
+    staging = os.path.join(path, ARCHIVE_META + ".tmp")
+    with open(staging, "w") as f:
+        json.dump(meta, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(staging, os.path.join(path, ARCHIVE_META))
+
+
+def _fsync(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
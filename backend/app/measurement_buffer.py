@@ -0,0 +1,241 @@
+"""Columnar, double-buffered measurement queue for the motor handlers.
+
+Samples are stored in preallocated typed arrays (entry id, value, an enum-coded
+state/direction and time) instead of one ``dict`` per sample. The writer thread
+swaps the filled block out in O(1) and gets a :class:`MeasurementBatch` of
+array views, which it passes to the database writer and the WebSocket
+broadcaster without copying the samples.
+"""
+
+import threading
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+TILT_STATES = ("moving", "idle", "error")
+DIRECTIONS = ("cw", "ccw")
+
+
+class _Block:
+    """One set of column arrays."""
+
+    def __init__(self, capacity: int):
+        self.entry_id = np.empty(capacity, dtype=np.int32)
+        self.value = np.empty(capacity, dtype=np.float64)
+        self.code = np.empty(capacity, dtype=np.uint8)
+        self.time = np.empty(capacity, dtype=np.float64)
+        self.size = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self.time)
+
+    def grow(self, capacity: int) -> None:
+        for name in ("entry_id", "value", "code", "time"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, name, new)
+
+
+class MeasurementBatch:
+    """Read-only column views of the samples taken out of a buffer.
+
+    The views point into the buffer's spare block and stay valid until the
+    buffer is swapped again, so a batch must be consumed before the next
+    flush (the handlers' writer threads do both in one loop iteration).
+    """
+
+    def __init__(
+        self,
+        entry_id: np.ndarray,
+        value: np.ndarray,
+        code: np.ndarray,
+        time: np.ndarray,
+        value_name: str,
+        code_name: str,
+        codes: Sequence[str],
+    ):
+        """Init function for the batch."""
+        self.entry_id = entry_id
+        self.value = value
+        self.code = code
+        self.time = time
+        self.value_name = value_name
+        self.code_name = code_name
+        self.codes = codes
+
+    def __len__(self) -> int:
+        """Number of samples in the batch."""
+        return len(self.time)
+
+    def copy(self) -> "MeasurementBatch":
+        """Copy the columns so the batch outlives the next swap of the buffer."""
+        return self._with_columns(
+            self.entry_id.copy(), self.value.copy(), self.code.copy(), self.time.copy()
+        )
+
+    def concat(self, other: "MeasurementBatch") -> "MeasurementBatch":
+        """Join two batches of the same buffer into a new batch."""
+        return self._with_columns(
+            np.concatenate((self.entry_id, other.entry_id)),
+            np.concatenate((self.value, other.value)),
+            np.concatenate((self.code, other.code)),
+            np.concatenate((self.time, other.time)),
+        )
+
+    def take(self, indices: np.ndarray) -> "MeasurementBatch":
+        """Select samples by index into a new batch."""
+        return self._with_columns(
+            self.entry_id[indices],
+            self.value[indices],
+            self.code[indices],
+            self.time[indices],
+        )
+
+    def _with_columns(self, entry_id, value, code, time) -> "MeasurementBatch":
+        return MeasurementBatch(
+            entry_id, value, code, time, self.value_name, self.code_name, self.codes
+        )
+
+    def rows(self) -> Iterator[Tuple[int, float, str, float]]:
+        """Iterate over ``(entry_id, value, state/direction, time)`` rows."""
+        codes = self.codes
+        return zip(
+            self.entry_id.tolist(),
+            self.value.tolist(),
+            [codes[c] for c in self.code.tolist()],
+            self.time.tolist(),
+        )
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Convert to the per-sample dicts sent over the WebSocket."""
+        keys = ("entry_id", self.value_name, self.code_name, "time")
+        return [dict(zip(keys, row)) for row in self.rows()]
+
+
+def concat_batches(batches: Sequence[MeasurementBatch]) -> MeasurementBatch:
+    """Join several batches of the same buffer into one new batch."""
+    first = batches[0]
+    return first._with_columns(
+        *(
+            np.concatenate([getattr(b, name) for b in batches])
+            for name in ("entry_id", "value", "code", "time")
+        )
+    )
+
+
+def decimate_min_max(
+    batch: MeasurementBatch, bucket_seconds: float
+) -> MeasurementBatch:
+    """Reduce a batch to the minimum and maximum sample of every time bucket.
+
+    Buckets are aligned to multiples of ``bucket_seconds`` and never span two
+    entries, so peaks survive and at most two samples per bucket remain, in
+    their original order.
+    """
+    n = len(batch)
+    if n <= 2 or bucket_seconds <= 0:
+        return batch
+    bucket = np.floor(batch.time / bucket_seconds).astype(np.int64)
+    new_group = np.empty(n, dtype=bool)
+    new_group[0] = True
+    new_group[1:] = (bucket[1:] != bucket[:-1]) | (
+        batch.entry_id[1:] != batch.entry_id[:-1]
+    )
+    group = np.cumsum(new_group)
+    # sorted by value within each group: first is the minimum, last the maximum
+    order = np.lexsort((batch.value, group))
+    sorted_group = group[order]
+    first = np.ones(n, dtype=bool)
+    first[1:] = sorted_group[1:] != sorted_group[:-1]
+    last = np.ones(n, dtype=bool)
+    last[:-1] = sorted_group[1:] != sorted_group[:-1]
+    keep = np.unique(np.concatenate((order[first], order[last])))
+    if len(keep) == n:
+        return batch
+    return batch.take(keep)
+
+
+class MeasurementBuffer:
+    """Thread-safe columnar measurement queue with swap-on-flush double buffering."""
+
+    def __init__(
+        self,
+        value_name: str,
+        code_name: str,
+        codes: Sequence[str],
+        capacity: int = 1024,
+    ):
+        """Init function for the buffer.
+
+        Args:
+            value_name: Name of the value column (angle, speed or flow)
+            code_name: Name of the enum-coded column (state or direction)
+            codes: Allowed values of the enum-coded column
+            capacity: Initial number of samples per block, doubled when full
+        """
+        self.value_name = value_name
+        self.code_name = code_name
+        self.codes = tuple(codes)
+        self._code_index = {c: i for i, c in enumerate(self.codes)}
+        self._active = _Block(capacity)
+        self._spare = _Block(capacity)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of queued samples."""
+        return self._active.size
+
+    def append(self, entry_id: int, value: float, code: str, time: float) -> None:
+        """Queue one sample."""
+        code_index = self._code_index[code]
+        with self._lock:
+            block = self._active
+            i = block.size
+            if i == block.capacity:
+                block.grow(2 * block.capacity)
+            block.entry_id[i] = entry_id if entry_id is not None else -1
+            block.value[i] = value
+            block.code[i] = code_index
+            block.time[i] = time
+            block.size = i + 1
+
+    def swap(self) -> MeasurementBatch:
+        """Take all queued samples out of the buffer as a batch of views."""
+        with self._lock:
+            block = self._active
+            self._active, self._spare = self._spare, block
+            self._active.size = 0
+            n = block.size
+        return MeasurementBatch(
+            block.entry_id[:n],
+            block.value[:n],
+            block.code[:n],
+            block.time[:n],
+            self.value_name,
+            self.code_name,
+            self.codes,
+        )
+
+    def requeue(self, batch: MeasurementBatch) -> None:
+        """Put a batch that could not be written back in front of the queue."""
+        n = len(batch)
+        if n == 0:
+            return
+        with self._lock:
+            block = self._active
+            size = block.size
+            if size + n > block.capacity:
+                block.grow(max(2 * block.capacity, size + n))
+            # shift the newer samples back, then copy the batch in front
+            for name in ("entry_id", "value", "code", "time"):
+                column = getattr(block, name)
+                column[n : n + size] = column[:size].copy()
+                column[:n] = getattr(batch, name)
+            block.size = size + n
+
+    def clear(self) -> None:
+        """Drop all queued samples."""
+        with self._lock:
+            self._active.size = 0
@@ -0,0 +1,227 @@
+"""Compression of measurement batches before they are written to the database.
+
+Long runs at constant speed or flow produce long stretches of identical
+samples. A :class:`MeasurementCompressor` keeps only the samples needed to
+rebuild the series within a tolerance:
+
+- ``deadband``: a sample is kept when its value differs from the last kept
+  one by more than ``deviation``
+- ``change_only``: ``deadband`` with a deviation of 0, every change is kept
+- ``swinging_door``: a sample is kept when the samples since the last kept
+  one no longer fit a straight line from it within ``deviation``
+
+In every mode a sample is also kept when the state/direction changes, when
+``heartbeat`` seconds have passed since the last kept sample and at the end
+of a run, so gaps in the data stay distinguishable from steady values.
+:func:`reconstruct` rebuilds an evenly spaced series on the read side: held
+values for deadband and change-only, linear interpolation for swinging door.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.measurement_buffer import MeasurementBatch, concat_batches
+from app.models import CompressionMode, CompressionPolicy
+
+# Most rows a rebuilt series may have, whatever limit a request asks for
+RECONSTRUCT_MAX_ROWS = 100_000
+
+
+class MeasurementCompressor:
+    """Stateful compressor for the measurement stream of one motor.
+
+    The state (last kept sample and the swinging-door corridor) carries over
+    between batches and is reset when a new entry starts, so a run is
+    compressed the same way regardless of how it was split into flushes. The
+    most recent sample is held back until the next one shows whether it is
+    needed; pass ``final=True`` at the end of a run to release it.
+    """
+
+    def __init__(self, policy: Optional[CompressionPolicy] = None):
+        """Init function for the compressor.
+
+        Args:
+            policy: Compression of the running entry, None stores every sample
+        """
+        self.policy = policy or CompressionPolicy()
+        self.samples_in = 0
+        self.samples_out = 0
+        self._reset(None)
+
+    def _reset(self, entry_id: Optional[int]):
+        self._entry_id = entry_id
+        # (time, value, code) of the last kept sample
+        self._kept: Optional[tuple] = None
+        # held back sample: (batch, index), the batch is a copy once its
+        # buffer may have been swapped
+        self._held: Optional[tuple] = None
+        self._slope_max = np.inf
+        self._slope_min = -np.inf
+
+    def set_policy(self, policy: Optional[CompressionPolicy]) -> None:
+        """Use a new policy, called before a run starts."""
+        self.policy = policy or CompressionPolicy()
+        self._reset(None)
+
+    def compress(
+        self, batch: MeasurementBatch, final: bool = False
+    ) -> MeasurementBatch:
+        """Select the samples of a batch that need to be stored.
+
+        Args:
+            batch: Samples in time order
+            final: The run has ended, release the held back sample
+
+        Returns:
+            New batch with the kept samples in time order, starting with the
+            sample held back by the previous call when it was needed
+        """
+        self.samples_in += len(batch)
+        if self.policy.mode == CompressionMode.NONE and self._held is None:
+            self.samples_out += len(batch)
+            return batch
+
+        keep: List[int] = []
+        earlier: List[MeasurementBatch] = []
+        rows = zip(
+            batch.entry_id.tolist(),
+            batch.time.tolist(),
+            batch.value.tolist(),
+            batch.code.tolist(),
+        )
+        for i, (entry_id, t, v, c) in enumerate(rows):
+            if entry_id != self._entry_id:
+                self._release(batch, keep, earlier)
+                self._reset(entry_id)
+            if self._kept is None or self._forced(t, c):
+                self._release(batch, keep, earlier)
+                self._keep(t, v, c)
+                keep.append(i)
+            elif self._outside(t, v):
+                # the held back sample ends the segment
+                self._release(batch, keep, earlier)
+                if self.policy.mode == CompressionMode.SWINGING_DOOR:
+                    # a new corridor from the released sample through this one
+                    self._outside(t, v)
+                    self._held = (batch, i)
+                else:
+                    self._keep(t, v, c)
+                    keep.append(i)
+            else:
+                self._held = (batch, i)
+        if final:
+            self._release(batch, keep, earlier)
+            self._reset(None)
+
+        out = batch.take(np.asarray(keep, dtype=np.int64))
+        if earlier:
+            out = concat_batches(earlier + [out])
+        self.samples_out += len(out)
+        if self._held is not None and self._held[0] is batch:
+            self._held = (batch.take(np.asarray([self._held[1]])), 0)
+        return out
+
+    def _forced(self, t: float, c: int) -> bool:
+        """State/direction change or heartbeat, the sample is always kept."""
+        kept_time, _, kept_code = self._kept
+        heartbeat = self.policy.heartbeat
+        return c != kept_code or (heartbeat > 0 and t - kept_time >= heartbeat)
+
+    def _outside(self, t: float, v: float) -> bool:
+        """Check whether the sample leaves the tolerance of the last kept one."""
+        kept_time, kept_value, _ = self._kept
+        deviation = self.policy.deviation
+        mode = self.policy.mode
+        if mode == CompressionMode.NONE:
+            return True
+        if mode == CompressionMode.CHANGE_ONLY:
+            return v != kept_value
+        if mode == CompressionMode.DEADBAND:
+            return abs(v - kept_value) > deviation
+        dt = t - kept_time
+        if dt <= 0:
+            return abs(v - kept_value) > deviation
+        # the line from the kept sample to this one must pass every sample
+        # since within the deviation
+        slope = (v - kept_value) / dt
+        if slope > self._slope_max or slope < self._slope_min:
+            return True
+        self._slope_max = min(self._slope_max, (v + deviation - kept_value) / dt)
+        self._slope_min = max(self._slope_min, (v - deviation - kept_value) / dt)
+        return False
+
+    def _keep(self, t: float, v: float, c: int):
+        self._kept = (t, v, c)
+        self._held = None
+        self._slope_max, self._slope_min = np.inf, -np.inf
+
+    def _release(self, batch, keep: List[int], earlier: List[MeasurementBatch]):
+        """Keep the held back sample, if any."""
+        if self._held is None:
+            return
+        source, index = self._held
+        self._keep(
+            float(source.time[index]),
+            float(source.value[index]),
+            int(source.code[index]),
+        )
+        if source is batch:
+            keep.append(index)
+        else:
+            earlier.append(source)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Samples seen and stored since start."""
+        return {
+            "mode": self.policy.mode.value,
+            "samples_in": self.samples_in,
+            "samples_out": self.samples_out,
+        }
+
+
+def reconstruct(
+    rows: Sequence[Dict[str, Any]],
+    value_name: str,
+    interval: float,
+    policy: Optional[Dict[str, Any]] = None,
+    limit: int = 1000,
+) -> List[Dict[str, Any]]:
+    """Rebuild an evenly spaced series from stored (compressed) rows.
+
+    Args:
+        rows: Stored measurements of one entry in time order
+        value_name: Name of the value column (angle, speed or flow)
+        interval: Spacing of the rebuilt series in seconds
+        policy: Compression policy of the entry as stored with it, decides
+            between held values and linear interpolation
+        limit: Maximum number of rebuilt rows (at most
+            ``RECONSTRUCT_MAX_ROWS``), a finer interval is widened
+
+    Returns:
+        Rows at every ``interval`` from the first to the last stored sample,
+        each with the id and state/direction of the stored sample before it
+    """
+    if len(rows) < 2 or interval <= 0:
+        return list(rows)
+    mode = CompressionPolicy.model_validate(policy or {}).mode
+    times = np.fromiter((r["time"] for r in rows), dtype=np.float64, count=len(rows))
+    values = np.fromiter(
+        (r[value_name] for r in rows), dtype=np.float64, count=len(rows)
+    )
+    # Widen the spacing so the grid never exceeds the limit
+    limit = max(2, min(limit, RECONSTRUCT_MAX_ROWS))
+    interval = max(interval, (times[-1] - times[0]) / (limit - 1))
+    grid = np.arange(times[0], times[-1] + interval / 2, interval)
+    source = np.searchsorted(times, grid, side="right") - 1
+    if mode == CompressionMode.SWINGING_DOOR:
+        grid_values = np.interp(grid, times, values)
+    else:
+        grid_values = values[source]
+    result = []
+    for t, v, s in zip(grid.tolist(), grid_values.tolist(), source.tolist()):
+        row = dict(rows[s])
+        row[value_name] = v
+        row["time"] = t
+        result.append(row)
+    return result
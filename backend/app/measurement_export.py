@@ -0,0 +1,284 @@
+"""Incremental encoders for bulk measurement exports.
+
+An export streams the rows of an entry from a server-side cursor (see
+:func:`app.database.database.stream_rows`) and encodes every chunk as soon as
+it arrives, so memory stays at one chunk however long the entry is:
+
+- ``csv``: header line, then one line per row
+- ``ndjson``: one JSON object per line
+- ``parquet``: one row group per chunk (needs pyarrow)
+- ``arrow``: Arrow IPC stream, one record batch per chunk (needs pyarrow)
+
+Any format can be gzipped on the fly. Timestamps are written as ISO 8601 in
+the text formats and as UTC timestamps in the Arrow formats.
+
+Archived entries (see :mod:`app.measurement_archive`) are streamed as column
+chunks instead of row tuples; the Arrow formats wrap their numpy arrays
+without building rows.
+"""
+
+import csv
+import io
+import json
+import threading
+import zlib
+from datetime import timezone
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from app.config import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only needed for parquet and arrow
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = ("csv", "ndjson", "parquet", "arrow")
+ARROW_FORMATS = ("parquet", "arrow")
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# Exports hold a database connection until the client has read everything
+_export_slots = threading.BoundedSemaphore(settings.export_max_concurrent)
+
+
+def check_format(fmt: str) -> None:
+    """Check that an export format is known and its encoder available.
+
+    Raises:
+        ValueError: If the format is unknown or needs pyarrow, which is not
+            installed
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(
+            f"Unknown export format {fmt}, expected one of {', '.join(EXPORT_FORMATS)}"
+        )
+    if fmt in ARROW_FORMATS and pa is None:
+        raise ValueError(f"Export format {fmt} needs pyarrow, which is not installed")
+
+
+def export_response(
+    handler,
+    filename: str,
+    entry_id: str,
+    fmt: str,
+    gzip: bool = False,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+) -> StreamingResponse:
+    """Stream an entry's measurements from a motor handler as a file download.
+
+    Args:
+        handler: Motor handler with ``export_measurements``
+        filename: File name without extension, e.g. ``tilt_entry_5``
+        entry_id: Entry of the measurements
+        fmt: Export format, see ``EXPORT_FORMATS``
+        gzip: Compress the export with gzip
+        start: Window start in seconds of the run
+        end: Window end in seconds of the run
+
+    Raises:
+        HTTPException: 400 for an unavailable format, 429 when
+            ``export_max_concurrent`` exports are running
+    """
+    try:
+        check_format(fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not _export_slots.acquire(blocking=False):
+        raise HTTPException(status_code=429, detail="Too many exports running")
+    try:
+        body = handler.export_measurements(entry_id, fmt, gzip, start, end)
+    except Exception:
+        _export_slots.release()
+        raise
+    filename = f"{filename}.{fmt}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        # Runs after the last chunk and after a client disconnect alike
+        background=BackgroundTask(_export_slots.release),
+    )
+
+
+def export_stream(
+    chunks: Iterable[List[Tuple]],
+    columns: Sequence[Tuple[str, str]],
+    fmt: str,
+    gzip: bool = False,
+    columnar: bool = False,
+) -> Iterator[bytes]:
+    """Encode streamed rows incrementally.
+
+    Args:
+        chunks: Lists of row tuples in column order, or lists of numpy
+            arrays (one per column) if ``columnar``
+        columns: (name, PostgreSQL type) of every column
+        fmt: One of ``EXPORT_FORMATS``
+        gzip: Compress the encoded stream with gzip
+        columnar: The chunks hold column arrays, timestamps as
+            ``datetime64[us]`` in UTC
+
+    Returns:
+        Iterator of encoded byte chunks
+    """
+    encoders = {
+        "csv": _encode_csv,
+        "ndjson": _encode_ndjson,
+        "parquet": _encode_parquet,
+        "arrow": _encode_arrow,
+    }
+    if fmt in ARROW_FORMATS:
+        encoded = encoders[fmt](chunks, columns, columnar)
+    else:
+        if columnar:
+            chunks = (_column_rows(arrays, columns) for arrays in chunks)
+        encoded = encoders[fmt](chunks, columns)
+    if gzip:
+        encoded = _gzip(encoded)
+    return (data for data in encoded if data)
+
+
+def _column_rows(arrays, columns) -> List[Tuple]:
+    """Row tuples of a column chunk, timestamps as aware datetimes."""
+    values = []
+    for array, (_, pg_type) in zip(arrays, columns):
+        if pg_type == "timestamptz":
+            values.append(
+                [
+                    stamp.replace(tzinfo=timezone.utc) if stamp is not None else None
+                    for stamp in array.tolist()
+                ]
+            )
+        else:
+            values.append(array.tolist())
+    return list(zip(*values))
+
+
+def _text_rows(rows, columns):
+    """Rows with the timestamps as ISO 8601 strings."""
+    stamps = [i for i, (_, pg_type) in enumerate(columns) if pg_type == "timestamptz"]
+    if not stamps:
+        return rows
+
+    def convert(row):
+        row = list(row)
+        for i in stamps:
+            if row[i] is not None:
+                row[i] = row[i].isoformat()
+        return row
+
+    return map(convert, rows)
+
+
+def _encode_csv(chunks, columns) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow([name for name, _ in columns])
+    for rows in chunks:
+        writer.writerows(_text_rows(rows, columns))
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _encode_ndjson(chunks, columns) -> Iterator[bytes]:
+    names = [name for name, _ in columns]
+    encode = json.JSONEncoder(separators=(",", ":")).encode
+    for rows in chunks:
+        lines = [encode(dict(zip(names, row))) for row in _text_rows(rows, columns)]
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def _arrow_schema(columns):
+    types = {
+        "int4": pa.int32(),
+        "int8": pa.int64(),
+        "float8": pa.float64(),
+        "text": pa.string(),
+        "timestamptz": pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(name, types[pg_type]) for name, pg_type in columns])
+
+
+def _arrow_table(rows, schema, columnar=False):
+    if columnar:
+        # Numeric and timestamp arrays are wrapped without a copy
+        arrays = [
+            pa.array(array, type=field.type) for array, field in zip(rows, schema)
+        ]
+    else:
+        arrays = [
+            pa.array([row[i] for row in rows], type=field.type)
+            for i, field in enumerate(schema)
+        ]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _encode_parquet(chunks, columns, columnar=False) -> Iterator[bytes]:
+    schema = _arrow_schema(columns)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in chunks:
+            writer.write_table(_arrow_table(rows, schema, columnar))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _encode_arrow(chunks, columns, columnar=False) -> Iterator[bytes]:
+    schema = _arrow_schema(columns)
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for rows in chunks:
+            writer.write_table(_arrow_table(rows, schema, columnar))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _gzip(encoded: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(settings.export_gzip_level, zlib.DEFLATED, 31)
+    for data in encoded:
+        yield compressor.compress(data)
+    yield compressor.flush()
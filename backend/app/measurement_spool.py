@@ -0,0 +1,528 @@
+"""Bounded, disk-backed backlog for measurements the database did not take.
+
+When a measurement write fails (database restart, network outage) the batch
+is handed to the :class:`MeasurementSpool` of its motor instead of being kept
+in an unbounded in-memory queue. The spool keeps up to
+``spool_memory_rows`` samples in memory and spills everything beyond that to
+append-only segment files of binary records::
+
+    header  magic "MSP1", row count (uint32), spool time (float64), CRC32
+    payload entry_id int32[n] | value float64[n] | code uint8[n] | time float64[n]
+
+all little-endian, 21 bytes per sample. Segments are flushed on every append
+but fsynced at most every ``spool_fsync_interval`` seconds. The
+:class:`SpoolReplayer` thread drains the backlog into the database oldest
+first, a bounded number of rows per transaction, and removes segments once
+written. While a backlog exists new batches are queued behind it, so rows
+reach the database in the order they were measured. The replay position is
+persisted, so a restart resends at most the records of one transaction.
+
+Only connection and operational errors are retried. A record the database
+rejects for its data (unknown entry, constraint violation) would fail on
+every retry and block its table, so it is appended to ``quarantine.rec`` in
+the spool directory (same record layout), logged and skipped.
+"""
+
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import psycopg
+
+from app.config import settings
+from app.measurement_buffer import MeasurementBatch, concat_batches
+
+RECORD_MAGIC = b"MSP1"
+_HEADER = struct.Struct("<4sIdI")
+_SAMPLE_BYTES = 4 + 8 + 1 + 8
+_SEGMENT_SUFFIX = ".seg"
+_POSITION_FILE = "replay.pos"
+_QUARANTINE_FILE = "quarantine.rec"
+
+
+def is_transient_error(error: Exception) -> bool:
+    """True if a failed write may succeed later (connection, pool timeout).
+
+    Everything else, such as a constraint violation or an unknown entry, is
+    caused by the rows themselves and fails again on every retry.
+    """
+    return isinstance(error, (psycopg.OperationalError, psycopg.InterfaceError))
+
+
+def encode_record(batch: MeasurementBatch, spooled_at: float) -> bytes:
+    """Serialise a batch into one spool record."""
+    payload = b"".join(
+        (
+            np.ascontiguousarray(batch.entry_id, dtype="<i4").tobytes(),
+            np.ascontiguousarray(batch.value, dtype="<f8").tobytes(),
+            np.ascontiguousarray(batch.code, dtype="u1").tobytes(),
+            np.ascontiguousarray(batch.time, dtype="<f8").tobytes(),
+        )
+    )
+    header = _HEADER.pack(RECORD_MAGIC, len(batch), spooled_at, zlib.crc32(payload))
+    return header + payload
+
+
+def decode_payload(
+    payload: bytes, n: int, template: MeasurementBatch
+) -> MeasurementBatch:
+    """Rebuild the batch of a record payload with the columns of ``template``."""
+    entry_id = np.frombuffer(payload, dtype="<i4", count=n, offset=0)
+    value = np.frombuffer(payload, dtype="<f8", count=n, offset=4 * n)
+    code = np.frombuffer(payload, dtype="u1", count=n, offset=12 * n)
+    time_ = np.frombuffer(payload, dtype="<f8", count=n, offset=13 * n)
+    return template._with_columns(
+        entry_id.astype(np.int32),
+        value.astype(np.float64),
+        code.copy(),
+        time_.astype(np.float64),
+    )
+
+
+class MeasurementSpool:
+    """Backlog of one measurement table, in memory first and then on disk."""
+
+    def __init__(
+        self,
+        name: str,
+        writer: Callable[[MeasurementBatch], Any],
+        value_name: str,
+        code_name: str,
+        codes: Sequence[str],
+    ):
+        """Init function for the spool.
+
+        Args:
+            name: Spool name, also the directory below ``spool_dir``
+            writer: Writes a batch to the database, raises on failure
+            value_name: Name of the value column (angle, speed or flow)
+            code_name: Name of the enum-coded column (state or direction)
+            codes: Allowed values of the enum-coded column
+        """
+        self.name = name
+        self._writer = writer
+        self._template = MeasurementBatch(
+            np.empty(0, np.int32),
+            np.empty(0, np.float64),
+            np.empty(0, np.uint8),
+            np.empty(0, np.float64),
+            value_name,
+            code_name,
+            tuple(codes),
+        )
+        self._dir = Path(settings.spool_dir) / name
+        self._lock = threading.Lock()
+        self._memory: Deque[Tuple[float, MeasurementBatch]] = deque()
+        self._memory_rows = 0
+        # Segment being appended to
+        self._out = None
+        self._out_path: Optional[Path] = None
+        self._out_bytes = 0
+        self._last_fsync = 0.0
+        self._unsynced = False
+        # Replay position: oldest segment and the offset of its next record
+        self._read_path: Optional[Path] = None
+        self._read_offset = 0
+        self._disk_rows = 0
+        self._disk_bytes = 0
+        self._oldest_disk_time: Optional[float] = None
+        # Rows replayed one record at a time to find a record the database
+        # rejects
+        self._isolate_rows = 0
+        # Counters
+        self.spilled_rows = 0
+        self.replayed_rows = 0
+        self.quarantined_rows = 0
+        self.last_error: Optional[str] = None
+        self._recover()
+
+    # ---------------------------------------------------------
+    # Queueing
+    # ---------------------------------------------------------
+
+    @property
+    def pending(self) -> bool:
+        """True while rows are waiting for the database."""
+        return bool(self._memory_rows or self._disk_rows)
+
+    def append(self, batch: MeasurementBatch) -> None:
+        """Queue a batch that could not be written (or must wait its turn)."""
+        if not len(batch):
+            return
+        now = time.time()
+        with self._lock:
+            self.spilled_rows += len(batch)
+            if (
+                not self._disk_rows
+                and self._memory_rows + len(batch) <= settings.spool_memory_rows
+            ):
+                self._memory.append((now, batch.copy()))
+                self._memory_rows += len(batch)
+                return
+            # Over the memory bound: the memory queue goes to disk first
+            while self._memory:
+                spooled_at, queued = self._memory.popleft()
+                self._memory_rows -= len(queued)
+                self._write_record(queued, spooled_at)
+            self._write_record(batch, now)
+            self._sync_if_due()
+
+    def _write_record(self, batch: MeasurementBatch, spooled_at: float):
+        if self._out is None or self._out_bytes >= settings.spool_segment_bytes:
+            self._roll_segment()
+        record = encode_record(batch, spooled_at)
+        self._out.write(record)
+        self._out.flush()
+        self._out_bytes += len(record)
+        self._disk_bytes += len(record)
+        self._disk_rows += len(batch)
+        self._unsynced = True
+        if self._oldest_disk_time is None:
+            self._oldest_disk_time = spooled_at
+        if self._read_path is None:
+            self._read_path, self._read_offset = self._out_path, 0
+
+    def _roll_segment(self):
+        self._close_segment()
+        self._dir.mkdir(parents=True, exist_ok=True)
+        segments = self._segments()
+        number = int(segments[-1].stem) + 1 if segments else 1
+        self._out_path = self._dir / f"{number:08d}{_SEGMENT_SUFFIX}"
+        self._out = open(self._out_path, "ab")
+        self._out_bytes = 0
+
+    def _close_segment(self):
+        if self._out is not None:
+            self._fsync()
+            self._out.close()
+            self._out = None
+            self._out_path = None
+
+    def _fsync(self):
+        if self._out is not None and self._unsynced:
+            os.fsync(self._out.fileno())
+        self._unsynced = False
+        self._last_fsync = time.monotonic()
+
+    def _sync_if_due(self):
+        if (
+            self._unsynced
+            and time.monotonic() - self._last_fsync >= settings.spool_fsync_interval
+        ):
+            self._fsync()
+
+    def sync_if_due(self) -> None:
+        """Fsync appended records once the fsync interval has passed."""
+        with self._lock:
+            self._sync_if_due()
+
+    def close(self) -> None:
+        """Fsync and close the segment being appended to.
+
+        Rows still in memory are written to disk so they survive the restart.
+        """
+        with self._lock:
+            while self._memory:
+                spooled_at, queued = self._memory.popleft()
+                self._memory_rows -= len(queued)
+                self._write_record(queued, spooled_at)
+            self._close_segment()
+
+    def quarantine(self, batch: MeasurementBatch, error: Exception) -> None:
+        """Set aside rows the database rejected for their data."""
+        entries = sorted(set(batch.entry_id.tolist()))
+        print(
+            f"Quarantined {len(batch)} {self.name} measurements of entries "
+            f"{entries}: {error}"
+        )
+        with self._lock:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            with open(self._dir / _QUARANTINE_FILE, "ab") as f:
+                f.write(encode_record(batch, time.time()))
+                f.flush()
+                os.fsync(f.fileno())
+            self.quarantined_rows += len(batch)
+
+    # ---------------------------------------------------------
+    # Replay
+    # ---------------------------------------------------------
+
+    def replay_once(self) -> int:
+        """Write the oldest queued rows to the database in one transaction.
+
+        A transaction the database rejects for its data is replayed again one
+        record at a time, and the failing record is quarantined.
+
+        Returns:
+            Number of rows written or quarantined, 0 if the spool is empty
+
+        Raises:
+            Exception: If the database could not be reached, nothing is dropped
+        """
+        max_rows = 1 if self._isolate_rows > 0 else settings.spool_replay_rows
+        with self._lock:
+            if self._disk_rows:
+                source = "disk"
+                batches, end = self._read_records(max_rows)
+            elif self._memory:
+                source = "memory"
+                batches, rows = [], 0
+                for _, queued in self._memory:
+                    if batches and rows + len(queued) > max_rows:
+                        break
+                    batches.append(queued)
+                    rows += len(queued)
+            else:
+                return 0
+            if not batches:
+                if source == "disk":
+                    self._advance(end, 0)
+                return 0
+
+        batch = concat_batches(batches) if len(batches) > 1 else batches[0]
+        written = False
+        try:
+            self._writer(batch)
+        except Exception as e:
+            self.last_error = str(e)
+            if is_transient_error(e):
+                raise
+            if len(batches) > 1:
+                # One of the records is bad, retry them one by one
+                self._isolate_rows = len(batch)
+                return self.replay_once()
+            self.quarantine(batch, e)
+        else:
+            self.last_error = None
+            written = True
+        self._isolate_rows = max(self._isolate_rows - len(batch), 0)
+
+        with self._lock:
+            if written:
+                self.replayed_rows += len(batch)
+            if source == "disk":
+                self._advance(end, len(batch))
+            else:
+                for _ in batches:
+                    _, queued = self._memory.popleft()
+                    self._memory_rows -= len(queued)
+        return len(batch)
+
+    def _read_records(
+        self, max_rows: int
+    ) -> Tuple[List[MeasurementBatch], Tuple[Path, int, int]]:
+        """Read records from the replay position, up to ``max_rows`` rows.
+
+        Returns:
+            The batches and the position after them with the bytes read
+        """
+        path, offset = self._read_path, self._read_offset
+        batches: List[MeasurementBatch] = []
+        rows = 0
+        read_bytes = 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                magic, n, _, crc = _HEADER.unpack(header)
+                if batches and rows + n > max_rows:
+                    break
+                payload = f.read(n * _SAMPLE_BYTES)
+                if (
+                    magic != RECORD_MAGIC
+                    or len(payload) < n * _SAMPLE_BYTES
+                    or zlib.crc32(payload) != crc
+                ):
+                    # Torn record at the end of a segment after a crash
+                    print(f"Skipping damaged spool record in {path}")
+                    return batches, (path, path.stat().st_size, read_bytes)
+                batches.append(decode_payload(payload, n, self._template))
+                rows += n
+                read_bytes += _HEADER.size + len(payload)
+        return batches, (path, offset + read_bytes, read_bytes)
+
+    def _advance(self, end: Tuple[Path, int, int], rows: int):
+        path, offset, read_bytes = end
+        self._disk_rows = max(self._disk_rows - rows, 0)
+        self._disk_bytes = max(self._disk_bytes - read_bytes, 0)
+        self._read_offset = offset
+        if offset >= path.stat().st_size:
+            # Segment fully written to the database
+            if path == self._out_path:
+                self._close_segment()
+            path.unlink(missing_ok=True)
+            segments = self._segments()
+            self._read_path = segments[0] if segments else None
+            self._read_offset = 0
+        if not self._disk_rows:
+            # Drained, a torn record left by a crash is dropped with its file
+            self._close_segment()
+            for segment in self._segments():
+                segment.unlink(missing_ok=True)
+            self._read_path = None
+            self._read_offset = 0
+            self._disk_bytes = 0
+        elif self._read_path is None:
+            self._disk_rows = 0
+            self._disk_bytes = 0
+        self._oldest_disk_time = self._peek_time()
+        self._save_position()
+
+    def _peek_time(self) -> Optional[float]:
+        if self._read_path is None:
+            return None
+        try:
+            with open(self._read_path, "rb") as f:
+                f.seek(self._read_offset)
+                header = f.read(_HEADER.size)
+        except OSError:
+            return None
+        if len(header) < _HEADER.size:
+            return None
+        return _HEADER.unpack(header)[2]
+
+    # ---------------------------------------------------------
+    # Recovery after a restart
+    # ---------------------------------------------------------
+
+    def _segments(self) -> List[Path]:
+        if not self._dir.is_dir():
+            return []
+        return sorted(self._dir.glob(f"*{_SEGMENT_SUFFIX}"))
+
+    def _save_position(self):
+        if not self._dir.is_dir():
+            return
+        position = self._dir / _POSITION_FILE
+        if self._read_path is None:
+            position.unlink(missing_ok=True)
+            return
+        tmp = position.with_suffix(".tmp")
+        tmp.write_text(f"{self._read_path.name} {self._read_offset}")
+        os.replace(tmp, position)
+
+    def _recover(self):
+        """Count the rows left on disk by a previous run."""
+        segments = self._segments()
+        if not segments:
+            return
+        self._read_path, self._read_offset = segments[0], 0
+        position = self._dir / _POSITION_FILE
+        try:
+            name, offset = position.read_text().split()
+            if (self._dir / name).exists():
+                self._read_path, self._read_offset = self._dir / name, int(offset)
+                for older in segments:
+                    if older.name < name:
+                        older.unlink(missing_ok=True)
+        except (OSError, ValueError):
+            pass
+        for path in self._segments():
+            offset = self._read_offset if path == self._read_path else 0
+            size = path.stat().st_size
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while True:
+                    header = f.read(_HEADER.size)
+                    if len(header) < _HEADER.size:
+                        break
+                    magic, n, spooled_at, _ = _HEADER.unpack(header)
+                    if magic != RECORD_MAGIC:
+                        break
+                    f.seek(n * _SAMPLE_BYTES, os.SEEK_CUR)
+                    if f.tell() > size:
+                        break
+                    self._disk_rows += n
+                    self._disk_bytes += _HEADER.size + n * _SAMPLE_BYTES
+                    if self._oldest_disk_time is None:
+                        self._oldest_disk_time = spooled_at
+        if self._disk_rows:
+            print(f"Replaying {self._disk_rows} spooled {self.name} measurements")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Backlog size and age."""
+        with self._lock:
+            times = [t for t in (self._oldest_disk_time,) if t is not None]
+            if self._memory:
+                times.append(self._memory[0][0])
+            return {
+                "rows_in_memory": self._memory_rows,
+                "rows_on_disk": self._disk_rows,
+                "bytes_on_disk": self._disk_bytes,
+                "segments": len(self._segments()),
+                "oldest_age": time.time() - min(times) if times else None,
+                "spilled_rows": self.spilled_rows,
+                "replayed_rows": self.replayed_rows,
+                "quarantined_rows": self.quarantined_rows,
+                "last_error": self.last_error,
+            }
+
+
+class SpoolReplayer:
+    """Background thread draining every registered spool into the database."""
+
+    def __init__(self):
+        """Initialize the replayer."""
+        self._spools: List[MeasurementSpool] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def register(self, spool: MeasurementSpool) -> None:
+        """Add a spool to drain."""
+        self._spools.append(spool)
+
+    def wake(self) -> None:
+        """Try the database again right away."""
+        self._wake.set()
+
+    def start(self) -> None:
+        """Start the replay thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="spool-replayer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the replay thread and close the spools."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        for spool in self._spools:
+            spool.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            progressed = False
+            for spool in self._spools:
+                spool.sync_if_due()
+                if not spool.pending:
+                    continue
+                try:
+                    progressed = spool.replay_once() > 0 or progressed
+                except Exception as e:
+                    print(f"Replay of spooled {spool.name} measurements failed: {e}")
+            if not progressed:
+                self._wake.wait(settings.spool_retry_interval)
+                self._wake.clear()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Backlog of every spool by name."""
+        return {spool.name: spool.get_stats() for spool in self._spools}
+
+
+# Global replayer instance
+spool_replayer = SpoolReplayer()
@@ -0,0 +1,300 @@
+"""Shared writer thread for the measurement tables of every motor.
+
+The motor controllers hand their (compressed) batches to
+:data:`measurement_writer` instead of writing them on their own flush
+cadence. The writer collects the batches of all tables and flushes when
+``writer_flush_rows`` rows are pending or the oldest pending row is
+``writer_flush_ms`` old, whichever comes first, writing every table with one
+COPY each in a single transaction on the ingest pool. An idle system does not
+commit at all and three busy motors share one commit.
+
+A table whose database could not be reached keeps its rows in its
+:class:`~app.measurement_spool.MeasurementSpool`; while the spool has a
+backlog new rows of that table are queued behind it. Rows the database
+rejects for their data are quarantined by the spool instead, so they never
+block the table.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from app.config import settings
+from app.database.database import POOL_INGEST, db
+from app.measurement_buffer import MeasurementBatch, concat_batches
+from app.measurement_spool import (
+    MeasurementSpool,
+    is_transient_error,
+    spool_replayer,
+)
+
+# Writes one table's rows on the cursor of the flush transaction
+CopyFunction = Callable[[Any, MeasurementBatch], int]
+
+# Flushes kept for the latency percentiles
+_LATENCY_WINDOW = 256
+
+
+class MeasurementWriter:
+    """Batches measurements of all motors into adaptive, shared transactions."""
+
+    def __init__(self):
+        """Initialize the writer, the thread starts on first use."""
+        self._copy: Dict[str, CopyFunction] = {}
+        self._spools: Dict[str, MeasurementSpool] = {}
+        self._cond = threading.Condition()
+        self._pending: Dict[str, List[MeasurementBatch]] = {}
+        self._pending_rows = 0
+        self._oldest: Optional[float] = None
+        # Tables of the flush in progress
+        self._flushing: Set[str] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        # Statistics
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rows_written: Dict[str, int] = {}
+        self.triggers = {"rows": 0, "age": 0, "shutdown": 0}
+        self._latencies: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self._batch_rows: Deque[int] = deque(maxlen=_LATENCY_WINDOW)
+
+    def register(
+        self,
+        name: str,
+        copy: CopyFunction,
+        value_name: str,
+        code_name: str,
+        codes: Sequence[str],
+    ) -> MeasurementSpool:
+        """Add a measurement table.
+
+        Args:
+            name: Table key used with :meth:`submit`, also the spool name
+            copy: Writes a batch on a cursor without committing
+            value_name: Name of the value column (angle, speed or flow)
+            code_name: Name of the enum-coded column (state or direction)
+            codes: Allowed values of the enum-coded column
+
+        Returns:
+            The spool keeping the rows of the table the database did not take
+        """
+        self._copy[name] = copy
+        self.rows_written[name] = 0
+        spool = MeasurementSpool(
+            name,
+            lambda batch: self._write({name: batch}),
+            value_name,
+            code_name,
+            codes,
+        )
+        self._spools[name] = spool
+        spool_replayer.register(spool)
+        return spool
+
+    # ---------------------------------------------------------
+    # Submitting
+    # ---------------------------------------------------------
+
+    def submit(self, name: str, batch: MeasurementBatch) -> None:
+        """Queue rows of a registered table for the next flush.
+
+        The batch is copied, the caller may reuse its buffer right away.
+        """
+        if not len(batch):
+            return
+        with self._cond:
+            if self._thread is None and not self._stopping:
+                self._start()
+            self._pending.setdefault(name, []).append(batch.copy())
+            self._pending_rows += len(batch)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                # The thread waits without a timeout while nothing is pending
+                self._cond.notify_all()
+            elif self._pending_rows >= settings.writer_flush_rows:
+                self._cond.notify_all()
+
+    def wait_written(self, name: str, timeout: float) -> bool:
+        """Wait until every submitted row of a table is in the database.
+
+        Returns:
+            False if rows of the table are still pending after ``timeout``
+            seconds or wait in its spool
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while name in self._pending or name in self._flushing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return not self._spools[name].pending
+
+    # ---------------------------------------------------------
+    # Writer thread
+    # ---------------------------------------------------------
+
+    def start(self) -> None:
+        """Start the writer thread."""
+        with self._cond:
+            self._stopping = False
+            if self._thread is None:
+                self._start()
+
+    def _start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="measurement-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write everything pending and stop the writer thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=settings.db_pool_timeout + 5)
+        self._thread = None
+
+    def _age_due(self) -> bool:
+        return (
+            self._oldest is not None
+            and time.monotonic() - self._oldest >= settings.writer_flush_ms / 1000
+        )
+
+    def _wait_time(self) -> Optional[float]:
+        if self._oldest is None:
+            return None
+        deadline = self._oldest + settings.writer_flush_ms / 1000
+        return max(deadline - time.monotonic(), 0.0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (
+                    self._stopping
+                    or self._pending_rows >= settings.writer_flush_rows
+                    or self._age_due()
+                ):
+                    self._cond.wait(self._wait_time())
+                if not self._pending_rows:
+                    return
+                if self._pending_rows >= settings.writer_flush_rows:
+                    trigger = "rows"
+                elif self._age_due():
+                    trigger = "age"
+                else:
+                    trigger = "shutdown"
+                pending, self._pending = self._pending, {}
+                self._pending_rows = 0
+                self._oldest = None
+                self._flushing = set(pending)
+            self._flush(pending, trigger)
+            with self._cond:
+                self._flushing = set()
+                self._cond.notify_all()
+
+    def _flush(self, pending: Dict[str, List[MeasurementBatch]], trigger: str):
+        batches: Dict[str, MeasurementBatch] = {}
+        for name, parts in pending.items():
+            batch = concat_batches(parts) if len(parts) > 1 else parts[0]
+            if self._spools[name].pending:
+                # Queue behind the backlog so rows reach the database in order
+                self._spools[name].append(batch)
+            else:
+                batches[name] = batch
+        if not batches:
+            return
+
+        rows = sum(len(batch) for batch in batches.values())
+        started = time.perf_counter()
+        try:
+            self._write(batches)
+        except Exception as e:
+            print(f"Error saving measurements batch: {e}")
+            self.failed_flushes += 1
+            if is_transient_error(e) or len(batches) == 1:
+                self._set_aside(batches, e)
+                return
+            # Rows of one table failed the shared transaction, write each
+            # table on its own so the others are not held back
+            for name, batch in batches.items():
+                try:
+                    self._write({name: batch})
+                except Exception as error:
+                    self._set_aside({name: batch}, error)
+                else:
+                    self.rows_written[name] += len(batch)
+            return
+        self._latencies.append(time.perf_counter() - started)
+        self._batch_rows.append(rows)
+        self.flushes += 1
+        self.triggers[trigger] += 1
+        for name, batch in batches.items():
+            self.rows_written[name] += len(batch)
+
+    def _set_aside(self, batches: Dict[str, MeasurementBatch], error: Exception):
+        if not is_transient_error(error):
+            # Fails again on every retry, must not block the table
+            for name, batch in batches.items():
+                self._spools[name].quarantine(batch, error)
+            return
+        # The spools keep the rows until the database is back
+        for name, batch in batches.items():
+            self._spools[name].append(batch)
+        spool_replayer.wake()
+
+    def _write(self, batches: Dict[str, MeasurementBatch]):
+        """Write the batches of several tables in one transaction."""
+        with db.get_connection(POOL_INGEST) as conn:
+            try:
+                with conn.cursor() as cur:
+                    for name, batch in batches.items():
+                        self._copy[name](cur, batch)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    # ---------------------------------------------------------
+    # Statistics
+    # ---------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Flush counts, latency and batch size of the recent flushes."""
+        with self._cond:
+            pending_rows = self._pending_rows
+            oldest = self._oldest
+        latencies = np.asarray(self._latencies, dtype=np.float64) * 1000
+        batch_rows = np.asarray(self._batch_rows, dtype=np.float64)
+        return {
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "triggers": dict(self.triggers),
+            "rows_written": dict(self.rows_written),
+            "pending_rows": pending_rows,
+            "oldest_pending_ms": (time.monotonic() - oldest) * 1000
+            if oldest is not None
+            else None,
+            "flush_ms": _summary(latencies),
+            "batch_rows": _summary(batch_rows),
+        }
+
+
+def _summary(values: np.ndarray) -> Optional[Dict[str, float]]:
+    if not len(values):
+        return None
+    return {
+        "last": float(values[-1]),
+        "mean": float(values.mean()),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values.max()),
+    }
+
+
+# Global writer instance
+measurement_writer = MeasurementWriter()
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional
+from typing import Any, Optional
 
 from pydantic import BaseModel
 
@@ -16,6 +16,62 @@ class MotorStatus(str, Enum):
     ERROR = "error"
 
 
+class MotorState(str, Enum):
+    """Run state of a motor controller."""
+
+    IDLE = "idle"
+    STARTING = "starting"
+    RUNNING = "running"
+    PAUSING = "pausing"
+    PAUSED = "paused"
+    STOPPING = "stopping"
+
+
+class JobStatus(str, Enum):
+    """Status of a background job."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobResponse(BaseModel):
+    """Background job response model."""
+
+    id: str
+    kind: str
+    resource: str
+    status: JobStatus
+    progress: float
+    message: str
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class CompressionMode(str, Enum):
+    """How stored measurements of an entry are compressed."""
+
+    NONE = "none"
+    DEADBAND = "deadband"
+    CHANGE_ONLY = "change_only"
+    SWINGING_DOOR = "swinging_door"
+
+
+class CompressionPolicy(BaseModel):
+    """Compression of the stored measurements of an entry."""
+
+    mode: CompressionMode = CompressionMode.NONE
+    # Tolerance in units of the value (degrees, rpm or mL/min)
+    deviation: float = 0.0
+    # Seconds after which a sample is stored even if nothing changed, 0 never
+    heartbeat: float = 60.0
+
+
 class User(BaseModel):
     """User model."""
 
@@ -54,6 +110,7 @@ class TiltMotorRequest(BaseModel):
     standstill_duration_left: Optional[float]
     standstill_duration_horizontal: Optional[float]
     standstill_duration_right: Optional[float]
+    compression: Optional[CompressionPolicy] = None
 
 
 class MoveScenario(BaseModel):
@@ -130,6 +187,7 @@ class RotateMotorRequest(BaseModel):
     scenario_id: int | None = None
     scenario_name: str | None = None
     movements: list[Movement]
+    compression: Optional[CompressionPolicy] = None
 
 
 class RotationScenario(BaseModel):
@@ -191,6 +249,7 @@ class PeristalticRotateRequest(BaseModel):
     calibration_name: str
     calibration_preset: bool
     movements: list[PeristalticMovement]
+    compression: Optional[CompressionPolicy] = None
 
 
 class PeristalticEntryResponse(BaseModel):
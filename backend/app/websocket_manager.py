@@ -1,19 +1,272 @@
 import asyncio
 import json
-from typing import Any, Dict, Set
+import struct
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
 
+import numpy as np
 from fastapi import WebSocket
 
 from app.asyncio_loop import get_event_loop
+from app.config import settings
+from app.measurement_buffer import (
+    MeasurementBatch,
+    concat_batches,
+    decimate_min_max,
+)
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_COALESCE = "coalesce"
+OVERFLOW_DISCONNECT = "disconnect"
+
+# Topics clients can subscribe to, one per message type
+TOPICS = (
+    "tilt",
+    "rotate",
+    "peristaltic",
+    "repetitions",
+    "rotate_movement",
+    "peristaltic_movement",
+    "motor_update",
+    "job",
+)
+
+# Opt-in binary measurement frames, negotiated with /ws/motor?format=binary
+MEASUREMENT_FRAME_VERSION = 1
+MEASUREMENT_STREAMS = {"tilt": 0, "rotate": 1, "peristaltic": 2}
+_FRAME_HEADER = struct.Struct("<BBHIiI")
+
+
+def encode_measurement_frames(stream: str, batch: MeasurementBatch) -> bytes:
+    """Pack a measurement batch into binary frames, one per entry id.
+
+    Frame layout (little-endian), repeated until the end of the message:
+
+    - header (16 bytes): uint8 version, uint8 stream (0 tilt, 1 rotate,
+      2 peristaltic), uint16 reserved, uint32 count, int32 entry_id,
+      uint32 reserved
+    - float64 time[count], seconds since the start of the run
+    - float32 value[count], angle, speed (rpm) or flow (mL/min)
+    - uint8 code[count], index into the state or direction names
+      (tilt: moving, idle, error; rotate/peristaltic: cw, ccw)
+    - zero padding to a multiple of 8 bytes
+
+    An empty batch has no frames and encodes to an empty message.
+    """
+    stream_code = MEASUREMENT_STREAMS[stream]
+    count = len(batch)
+    if count == 0:
+        return b""
+    bounds = (np.flatnonzero(np.diff(batch.entry_id)) + 1).tolist()
+    parts = []
+    for start, end in zip([0, *bounds], [*bounds, count]):
+        n = end - start
+        parts.append(
+            _FRAME_HEADER.pack(
+                MEASUREMENT_FRAME_VERSION,
+                stream_code,
+                0,
+                n,
+                int(batch.entry_id[start]),
+                0,
+            )
+        )
+        parts.append(batch.time[start:end].astype("<f8").tobytes())
+        parts.append(batch.value[start:end].astype("<f4").tobytes())
+        parts.append(batch.code[start:end].tobytes())
+        parts.append(bytes(-(_FRAME_HEADER.size + 13 * n) % 8))
+    return b"".join(parts)
+
+
+class _RecentHistory:
+    """Recent live samples of the running entry of one measurement topic.
+
+    Holds the batches broadcast during the last ``ws_history_seconds`` (at
+    most ``ws_history_max_samples`` samples) so clients that subscribe in the
+    middle of a run are sent the recent curve before the live stream.
+    """
+
+    def __init__(self):
+        self.entry_id: Optional[int] = None
+        self._batches: Deque[MeasurementBatch] = deque()
+        self._samples = 0
+
+    def __len__(self) -> int:
+        return self._samples
+
+    def add(self, batch: MeasurementBatch) -> None:
+        if settings.ws_history_seconds <= 0 or len(batch) == 0:
+            return
+        entry_id = int(batch.entry_id[-1])
+        if entry_id != self.entry_id:
+            # a new run started, the samples of the previous one are stale
+            self.clear()
+            self.entry_id = entry_id
+            batch = batch.take(batch.entry_id == entry_id)
+        self._batches.append(batch)
+        self._samples += len(batch)
+        start = batch.time[-1] - settings.ws_history_seconds
+        while len(self._batches) > 1 and (
+            self._batches[0].time[-1] < start
+            or self._samples > settings.ws_history_max_samples
+        ):
+            self._samples -= len(self._batches.popleft())
+
+    def snapshot(self) -> Optional[MeasurementBatch]:
+        if not self._batches:
+            return None
+        batch = concat_batches(self._batches)
+        start = batch.time[-1] - settings.ws_history_seconds
+        first = max(
+            int(np.searchsorted(batch.time, start)),
+            len(batch) - settings.ws_history_max_samples,
+        )
+        return batch.take(slice(first, None)) if first > 0 else batch
+
+    def clear(self) -> None:
+        self.entry_id = None
+        self._batches.clear()
+        self._samples = 0
+
+
+class _OutboundMessage:
+    """Queued message, serialised at most once per format and shared by clients."""
+
+    __slots__ = ("message", "_text", "_binary")
+
+    def __init__(self, message: Dict):
+        self.message = message
+        self._text = None
+        self._binary = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            data = self.message.get("data")
+            if isinstance(data, MeasurementBatch):
+                self._text = json.dumps({**self.message, "data": data.to_dicts()})
+            else:
+                self._text = json.dumps(self.message)
+        return self._text
+
+    @property
+    def binary(self) -> Optional[bytes]:
+        """Binary frames for measurement batches, None for other messages."""
+        data = self.message.get("data")
+        if not isinstance(data, MeasurementBatch):
+            return None
+        if self._binary is None:
+            self._binary = encode_measurement_frames(self.message["type"], data)
+        return self._binary
+
+    def merge(self, newer: "_OutboundMessage") -> Optional["_OutboundMessage"]:
+        """Combine two measurement batches of the same type, None if not possible."""
+        if self.message.get("type") != newer.message.get("type"):
+            return None
+        data, newer_data = self.message.get("data"), newer.message.get("data")
+        if isinstance(data, MeasurementBatch) and isinstance(
+            newer_data, MeasurementBatch
+        ):
+            return _OutboundMessage({**self.message, "data": data.concat(newer_data)})
+        if isinstance(data, list) and isinstance(newer_data, list):
+            return _OutboundMessage({**self.message, "data": data + newer_data})
+        return None
+
+
+class _ClientConnection:
+    """Bounded outbound queue and sender task of one WebSocket client."""
+
+    def __init__(self, websocket: WebSocket, manager: "WebSocketManager", binary: bool):
+        self.websocket = websocket
+        self.binary = binary
+        self.topics: Set[str] = set()
+        self._manager = manager
+        self._queue: Deque[_OutboundMessage] = deque()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._send_loop())
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def enqueue(self, item: _OutboundMessage) -> bool:
+        """Queue a message without waiting, False if the client must be evicted."""
+        if len(self._queue) >= settings.ws_send_queue_size:
+            policy = settings.ws_overflow_policy
+            if policy == OVERFLOW_DISCONNECT:
+                return False
+            merged = None
+            if policy == OVERFLOW_COALESCE:
+                merged = self._queue[-1].merge(item)
+            if merged is not None:
+                self._queue[-1] = merged
+                self.coalesced += 1
+                return True
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append(item)
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._wakeup.set()
+        return True
+
+    def close(self) -> None:
+        """Stop the sender task."""
+        self._task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the queue metrics of this client."""
+        return {
+            "topics": sorted(self.topics),
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+    async def _send_loop(self) -> None:
+        try:
+            while True:
+                while not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                item = self._queue.popleft()
+                payload = item.binary if self.binary else None
+                if payload is not None:
+                    send = self.websocket.send_bytes(payload)
+                else:
+                    send = self.websocket.send_text(item.text)
+                await asyncio.wait_for(send, timeout=settings.ws_send_timeout)
+                self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            print("WebSocket client stopped reading, disconnecting slow client")
+            self._manager._evict(self.websocket)
+        except Exception as e:
+            print(f"Error sending WebSocket message: {e}")
+            self._manager._evict(self.websocket)
 
 
 class WebSocketManager:
-    """Manages WebSocket connections and broadcasts motor updates."""
+    """Manages WebSocket connections and broadcasts motor updates.
+
+    Every client has a bounded outbound queue drained by its own sender task,
+    so broadcasting never waits for a client and a slow client only delays
+    (and eventually loses) its own messages.
+    """
 
     def __init__(self):
         """Initialize the WebSocket manager."""
-        self.active_connections: Set[WebSocket] = set()
-        self._lock = asyncio.Lock()
+        self.active_connections: Dict[WebSocket, _ClientConnection] = {}
+        self._subscribers: Dict[str, Set[WebSocket]] = {t: set() for t in TOPICS}
+        self._decimation: Dict[str, Dict[str, int]] = {}
+        # Kept samples of the last, still open display bucket of each topic
+        self._open_buckets: Dict[str, MeasurementBatch] = {}
+        self._history = {t: _RecentHistory() for t in MEASUREMENT_STREAMS}
+        self._evicted = 0
+        self._dropped_closed = 0
+        self._coalesced_closed = 0
 
     # ---------------------------------------------------------
     # Event loop binding (MANDATORY)
@@ -30,60 +283,223 @@ class WebSocketManager:
     # Connection handling
     # ---------------------------------------------------------
 
-    async def connect(self, websocket: WebSocket):
-        """Accept a new WebSocket connection."""
+    async def connect(
+        self,
+        websocket: WebSocket,
+        binary: bool = False,
+        topics: Optional[Iterable[str]] = None,
+    ):
+        """Accept a new WebSocket connection.
+
+        Args:
+            websocket: Connection to accept
+            binary: Send measurement batches as binary frames instead of JSON
+            topics: Topics to subscribe to, all topics when None
+        """
         await websocket.accept()
-        async with self._lock:
-            self.active_connections.add(websocket)
+        self.active_connections[websocket] = _ClientConnection(websocket, self, binary)
+        try:
+            self.subscribe(websocket, TOPICS if topics is None else topics)
+        except ValueError as e:
+            self._send_to(websocket, {"type": "error", "data": {"detail": str(e)}})
         print(f"WebSocket connected. Total connections: {len(self.active_connections)}")
 
     def disconnect(self, websocket: WebSocket):
-        """Remove a WebSocket connection."""
-
-        async def _disconnect():
-            async with self._lock:
-                if websocket in self.active_connections:
-                    self.active_connections.remove(websocket)
-            print(
-                f"WebSocket disconnected. Total connections: {len(self.active_connections)}"
-            )
+        """Remove a WebSocket connection (called from the event loop)."""
+        client = self.active_connections.pop(websocket, None)
+        if client is None:
+            return
+        for subscribers in self._subscribers.values():
+            subscribers.discard(websocket)
+        client.close()
+        self._dropped_closed += client.dropped
+        self._coalesced_closed += client.coalesced
+        print(
+            f"WebSocket disconnected. Total connections: {len(self.active_connections)}"
+        )
+
+    # ---------------------------------------------------------
+    # Topic subscriptions
+    # ---------------------------------------------------------
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """Subscribe a client to topics and return its current topics.
+
+        Newly subscribed measurement topics first get the recent samples of
+        the running entry, then the live stream.
+
+        Raises:
+            ValueError: If a topic is unknown (nothing is subscribed then)
+        """
+        client = self.active_connections[websocket]
+        topics = self._check_topics(topics)
+        for topic in topics:
+            if topic in client.topics:
+                continue
+            # Replay and subscription happen without yielding to the event
+            # loop, so every live batch is either in the replay or queued
+            # after it: no gap and no duplicate
+            history = self._history.get(topic)
+            replay = history.snapshot() if history is not None else None
+            if replay is not None and not client.enqueue(
+                _OutboundMessage({"type": topic, "data": replay})
+            ):
+                self._evict(websocket)
+                return []
+            self._subscribers[topic].add(websocket)
+            client.topics.add(topic)
+        return sorted(client.topics)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """Unsubscribe a client from topics and return its current topics.
+
+        Raises:
+            ValueError: If a topic is unknown (nothing is unsubscribed then)
+        """
+        client = self.active_connections[websocket]
+        topics = self._check_topics(topics)
+        for topic in topics:
+            self._subscribers[topic].discard(websocket)
+        client.topics.difference_update(topics)
+        return sorted(client.topics)
+
+    def _check_topics(self, topics: Iterable[str]) -> List[str]:
+        topics = list(topics)
+        unknown = [t for t in topics if t not in self._subscribers]
+        if unknown:
+            raise ValueError(f"Unknown topics: {unknown}. Available: {list(TOPICS)}")
+        return topics
+
+    def handle_message(self, websocket: WebSocket, text: str):
+        """Handle a control message received from a client.
 
-        # Schedule disconnect in event loop
+        Clients send ``{"action": "subscribe" | "unsubscribe", "topics": [...]}``
+        and get ``{"type": "subscriptions", "data": {"topics": [...]}}`` back, or
+        ``{"type": "error", ...}`` for malformed messages and unknown topics.
+        """
+        if websocket not in self.active_connections:
+            return
         try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                asyncio.create_task(_disconnect())
+            request = json.loads(text)
+            action = request.get("action")
+            topics = request.get("topics", [])
+            if isinstance(topics, str) or not isinstance(topics, list):
+                raise ValueError("topics must be a list")
+            if action == "subscribe":
+                current = self.subscribe(websocket, topics)
+            elif action == "unsubscribe":
+                current = self.unsubscribe(websocket, topics)
             else:
-                asyncio.run(_disconnect())
-        except RuntimeError:
-            # No event loop, try to get/create one
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(_disconnect())
-                loop.close()
-            except Exception as e:
-                print(f"Error disconnecting WebSocket: {e}")
+                raise ValueError(f"Unknown action: {action}")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self._send_to(websocket, {"type": "error", "data": {"detail": str(e)}})
+            return
+        self._send_to(websocket, {"type": "subscriptions", "data": {"topics": current}})
+
+    def _send_to(self, websocket: WebSocket, message: Dict):
+        client = self.active_connections.get(websocket)
+        if client is not None and not client.enqueue(_OutboundMessage(message)):
+            self._evict(websocket)
+
+    def _evict(self, websocket: WebSocket):
+        """Disconnect a client that cannot keep up or whose socket failed."""
+        if websocket not in self.active_connections:
+            return
+        self._evicted += 1
+        self.disconnect(websocket)
+        asyncio.create_task(self._close_quietly(websocket))
+
+    async def _close_quietly(self, websocket: WebSocket):
+        try:
+            await websocket.close()
+        except Exception:
+            pass
 
     async def broadcast(self, message: Dict):
-        """Broadcast a message to all connected clients."""
-        if not self.active_connections:
+        """Queue a message for the subscribers of its topic without waiting.
+
+        The topic is the message type; without subscribers the message is
+        dropped before it is serialised. Measurement batches are kept in the
+        recent history of their topic either way.
+        """
+        topic = message.get("type")
+        subscribers = self._subscribers.get(topic)
+        data = message.get("data")
+        if isinstance(data, MeasurementBatch):
+            if not subscribers and settings.ws_history_seconds <= 0:
+                self._open_buckets.pop(topic, None)
+                return
+            data = self._decimate(topic, data)
+            if len(data) == 0:
+                return
+            self._history[topic].add(data)
+            message = {**message, "data": data}
+        self._fan_out(subscribers, message)
+
+    def _fan_out(self, subscribers: Optional[Set[WebSocket]], message: Dict):
+        if not subscribers:
             return
+        item = _OutboundMessage(message)
+        for websocket in list(subscribers):
+            client = self.active_connections[websocket]
+            if not client.enqueue(item):
+                print("WebSocket send queue full, disconnecting slow client")
+                self._evict(websocket)
 
-        message_json = json.dumps(message)
-        disconnected = set()
+    def _decimate(self, topic: str, batch: MeasurementBatch) -> MeasurementBatch:
+        """Thin a live batch to the display rate of its topic (min/max kept).
 
-        async with self._lock:
-            for connection in self.active_connections:
-                try:
-                    await connection.send_text(message_json)
-                except Exception as e:
-                    print(f"Error sending WebSocket message: {e}")
-                    disconnected.add(connection)
+        Buckets span flushes: the samples of the last bucket are held back and
+        merged with the next batch, so a bucket is sent once it is closed by a
+        later bucket, a new entry or the end of the run.
+        """
+        counts = self._decimation.setdefault(topic, {"samples_in": 0, "samples_out": 0})
+        counts["samples_in"] += len(batch)
+        held = self._open_buckets.pop(topic, None)
+        if held is not None:
+            batch = held.concat(batch)
+        rate = settings.ws_display_rate_hz.get(topic, 0)
+        if rate > 0 and len(batch):
+            bucket_seconds = 1.0 / rate
+            batch = decimate_min_max(batch, bucket_seconds)
+            bucket = np.floor(batch.time / bucket_seconds)
+            closed_rows = np.flatnonzero(
+                (bucket != bucket[-1]) | (batch.entry_id != batch.entry_id[-1])
+            )
+            # Buckets are contiguous, the open one is the trailing run of rows
+            closed = int(closed_rows[-1]) + 1 if len(closed_rows) else 0
+            self._open_buckets[topic] = batch.take(slice(closed, None)).copy()
+            batch = batch.take(slice(None, closed))
+        counts["samples_out"] += len(batch)
+        return batch
+
+    async def _close_bucket(self, topic: str):
+        """Send the held back last bucket of a finished run."""
+        held = self._open_buckets.pop(topic, None)
+        if held is None:
+            return
+        self._decimation[topic]["samples_out"] += len(held)
+        self._history[topic].add(held)
+        self._fan_out(self._subscribers.get(topic), {"type": topic, "data": held})
 
-            # Remove disconnected connections
-            for connection in disconnected:
-                self.active_connections.discard(connection)
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth and drop metrics of the WebSocket fan-out."""
+        clients = [client.stats() for client in self.active_connections.values()]
+        return {
+            "connections": len(clients),
+            "queue_size": settings.ws_send_queue_size,
+            "overflow_policy": settings.ws_overflow_policy,
+            "evicted": self._evicted,
+            "subscribers": {t: len(s) for t, s in self._subscribers.items()},
+            "decimation": self._decimation,
+            "history": {
+                t: {"entry_id": h.entry_id, "samples": len(h)}
+                for t, h in self._history.items()
+            },
+            "dropped": self._dropped_closed + sum(c["dropped"] for c in clients),
+            "coalesced": self._coalesced_closed + sum(c["coalesced"] for c in clients),
+            "clients": clients,
+        }
 
     async def send_repetitions(self, repetitions: int):
         """Send repetitions to all connected clients."""
@@ -96,7 +512,7 @@ class WebSocketManager:
             }
         )
 
-    async def send_measurements(self, measurements: list[Dict[str, Any]]):
+    async def send_measurements(self, measurements: MeasurementBatch):
         """Send measurements to all connected clients."""
         await self.broadcast(
             {
@@ -105,7 +521,7 @@ class WebSocketManager:
             }
         )
 
-    async def send_rotate_measurements(self, measurements: list[Dict[str, Any]]):
+    async def send_rotate_measurements(self, measurements: MeasurementBatch):
         """Send a rotate measurement update to all connected clients."""
         await self.broadcast(
             {
@@ -114,7 +530,7 @@ class WebSocketManager:
             }
         )
 
-    async def send_peristaltic_measurements(self, measurements: list[Dict[str, Any]]):
+    async def send_peristaltic_measurements(self, measurements: MeasurementBatch):
         """Send peristaltic measurements to all connected clients."""
         await self.broadcast(
             {
@@ -147,8 +563,19 @@ class WebSocketManager:
             }
         )
 
+    async def send_job_update(self, job: Dict[str, Any]):
+        """Send the state of a background job to all connected clients."""
+        await self.broadcast(
+            {
+                "type": "job",
+                "data": job,
+            }
+        )
+
     async def send_tilt_stopped(self):
         """Send a measurement update to all connected clients."""
+        await self._close_bucket("tilt")
+        self._history["tilt"].clear()
         await self.broadcast(
             {
                 "type": "tilt",
@@ -160,6 +587,8 @@ class WebSocketManager:
 
     async def send_rotate_stopped(self):
         """Send a measurement update to all connected clients."""
+        await self._close_bucket("rotate")
+        self._history["rotate"].clear()
         await self.broadcast(
             {
                 "type": "rotate",
@@ -171,6 +600,8 @@ class WebSocketManager:
 
     async def send_peristaltic_stopped(self):
         """Send a peristaltic stopped update to all connected clients."""
+        await self._close_bucket("peristaltic")
+        self._history["peristaltic"].clear()
         await self.broadcast(
             {
                 "type": "peristaltic",
@@ -0,0 +1 @@
+"""Microbenchmarks for the backend, run from the backend directory."""
@@ -0,0 +1,110 @@
+"""Per-command CPU cost of building and parsing PoStep256 frames.
+
+Compares the previous list-based frame construction (``[0] * 64`` filled with
+``struct.pack`` slices, then copied into a ``bytearray``) and response parsing
+(``received[20:32]`` slices) with the preallocated frames in
+``app.api.postep256_usb_lib.frames``.
+
+Usage (from the backend directory)::
+
+    python -m benchmarks.frame_builder_benchmark
+"""
+
+import array
+import struct
+import timeit
+
+from app.api.postep256_usb_lib.frames import STREAM, CommandFrames
+
+ITERATIONS = 200000
+
+
+def legacy_speed_frame(speed, direction="cw"):
+    """Build a 0x90 frame the way PoStep256USB used to."""
+    data_list = [0] * 64
+    data_list[1] = 0x90
+    if speed != 0:
+        step_values = 480000 / speed
+    else:
+        step_values = 480000
+    data_list[20:24] = struct.pack("<I", int(step_values))
+    if direction == "ccw":
+        data_list[24] = 0x01
+    return bytearray(data_list)
+
+
+def legacy_trajectory_frame(final_position, max_speed, max_accel, max_decel):
+    """Build a 0xB1 frame the way PoStep256USB used to."""
+    data_list = [0] * 64
+    data_list[1] = 0xB1
+    data_list[2] = 0b00000000
+    data_list[20:24] = struct.pack("<i", final_position)
+    data_list[24:28] = struct.pack("<I", max_speed)
+    data_list[28:32] = struct.pack("<I", max_accel)
+    data_list[32:36] = struct.pack("<I", max_decel)
+    return bytearray(data_list)
+
+
+def legacy_parse_stream(received):
+    """Parse a stream frame the way PoStep256USB used to."""
+    status = {}
+    status["pos"], status["speed"], status["final"] = struct.unpack(
+        ">iii", received[20:32]
+    )
+    status["endswitch"] = bool((received[6] >> 6) & 0x01)
+    return status
+
+
+def parse_stream(received):
+    """Parse a stream frame the way PoStep256USB does now."""
+    pos, speed, final = STREAM.unpack_from(received, 20)
+    return {
+        "pos": pos,
+        "speed": speed,
+        "final": final,
+        "endswitch": bool((received[6] >> 6) & 0x01),
+    }
+
+
+def _report(name, legacy, current):
+    legacy_ns = legacy / ITERATIONS * 1e9
+    current_ns = current / ITERATIONS * 1e9
+    print(
+        f"{name:<24} before {legacy_ns:8.1f} ns  after {current_ns:8.1f} ns  "
+        f"speedup {legacy_ns / current_ns:4.1f}x"
+    )
+
+
+def main():
+    """Run the benchmark and print the per-command cost."""
+    frames = CommandFrames()
+    received = array.array("B", bytes(64))
+    struct.pack_into(">iii", received, 20, 1234, 56, 7890)
+
+    cases = [
+        (
+            "speed frame (0x90)",
+            lambda: legacy_speed_frame(1200, "ccw"),
+            lambda: frames.requested_speed(1200, "ccw"),
+        ),
+        (
+            "trajectory frame (0xB1)",
+            lambda: legacy_trajectory_frame(-4000, 20000, 20000, 5000),
+            lambda: frames.trajectory(-4000, 20000, 20000, 5000, None),
+        ),
+        (
+            "stream parse (0xA0)",
+            lambda: legacy_parse_stream(received),
+            lambda: parse_stream(received),
+        ),
+    ]
+    for name, legacy, current in cases:
+        _report(
+            name,
+            min(timeit.repeat(legacy, number=ITERATIONS, repeat=5)),
+            min(timeit.repeat(current, number=ITERATIONS, repeat=5)),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Measurement flush cost: ``executemany`` INSERT versus binary ``COPY``.
+
+Writes batches shaped like the motor handler queues into a scratch copy of
+``rotary_measurements`` (a hypertable when TimescaleDB is installed) and
+reports rows/s and per-flush latency for the previous ``executemany`` path
+and for ``app.database.database.copy_rows``. Needs the database configured
+in ``.env``; the scratch table is dropped afterwards.
+
+Usage (from the backend directory)::
+
+    python -m benchmarks.measurement_ingest_benchmark
+"""
+
+import statistics
+import time
+
+import psycopg
+from app.config import settings
+from app.database.database import copy_rows
+
+TABLE = "bench_rotary_measurements"
+BATCH_SIZES = (10, 100, 1000, 10000)
+FLUSHES = 20
+
+
+def make_batch(size, start_time):
+    """Build a batch of measurements the way the rotary handler queues them."""
+    return [
+        {
+            "entry_id": 1,
+            "speed": 10.0 + (i % 50) / 10,
+            "direction": "cw" if i % 2 else "ccw",
+            "time": start_time + i * 0.005,
+        }
+        for i in range(size)
+    ]
+
+
+def flush_executemany(conn, measurements):
+    """Insert a batch the way the rotary writer used to (executemany)."""
+    with conn.cursor() as cur:
+        cur.executemany(
+            f"""
+            INSERT INTO {TABLE}
+            (entry_id, speed, direction, time)
+            VALUES (%s, %s, %s, %s)
+        """,
+            [
+                (m["entry_id"], m["speed"], m["direction"], m["time"])
+                for m in measurements
+            ],
+        )
+    conn.commit()
+
+
+def flush_copy(conn, measurements):
+    """Insert a batch the way copy_rotary_measurements does now."""
+    with conn.cursor() as cur:
+        copy_rows(
+            cur,
+            TABLE,
+            ("entry_id", "speed", "direction", "time"),
+            ("int4", "float8", "text", "float8"),
+            (
+                (m["entry_id"], m["speed"], m["direction"], m["time"])
+                for m in measurements
+            ),
+        )
+    conn.commit()
+
+
+def setup(conn):
+    """Create the scratch table, as a hypertable if TimescaleDB is available."""
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cur.execute(
+            f"""
+            CREATE TABLE {TABLE} (
+                id SERIAL,
+                entry_id INTEGER NOT NULL,
+                speed FLOAT NOT NULL,
+                direction TEXT NOT NULL,
+                time FLOAT NOT NULL,
+                PRIMARY KEY (id, time)
+            )
+        """
+        )
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+        if cur.fetchone():
+            cur.execute(
+                f"SELECT create_hypertable('{TABLE}', 'time', "
+                "chunk_time_interval => 86400.0)"
+            )
+    conn.commit()
+
+
+def run(conn, flush, size):
+    """Time FLUSHES flushes of one batch size, return (rows/s, latencies)."""
+    latencies = []
+    start_time = 0.0
+    for _ in range(FLUSHES):
+        batch = make_batch(size, start_time)
+        start_time += size
+        t0 = time.perf_counter()
+        flush(conn, batch)
+        latencies.append(time.perf_counter() - t0)
+    return size * FLUSHES / sum(latencies), latencies
+
+
+def main():
+    """Run the benchmark and print rows/s and flush latency per batch size."""
+    with psycopg.connect(settings.database_url) as conn:
+        setup(conn)
+        try:
+            for size in BATCH_SIZES:
+                for name, flush in (
+                    ("executemany", flush_executemany),
+                    ("copy binary", flush_copy),
+                ):
+                    rate, latencies = run(conn, flush, size)
+                    latencies.sort()
+                    print(
+                        f"{size:>6} rows  {name:<12} {rate:>10.0f} rows/s  "
+                        f"median {statistics.median(latencies) * 1e3:7.2f} ms  "
+                        f"max {latencies[-1] * 1e3:7.2f} ms"
+                    )
+        finally:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            conn.commit()
+
+
+if __name__ == "__main__":
+    main()
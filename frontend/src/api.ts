@@ -108,6 +108,7 @@ export interface PeristalticRotateRequest {
   calibration_name: string
   calibration_preset: boolean
   movements: PeristalticMovement[]
+  compression?: CompressionPolicy
 }
 
 export interface MoveScenario {
@@ -137,12 +138,14 @@ export interface RunConfiguration {
   standstill_duration_left: number | null
   standstill_duration_horizontal: number | null
   standstill_duration_right: number | null
+  compression?: CompressionPolicy
 }
 
 export interface RotationConfiguration {
   name: string
   scenario_id: number | null
   movements: Movement[]
+  compression?: CompressionPolicy
 }
 
 export interface PeristalticConfiguration {
@@ -162,6 +165,53 @@ export interface MotorStatus {
 export interface ApiResponse {
   success: boolean
   message: string
+  job_id?: string
+}
+
+export interface CompressionPolicy {
+  mode: 'none' | 'deadband' | 'change_only' | 'swinging_door'
+  deviation?: number
+  heartbeat?: number
+}
+
+// Time window (seconds of the run) and target point count of a measurement query
+export interface MeasurementWindow {
+  start?: number
+  end?: number
+  points?: number
+}
+
+export type MotorState =
+  | 'idle'
+  | 'starting'
+  | 'running'
+  | 'pausing'
+  | 'paused'
+  | 'stopping'
+
+export interface Job {
+  id: string
+  kind: string
+  resource: string
+  status: 'pending' | 'running' | 'succeeded' | 'failed' | 'cancelled'
+  progress: number
+  message: string
+  result: any
+  error: string | null
+  created_at: number
+  started_at: number | null
+  finished_at: number | null
+}
+
+export interface MeasurementBacklog {
+  rows_in_memory: number
+  rows_on_disk: number
+  bytes_on_disk: number
+  segments: number
+  oldest_age: number | null
+  spilled_rows: number
+  replayed_rows: number
+  last_error: string | null
 }
 
 export interface EntryResponse {
@@ -245,11 +295,15 @@ export const tiltMotorApi = {
   },
 
   // Get tilt measurements (entryId is required)
-  async getMeasurements(entryId: string, scenarioId?: string, limit: number = 1000): Promise<TiltMeasurement[]> {
+  async getMeasurements(entryId: string, scenarioId?: string, limit: number = 1000, interval?: number, window?: MeasurementWindow): Promise<TiltMeasurement[]> {
     const params = new URLSearchParams()
     params.append('entry_id', entryId)
     if (scenarioId) params.append('tilt_scenario_id', scenarioId)
     params.append('limit', limit.toString())
+    if (interval) params.append('interval', interval.toString())
+    if (window?.start !== undefined) params.append('start', window.start.toString())
+    if (window?.end !== undefined) params.append('end', window.end.toString())
+    if (window?.points) params.append('points', window.points.toString())
     const response = await api.get<TiltMeasurement[]>(`/tilt/measurements?${params.toString()}`)
     return response.data
   },
@@ -265,6 +319,12 @@ export const tiltMotorApi = {
     const response = await api.get<ApiResponse>('/tilt/move-home')
     return response.data
   },
+
+  // Archive a finished entry (background job), optionally dropping its rows from the database
+  async archiveEntry(entryId: string, drop: boolean = false): Promise<ApiResponse & { job_id: string }> {
+    const response = await api.post<ApiResponse & { job_id: string }>(`/tilt/entries/${entryId}/archive?drop=${drop}`)
+    return response.data
+  },
 }
 
 export const rotaryMotorApi = {
@@ -323,11 +383,15 @@ export const rotaryMotorApi = {
     return response.data
   },
 
-  async getMeasurements(entryId: string, rotary_scenario_id?: string, limit: number = 1000): Promise<any[]> {
+  async getMeasurements(entryId: string, rotary_scenario_id?: string, limit: number = 1000, interval?: number, window?: MeasurementWindow): Promise<any[]> {
     const params = new URLSearchParams()
     params.append('entry_id', entryId.toString())
     if (rotary_scenario_id) params.append('rotary_scenario_id', rotary_scenario_id.toString())
     params.append('limit', limit.toString())
+    if (interval) params.append('interval', interval.toString())
+    if (window?.start !== undefined) params.append('start', window.start.toString())
+    if (window?.end !== undefined) params.append('end', window.end.toString())
+    if (window?.points) params.append('points', window.points.toString())
     const response = await api.get<any[]>(`/rotate/measurements?${params.toString()}`)
     return response.data
   },
@@ -336,6 +400,12 @@ export const rotaryMotorApi = {
     const response = await api.get<EntryResponse[]>('/rotate/entries')
     return response.data
   },
+
+  // Archive a finished entry (background job), optionally dropping its rows from the database
+  async archiveEntry(entryId: string, drop: boolean = false): Promise<ApiResponse & { job_id: string }> {
+    const response = await api.post<ApiResponse & { job_id: string }>(`/rotate/entries/${entryId}/archive?drop=${drop}`)
+    return response.data
+  },
 }
 
 export const peristalticMotorApi = {
@@ -411,11 +481,15 @@ export const peristalticMotorApi = {
     const response = await api.delete<ApiResponse>(`/peristaltic/peristaltic-scenario/${scenarioId}`)
     return response.data
   },
-  async getMeasurements(entryId: string, peristaltic_scenario_id?: string, limit: number = 1000): Promise<any[]> {
+  async getMeasurements(entryId: string, peristaltic_scenario_id?: string, limit: number = 1000, interval?: number, window?: MeasurementWindow): Promise<any[]> {
     const params = new URLSearchParams()
     params.append('entry_id', entryId.toString())
     if (peristaltic_scenario_id) params.append('peristaltic_scenario_id', peristaltic_scenario_id.toString())
     params.append('limit', limit.toString())
+    if (interval) params.append('interval', interval.toString())
+    if (window?.start !== undefined) params.append('start', window.start.toString())
+    if (window?.end !== undefined) params.append('end', window.end.toString())
+    if (window?.points) params.append('points', window.points.toString())
     const response = await api.get<any[]>(`/peristaltic/measurements?${params.toString()}`)
     return response.data
   },
@@ -423,6 +497,12 @@ export const peristalticMotorApi = {
     const response = await api.get<EntryResponse[]>('/peristaltic/entries')
     return response.data
   },
+
+  // Archive a finished entry (background job), optionally dropping its rows from the database
+  async archiveEntry(entryId: string, drop: boolean = false): Promise<ApiResponse & { job_id: string }> {
+    const response = await api.post<ApiResponse & { job_id: string }>(`/peristaltic/entries/${entryId}/archive?drop=${drop}`)
+    return response.data
+  },
 }
 
 export const generalApi = {
@@ -431,6 +511,7 @@ export const generalApi = {
       status: string;
       is_moving: boolean;
       movement_type: string | null;
+      state?: MotorState;
       position: number;
       initialized: boolean;
     };
@@ -438,6 +519,7 @@ export const generalApi = {
       status: string;
       is_moving: boolean;
       movement_type: string | null;
+      state?: MotorState;
       position: number;
       initialized: boolean;
     };
@@ -445,6 +527,7 @@ export const generalApi = {
       status: string;
       is_moving: boolean;
       movement_type: string | null;
+      state?: MotorState;
       position: number;
       initialized: boolean;
     };
@@ -452,6 +535,12 @@ export const generalApi = {
     const response = await api.get('/api/status');
     return response.data;
   },
+
+  // Measurements waiting for the database, by motor
+  async getMeasurementBacklog(): Promise<Record<string, MeasurementBacklog>> {
+    const response = await api.get('/api/measurements/backlog');
+    return response.data;
+  },
 };
 
 export const authApi = {
@@ -483,3 +572,18 @@ export const authApi = {
 }
 
 export default api
+
+export const jobsApi = {
+  async getJobs(): Promise<Job[]> {
+    const response = await api.get<Job[]>('/api/jobs')
+    return response.data
+  },
+  async getJob(jobId: string): Promise<Job> {
+    const response = await api.get<Job>(`/api/jobs/${jobId}`)
+    return response.data
+  },
+  async cancelJob(jobId: string): Promise<Job> {
+    const response = await api.post<Job>(`/api/jobs/${jobId}/cancel`)
+    return response.data
+  },
+}
@@ -0,0 +1,43 @@
+// Decoder for the binary measurement frames sent on /ws/motor?format=binary
+// (layout documented in backend/app/websocket_manager.py)
+
+const HEADER_SIZE = 16
+
+export const MEASUREMENT_STREAMS = ['tilt', 'rotate', 'peristaltic'] as const
+
+export const MEASUREMENT_CODES: Record<string, readonly string[]> = {
+  tilt: ['moving', 'idle', 'error'],
+  rotate: ['cw', 'ccw'],
+  peristaltic: ['cw', 'ccw'],
+}
+
+export interface MeasurementFrame {
+  stream: string
+  entryId: number
+  time: Float64Array
+  value: Float32Array
+  code: Uint8Array
+}
+
+export function decodeMeasurementFrames(buffer: ArrayBuffer): MeasurementFrame[] {
+  const view = new DataView(buffer)
+  const frames: MeasurementFrame[] = []
+  let offset = 0
+  while (offset + HEADER_SIZE <= buffer.byteLength) {
+    const stream = MEASUREMENT_STREAMS[view.getUint8(offset + 1)]
+    const count = view.getUint32(offset + 4, true)
+    const entryId = view.getInt32(offset + 8, true)
+    const start = offset + HEADER_SIZE
+    // Typed array views are zero-copy; the frame layout keeps them aligned
+    frames.push({
+      stream,
+      entryId,
+      time: new Float64Array(buffer, start, count),
+      value: new Float32Array(buffer, start + 8 * count, count),
+      code: new Uint8Array(buffer, start + 12 * count, count),
+    })
+    const length = HEADER_SIZE + 13 * count
+    offset += length + ((8 - (length % 8)) % 8)
+  }
+  return frames
+}
@@ -0,0 +1,375 @@
+-- Compression policy of the stored measurements of an entry
+ALTER TABLE tilt_entry_table ADD COLUMN IF NOT EXISTS compression JSONB DEFAULT NULL;
+ALTER TABLE rotation_entry_table ADD COLUMN IF NOT EXISTS compression JSONB DEFAULT NULL;
+ALTER TABLE peristaltic_entry_table ADD COLUMN IF NOT EXISTS compression JSONB DEFAULT NULL;
+
+-- Rebuild the measurement hypertables on absolute time (recorded_at), rows
+-- get the start of their entry plus their seconds since run start
+DO $$
+BEGIN
+	IF NOT EXISTS (
+		SELECT 1 FROM information_schema.columns
+		WHERE table_name = 'tilt_measurements' AND column_name = 'recorded_at'
+	) THEN
+		ALTER TABLE tilt_measurements RENAME TO tilt_measurements_old;
+		CREATE TABLE tilt_measurements (
+			id SERIAL,
+			entry_id INTEGER NOT NULL,
+			angle FLOAT NOT NULL,
+			state TEXT CHECK (state IN ('moving', 'idle', 'error')) NOT NULL,
+			time float NOT NULL,
+			recorded_at TIMESTAMPTZ NOT NULL
+		);
+		PERFORM create_hypertable('tilt_measurements', 'recorded_at', chunk_time_interval => INTERVAL '1 day');
+		INSERT INTO tilt_measurements (id, entry_id, angle, state, time, recorded_at)
+		SELECT m.id, m.entry_id, m.angle, m.state, m.time,
+			e.measurement_timestamp + m.time * INTERVAL '1 second'
+		FROM tilt_measurements_old m
+		JOIN tilt_entry_table e ON e.id = m.entry_id;
+		PERFORM setval(
+			pg_get_serial_sequence('tilt_measurements', 'id'),
+			(SELECT coalesce(max(id), 0) + 1 FROM tilt_measurements),
+			false
+		);
+		DROP TABLE tilt_measurements_old;
+		ALTER TABLE tilt_measurements ADD CONSTRAINT fk_entry_id FOREIGN KEY (entry_id) REFERENCES tilt_entry_table(id);
+	END IF;
+END $$;
+
+DO $$
+BEGIN
+	IF NOT EXISTS (
+		SELECT 1 FROM information_schema.columns
+		WHERE table_name = 'rotary_measurements' AND column_name = 'recorded_at'
+	) THEN
+		ALTER TABLE rotary_measurements RENAME TO rotary_measurements_old;
+		CREATE TABLE rotary_measurements (
+			id SERIAL,
+			entry_id INTEGER NOT NULL,
+			speed FLOAT NOT NULL,
+			direction TEXT CHECK (direction IN ('cw', 'ccw')) NOT NULL,
+			time float NOT NULL,
+			recorded_at TIMESTAMPTZ NOT NULL
+		);
+		PERFORM create_hypertable('rotary_measurements', 'recorded_at', chunk_time_interval => INTERVAL '1 day');
+		INSERT INTO rotary_measurements (id, entry_id, speed, direction, time, recorded_at)
+		SELECT m.id, m.entry_id, m.speed, m.direction, m.time,
+			e.measurement_timestamp + m.time * INTERVAL '1 second'
+		FROM rotary_measurements_old m
+		JOIN rotation_entry_table e ON e.id = m.entry_id;
+		PERFORM setval(
+			pg_get_serial_sequence('rotary_measurements', 'id'),
+			(SELECT coalesce(max(id), 0) + 1 FROM rotary_measurements),
+			false
+		);
+		DROP TABLE rotary_measurements_old;
+		ALTER TABLE rotary_measurements ADD CONSTRAINT fk_entry_id FOREIGN KEY (entry_id) REFERENCES rotation_entry_table(id);
+	END IF;
+END $$;
+
+DO $$
+BEGIN
+	IF NOT EXISTS (
+		SELECT 1 FROM information_schema.columns
+		WHERE table_name = 'peristaltic_measurements' AND column_name = 'recorded_at'
+	) THEN
+		ALTER TABLE peristaltic_measurements RENAME TO peristaltic_measurements_old;
+		CREATE TABLE peristaltic_measurements (
+			id SERIAL,
+			entry_id INTEGER NOT NULL,
+			flow FLOAT NOT NULL,
+			direction TEXT CHECK (direction IN ('cw', 'ccw')) NOT NULL,
+			time float NOT NULL,
+			recorded_at TIMESTAMPTZ NOT NULL
+		);
+		PERFORM create_hypertable('peristaltic_measurements', 'recorded_at', chunk_time_interval => INTERVAL '1 day');
+		INSERT INTO peristaltic_measurements (id, entry_id, flow, direction, time, recorded_at)
+		SELECT m.id, m.entry_id, m.flow, m.direction, m.time,
+			e.measurement_timestamp + m.time * INTERVAL '1 second'
+		FROM peristaltic_measurements_old m
+		JOIN peristaltic_entry_table e ON e.id = m.entry_id;
+		PERFORM setval(
+			pg_get_serial_sequence('peristaltic_measurements', 'id'),
+			(SELECT coalesce(max(id), 0) + 1 FROM peristaltic_measurements),
+			false
+		);
+		DROP TABLE peristaltic_measurements_old;
+		ALTER TABLE peristaltic_measurements ADD CONSTRAINT fk_entry_id FOREIGN KEY (entry_id) REFERENCES peristaltic_entry_table(id);
+	END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS tilt_measurements_entry_time_idx ON tilt_measurements (entry_id, time);
+CREATE INDEX IF NOT EXISTS rotary_measurements_entry_time_idx ON rotary_measurements (entry_id, time);
+CREATE INDEX IF NOT EXISTS peristaltic_measurements_entry_time_idx ON peristaltic_measurements (entry_id, time);
+
+-- Native compression, one segment per entry. The compression and retention
+-- policies are set by the backend at startup (MEASUREMENT_COMPRESS_AFTER,
+-- MEASUREMENT_RETENTION)
+ALTER TABLE tilt_measurements SET (
+	timescaledb.compress,
+	timescaledb.compress_segmentby = 'entry_id',
+	timescaledb.compress_orderby = 'recorded_at'
+);
+ALTER TABLE rotary_measurements SET (
+	timescaledb.compress,
+	timescaledb.compress_segmentby = 'entry_id',
+	timescaledb.compress_orderby = 'recorded_at'
+);
+ALTER TABLE peristaltic_measurements SET (
+	timescaledb.compress,
+	timescaledb.compress_segmentby = 'entry_id',
+	timescaledb.compress_orderby = 'recorded_at'
+);
+
+-- Aggregates created before the per-bucket minimum and maximum were added
+-- are rebuilt; buckets whose raw chunks were already dropped are lost
+DO $$
+DECLARE
+	view_name TEXT;
+BEGIN
+	FOREACH view_name IN ARRAY ARRAY[
+		'tilt_measurements_1s', 'tilt_measurements_1m', 'tilt_measurements_1h',
+		'rotary_measurements_1s', 'rotary_measurements_1m', 'rotary_measurements_1h',
+		'peristaltic_measurements_1s', 'peristaltic_measurements_1m', 'peristaltic_measurements_1h'
+	] LOOP
+		IF EXISTS (
+			SELECT 1 FROM information_schema.columns
+			WHERE table_name = view_name AND column_name = 'time'
+		) AND NOT EXISTS (
+			SELECT 1 FROM information_schema.columns
+			WHERE table_name = view_name AND column_name = 'min_value'
+		) THEN
+			EXECUTE format('DROP MATERIALIZED VIEW %I CASCADE', view_name);
+		END IF;
+	END LOOP;
+END $$;
+
+-- Continuous aggregates for long windows, picked by the /measurements
+-- endpoints from the requested point spacing. Raw retention must be longer
+-- than the largest start_offset (3 days) or refreshes empty the aggregates
+CREATE MATERIALIZED VIEW IF NOT EXISTS tilt_measurements_1s
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 second', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(angle) AS angle,
+	min(angle) AS min_value,
+	first(time, angle) AS min_time,
+	first(id, angle) AS min_id,
+	max(angle) AS max_value,
+	last(time, angle) AS max_time,
+	last(id, angle) AS max_id,
+	last(state, recorded_at) AS state,
+	count(*) AS samples
+FROM tilt_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('tilt_measurements_1s',
+	start_offset => INTERVAL '1 hour',
+	end_offset => INTERVAL '1 second',
+	schedule_interval => INTERVAL '1 minute',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS tilt_measurements_1m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 minute', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(angle) AS angle,
+	min(angle) AS min_value,
+	first(time, angle) AS min_time,
+	first(id, angle) AS min_id,
+	max(angle) AS max_value,
+	last(time, angle) AS max_time,
+	last(id, angle) AS max_id,
+	last(state, recorded_at) AS state,
+	count(*) AS samples
+FROM tilt_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('tilt_measurements_1m',
+	start_offset => INTERVAL '1 day',
+	end_offset => INTERVAL '1 minute',
+	schedule_interval => INTERVAL '5 minutes',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS tilt_measurements_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 hour', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(angle) AS angle,
+	min(angle) AS min_value,
+	first(time, angle) AS min_time,
+	first(id, angle) AS min_id,
+	max(angle) AS max_value,
+	last(time, angle) AS max_time,
+	last(id, angle) AS max_id,
+	last(state, recorded_at) AS state,
+	count(*) AS samples
+FROM tilt_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('tilt_measurements_1h',
+	start_offset => INTERVAL '3 days',
+	end_offset => INTERVAL '1 hour',
+	schedule_interval => INTERVAL '1 hour',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS rotary_measurements_1s
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 second', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(speed) AS speed,
+	min(speed) AS min_value,
+	first(time, speed) AS min_time,
+	first(id, speed) AS min_id,
+	max(speed) AS max_value,
+	last(time, speed) AS max_time,
+	last(id, speed) AS max_id,
+	last(direction, recorded_at) AS direction,
+	count(*) AS samples
+FROM rotary_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('rotary_measurements_1s',
+	start_offset => INTERVAL '1 hour',
+	end_offset => INTERVAL '1 second',
+	schedule_interval => INTERVAL '1 minute',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS rotary_measurements_1m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 minute', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(speed) AS speed,
+	min(speed) AS min_value,
+	first(time, speed) AS min_time,
+	first(id, speed) AS min_id,
+	max(speed) AS max_value,
+	last(time, speed) AS max_time,
+	last(id, speed) AS max_id,
+	last(direction, recorded_at) AS direction,
+	count(*) AS samples
+FROM rotary_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('rotary_measurements_1m',
+	start_offset => INTERVAL '1 day',
+	end_offset => INTERVAL '1 minute',
+	schedule_interval => INTERVAL '5 minutes',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS rotary_measurements_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 hour', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(speed) AS speed,
+	min(speed) AS min_value,
+	first(time, speed) AS min_time,
+	first(id, speed) AS min_id,
+	max(speed) AS max_value,
+	last(time, speed) AS max_time,
+	last(id, speed) AS max_id,
+	last(direction, recorded_at) AS direction,
+	count(*) AS samples
+FROM rotary_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('rotary_measurements_1h',
+	start_offset => INTERVAL '3 days',
+	end_offset => INTERVAL '1 hour',
+	schedule_interval => INTERVAL '1 hour',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS peristaltic_measurements_1s
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 second', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(flow) AS flow,
+	min(flow) AS min_value,
+	first(time, flow) AS min_time,
+	first(id, flow) AS min_id,
+	max(flow) AS max_value,
+	last(time, flow) AS max_time,
+	last(id, flow) AS max_id,
+	last(direction, recorded_at) AS direction,
+	count(*) AS samples
+FROM peristaltic_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('peristaltic_measurements_1s',
+	start_offset => INTERVAL '1 hour',
+	end_offset => INTERVAL '1 second',
+	schedule_interval => INTERVAL '1 minute',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS peristaltic_measurements_1m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 minute', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(flow) AS flow,
+	min(flow) AS min_value,
+	first(time, flow) AS min_time,
+	first(id, flow) AS min_id,
+	max(flow) AS max_value,
+	last(time, flow) AS max_time,
+	last(id, flow) AS max_id,
+	last(direction, recorded_at) AS direction,
+	count(*) AS samples
+FROM peristaltic_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('peristaltic_measurements_1m',
+	start_offset => INTERVAL '1 day',
+	end_offset => INTERVAL '1 minute',
+	schedule_interval => INTERVAL '5 minutes',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS peristaltic_measurements_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 hour', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(flow) AS flow,
+	min(flow) AS min_value,
+	first(time, flow) AS min_time,
+	first(id, flow) AS min_id,
+	max(flow) AS max_value,
+	last(time, flow) AS max_time,
+	last(id, flow) AS max_id,
+	last(direction, recorded_at) AS direction,
+	count(*) AS samples
+FROM peristaltic_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('peristaltic_measurements_1h',
+	start_offset => INTERVAL '3 days',
+	end_offset => INTERVAL '1 hour',
+	schedule_interval => INTERVAL '1 hour',
+	if_not_exists => TRUE);
+
+-- Materialize the history of rebuilt aggregates (cheap for current ones)
+CALL refresh_continuous_aggregate('tilt_measurements_1s', NULL, NULL);
+CALL refresh_continuous_aggregate('tilt_measurements_1m', NULL, NULL);
+CALL refresh_continuous_aggregate('tilt_measurements_1h', NULL, NULL);
+CALL refresh_continuous_aggregate('rotary_measurements_1s', NULL, NULL);
+CALL refresh_continuous_aggregate('rotary_measurements_1m', NULL, NULL);
+CALL refresh_continuous_aggregate('rotary_measurements_1h', NULL, NULL);
+CALL refresh_continuous_aggregate('peristaltic_measurements_1s', NULL, NULL);
+CALL refresh_continuous_aggregate('peristaltic_measurements_1m', NULL, NULL);
+CALL refresh_continuous_aggregate('peristaltic_measurements_1h', NULL, NULL);
@@ -3,7 +3,8 @@ CREATE TABLE IF NOT EXISTS tilt_entry_table (
 	tilt_scenario_id INTEGER DEFAULT NULL,
 	scenario_name VARCHAR(255) DEFAULT NULL,
 	name VARCHAR(255) NOT NULL,
-	measurement_timestamp TIMESTAMPTZ NOT NULL
+	measurement_timestamp TIMESTAMPTZ NOT NULL,
+	compression JSONB DEFAULT NULL
 );
 
 CREATE TABLE IF NOT EXISTS rotation_entry_table (
@@ -11,7 +12,8 @@ CREATE TABLE IF NOT EXISTS rotation_entry_table (
 	rotary_scenario_id INTEGER DEFAULT NULL,
 	scenario_name VARCHAR(255) DEFAULT NULL,
 	name VARCHAR(255) NOT NULL,
-	measurement_timestamp TIMESTAMPTZ NOT NULL
+	measurement_timestamp TIMESTAMPTZ NOT NULL,
+	compression JSONB DEFAULT NULL
 );
 
 CREATE TABLE IF NOT EXISTS peristaltic_entry_table (
@@ -19,7 +21,8 @@ CREATE TABLE IF NOT EXISTS peristaltic_entry_table (
 	peristaltic_scenario_id INTEGER DEFAULT NULL,
 	scenario_name VARCHAR(255) DEFAULT NULL,
 	name VARCHAR(255) NOT NULL,
-	measurement_timestamp TIMESTAMPTZ NOT NULL
+	measurement_timestamp TIMESTAMPTZ NOT NULL,
+	compression JSONB DEFAULT NULL
 );
 
 CREATE TABLE IF NOT EXISTS tilt_scenarios (
@@ -58,7 +61,7 @@ CREATE TABLE IF NOT EXISTS tilt_measurements (
 	angle FLOAT NOT NULL,
 	state TEXT CHECK (state IN ('moving', 'idle', 'error')) NOT NULL,
 	time float NOT NULL,
-	PRIMARY KEY (id, time)
+	recorded_at TIMESTAMPTZ NOT NULL
 );
 
 CREATE TABLE IF NOT EXISTS peristaltic_measurements (
@@ -67,7 +70,7 @@ CREATE TABLE IF NOT EXISTS peristaltic_measurements (
 	flow FLOAT NOT NULL,
 	direction TEXT CHECK (direction IN ('cw', 'ccw')) NOT NULL,
 	time float NOT NULL,
-	PRIMARY KEY (id, time)
+	recorded_at TIMESTAMPTZ NOT NULL
 );
 
 CREATE TABLE IF NOT EXISTS rotary_measurements (
@@ -76,7 +79,7 @@ CREATE TABLE IF NOT EXISTS rotary_measurements (
 	speed FLOAT NOT NULL,
 	direction TEXT CHECK (direction IN ('cw', 'ccw')) NOT NULL,
 	time float NOT NULL,
-	PRIMARY KEY (id, time)
+	recorded_at TIMESTAMPTZ NOT NULL
 );
 
 CREATE TABLE IF NOT EXISTS peristaltic_calibrations (
@@ -134,6 +137,250 @@ ALTER TABLE peristaltic_entry_table ADD CONSTRAINT fk_entry_id FOREIGN KEY (entr
 ALTER TABLE peristaltic_scenarios DROP CONSTRAINT IF EXISTS unique_scenario_name;
 ALTER TABLE peristaltic_scenarios ADD CONSTRAINT unique_scenario_name UNIQUE (name);
 
-SELECT create_hypertable('tilt_measurements', 'time', if_not_exists => TRUE);
-SELECT create_hypertable('rotary_measurements', 'time', if_not_exists => TRUE);
-SELECT create_hypertable('peristaltic_measurements', 'time', if_not_exists => TRUE);
+-- Measurements are partitioned by absolute time (recorded_at); time stays the
+-- seconds since run start the API works with
+SELECT create_hypertable('tilt_measurements', 'recorded_at', chunk_time_interval => INTERVAL '1 day', if_not_exists => TRUE);
+SELECT create_hypertable('rotary_measurements', 'recorded_at', chunk_time_interval => INTERVAL '1 day', if_not_exists => TRUE);
+SELECT create_hypertable('peristaltic_measurements', 'recorded_at', chunk_time_interval => INTERVAL '1 day', if_not_exists => TRUE);
+
+CREATE INDEX IF NOT EXISTS tilt_measurements_entry_time_idx ON tilt_measurements (entry_id, time);
+CREATE INDEX IF NOT EXISTS rotary_measurements_entry_time_idx ON rotary_measurements (entry_id, time);
+CREATE INDEX IF NOT EXISTS peristaltic_measurements_entry_time_idx ON peristaltic_measurements (entry_id, time);
+
+-- Native compression, one segment per entry. The compression and retention
+-- policies are set by the backend at startup (MEASUREMENT_COMPRESS_AFTER,
+-- MEASUREMENT_RETENTION)
+ALTER TABLE tilt_measurements SET (
+	timescaledb.compress,
+	timescaledb.compress_segmentby = 'entry_id',
+	timescaledb.compress_orderby = 'recorded_at'
+);
+ALTER TABLE rotary_measurements SET (
+	timescaledb.compress,
+	timescaledb.compress_segmentby = 'entry_id',
+	timescaledb.compress_orderby = 'recorded_at'
+);
+ALTER TABLE peristaltic_measurements SET (
+	timescaledb.compress,
+	timescaledb.compress_segmentby = 'entry_id',
+	timescaledb.compress_orderby = 'recorded_at'
+);
+
+-- Continuous aggregates for long windows, picked by the /measurements
+-- endpoints from the requested point spacing. Raw retention must be longer
+-- than the largest start_offset (3 days) or refreshes empty the aggregates
+CREATE MATERIALIZED VIEW IF NOT EXISTS tilt_measurements_1s
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 second', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(angle) AS angle,
+	min(angle) AS min_value,
+	first(time, angle) AS min_time,
+	first(id, angle) AS min_id,
+	max(angle) AS max_value,
+	last(time, angle) AS max_time,
+	last(id, angle) AS max_id,
+	last(state, recorded_at) AS state,
+	count(*) AS samples
+FROM tilt_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('tilt_measurements_1s',
+	start_offset => INTERVAL '1 hour',
+	end_offset => INTERVAL '1 second',
+	schedule_interval => INTERVAL '1 minute',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS tilt_measurements_1m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 minute', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(angle) AS angle,
+	min(angle) AS min_value,
+	first(time, angle) AS min_time,
+	first(id, angle) AS min_id,
+	max(angle) AS max_value,
+	last(time, angle) AS max_time,
+	last(id, angle) AS max_id,
+	last(state, recorded_at) AS state,
+	count(*) AS samples
+FROM tilt_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('tilt_measurements_1m',
+	start_offset => INTERVAL '1 day',
+	end_offset => INTERVAL '1 minute',
+	schedule_interval => INTERVAL '5 minutes',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS tilt_measurements_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 hour', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(angle) AS angle,
+	min(angle) AS min_value,
+	first(time, angle) AS min_time,
+	first(id, angle) AS min_id,
+	max(angle) AS max_value,
+	last(time, angle) AS max_time,
+	last(id, angle) AS max_id,
+	last(state, recorded_at) AS state,
+	count(*) AS samples
+FROM tilt_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('tilt_measurements_1h',
+	start_offset => INTERVAL '3 days',
+	end_offset => INTERVAL '1 hour',
+	schedule_interval => INTERVAL '1 hour',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS rotary_measurements_1s
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 second', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(speed) AS speed,
+	min(speed) AS min_value,
+	first(time, speed) AS min_time,
+	first(id, speed) AS min_id,
+	max(speed) AS max_value,
+	last(time, speed) AS max_time,
+	last(id, speed) AS max_id,
+	last(direction, recorded_at) AS direction,
+	count(*) AS samples
+FROM rotary_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('rotary_measurements_1s',
+	start_offset => INTERVAL '1 hour',
+	end_offset => INTERVAL '1 second',
+	schedule_interval => INTERVAL '1 minute',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS rotary_measurements_1m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 minute', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(speed) AS speed,
+	min(speed) AS min_value,
+	first(time, speed) AS min_time,
+	first(id, speed) AS min_id,
+	max(speed) AS max_value,
+	last(time, speed) AS max_time,
+	last(id, speed) AS max_id,
+	last(direction, recorded_at) AS direction,
+	count(*) AS samples
+FROM rotary_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('rotary_measurements_1m',
+	start_offset => INTERVAL '1 day',
+	end_offset => INTERVAL '1 minute',
+	schedule_interval => INTERVAL '5 minutes',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS rotary_measurements_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 hour', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(speed) AS speed,
+	min(speed) AS min_value,
+	first(time, speed) AS min_time,
+	first(id, speed) AS min_id,
+	max(speed) AS max_value,
+	last(time, speed) AS max_time,
+	last(id, speed) AS max_id,
+	last(direction, recorded_at) AS direction,
+	count(*) AS samples
+FROM rotary_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('rotary_measurements_1h',
+	start_offset => INTERVAL '3 days',
+	end_offset => INTERVAL '1 hour',
+	schedule_interval => INTERVAL '1 hour',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS peristaltic_measurements_1s
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 second', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(flow) AS flow,
+	min(flow) AS min_value,
+	first(time, flow) AS min_time,
+	first(id, flow) AS min_id,
+	max(flow) AS max_value,
+	last(time, flow) AS max_time,
+	last(id, flow) AS max_id,
+	last(direction, recorded_at) AS direction,
+	count(*) AS samples
+FROM peristaltic_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('peristaltic_measurements_1s',
+	start_offset => INTERVAL '1 hour',
+	end_offset => INTERVAL '1 second',
+	schedule_interval => INTERVAL '1 minute',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS peristaltic_measurements_1m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 minute', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(flow) AS flow,
+	min(flow) AS min_value,
+	first(time, flow) AS min_time,
+	first(id, flow) AS min_id,
+	max(flow) AS max_value,
+	last(time, flow) AS max_time,
+	last(id, flow) AS max_id,
+	last(direction, recorded_at) AS direction,
+	count(*) AS samples
+FROM peristaltic_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('peristaltic_measurements_1m',
+	start_offset => INTERVAL '1 day',
+	end_offset => INTERVAL '1 minute',
+	schedule_interval => INTERVAL '5 minutes',
+	if_not_exists => TRUE);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS peristaltic_measurements_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 hour', recorded_at) AS bucket,
+	entry_id,
+	min(id) AS id,
+	min(time) AS time,
+	avg(flow) AS flow,
+	min(flow) AS min_value,
+	first(time, flow) AS min_time,
+	first(id, flow) AS min_id,
+	max(flow) AS max_value,
+	last(time, flow) AS max_time,
+	last(id, flow) AS max_id,
+	last(direction, recorded_at) AS direction,
+	count(*) AS samples
+FROM peristaltic_measurements
+GROUP BY bucket, entry_id
+WITH NO DATA;
+SELECT add_continuous_aggregate_policy('peristaltic_measurements_1h',
+	start_offset => INTERVAL '3 days',
+	end_offset => INTERVAL '1 hour',
+	schedule_interval => INTERVAL '1 hour',
+	if_not_exists => TRUE);